@@ -125,4 +125,72 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Arquivos Temporários
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Sessões na base de dados, com a gravação medida nas métricas (fase 'gravar_sessao')
+SESSION_ENGINE = 'interpreter.sessoes'
+
+# Armazém de dados da sessão (a sessão guarda só as chaves)
+GRAFICALC_DADOS_ROOT = os.path.join(BASE_DIR, 'dados_sessao')
+# 'mapa' (mapeado em memória e partilhado entre processos), 'pickle', 'parquet' ou 'arrow' (os dois últimos exigem pyarrow)
+GRAFICALC_CODEC_DADOS = 'mapa'
+# Bytes de dados mapeados sem uso que cada processo mantém abertos
+GRAFICALC_MAPAS_BYTES = 1024 * 1024 * 1024
+# Liga o copy-on-write do pandas no arranque (no pandas 3 está sempre ligado).
+# Necessário com o codec 'mapa' no pandas 2.x: as colunas mapeadas são só de
+# leitura e um comando que as altere tem de receber uma cópia
+GRAFICALC_COPY_ON_WRITE = True
+# limpar_disco: dados sem referências gravados há menos destes segundos não são apagados
+GRAFICALC_LIMPEZA_MARGEM_DADOS = 3600
+
+# Cache de leitura de ficheiros (CARREGAR DADOS / CARREGAR ARQUIVO)
+GRAFICALC_CACHE_LEITURA_ROOT = os.path.join(BASE_DIR, 'cache_leitura')
+GRAFICALC_CACHE_LEITURA_BYTES = 512 * 1024 * 1024
+# limpar_disco: tamanho máximo da cache de leitura em disco
+GRAFICALC_CACHE_LEITURA_DISCO_BYTES = 5 * 1024 * 1024 * 1024
+# limpar_disco: entradas das caches em disco não usadas há mais destes segundos são apagadas
+GRAFICALC_LIMPEZA_IDADE_CACHES = 7 * 24 * 3600
+
+# Número de linhas por bloco em CARREGAR DADOS ... EM BLOCOS
+GRAFICALC_TAMANHO_BLOCO = 100_000
+
+# CARREGAR ... COMPACTO: usar strings Arrow nas colunas de texto que não
+# passam a `category` (exige pyarrow)
+GRAFICALC_STRINGS_ARROW = False
+
+# Tarefas assíncronas (/tarefas/): pasta de estado, processos, tamanho da fila
+# e tempo que as pastas das tarefas terminadas são mantidas
+GRAFICALC_TAREFAS_ROOT = os.path.join(BASE_DIR, 'tarefas')
+GRAFICALC_TAREFAS_PROCESSOS = 2
+GRAFICALC_TAREFAS_FILA_MAXIMA = 16
+GRAFICALC_TAREFAS_EXPIRAR_SEGUNDOS = 24 * 3600
+
+# Reexecução incremental: número de comandos cujos resultados ficam em memória
+# e limite em bytes dos resultados e variáveis guardados
+GRAFICALC_CACHE_EXECUCAO_ENTRADAS = 128
+GRAFICALC_CACHE_EXECUCAO_BYTES = 512 * 1024 * 1024
+
+# Gráficos (PLOTAR): processos de renderização (0 desenha na thread do pedido),
+# resolução e formatos aceites em SALVAR COMO (png, svg, webp)
+GRAFICALC_RENDER_PROCESSOS = 2
+GRAFICALC_RENDER_DPI = 100
+GRAFICALC_RENDER_FORMATOS = ('png', 'svg', 'webp')
+
+# Cache de gráficos: imagens desenhadas, servidas em GRAFICALC_GRAFICOS_URL
+# (tem de corresponder à rota 'grafico' em interpreter/urls.py)
+GRAFICALC_GRAFICOS_ROOT = os.path.join(BASE_DIR, 'graficos')
+GRAFICALC_GRAFICOS_URL = '/graficos/'
+# limpar_disco: tamanho máximo da cache de gráficos em disco
+GRAFICALC_GRAFICOS_DISCO_BYTES = 1024 * 1024 * 1024
+
+# Janelas de tabela (/variaveis/<nome>/janela/): memória para variáveis
+# descodificadas e índices de ordenação
+GRAFICALC_JANELAS_CACHE_BYTES = 256 * 1024 * 1024
+
+# FILTRAR: memória para os índices de coluna (hash e ordenados), partilhados
+# entre pedidos e sessões
+GRAFICALC_INDICES_CACHE_BYTES = 256 * 1024 * 1024
+
+# Perfil por comando: junta a cada resultado o tempo, o pico de memória e as
+# linhas/bytes processados (o pico de memória usa tracemalloc, que é lento)
+GRAFICALC_PERFIL = False
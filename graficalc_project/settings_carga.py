@@ -0,0 +1,29 @@
+# Definições usadas pelo teste de carga (python manage.py teste_carga): as do
+# projeto, com a base de dados e as pastas de dados numa pasta própria
+# (GRAFICALC_CARGA_PASTA) e definições extra vindas do ambiente
+# (GRAFICALC_CARGA_DEFINICOES, um objeto JSON).
+
+import json
+import os
+
+from .settings import *  # noqa: F401,F403
+
+PASTA_CARGA = os.environ['GRAFICALC_CARGA_PASTA']
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(PASTA_CARGA, 'db.sqlite3'),
+    }
+}
+
+MEDIA_ROOT = os.path.join(PASTA_CARGA, 'media')
+GRAFICALC_DADOS_ROOT = os.path.join(PASTA_CARGA, 'dados_sessao')
+GRAFICALC_CACHE_LEITURA_ROOT = os.path.join(PASTA_CARGA, 'cache_leitura')
+GRAFICALC_TAREFAS_ROOT = os.path.join(PASTA_CARGA, 'tarefas')
+GRAFICALC_GRAFICOS_ROOT = os.path.join(PASTA_CARGA, 'graficos')
+
+globals().update(json.loads(os.environ.get('GRAFICALC_CARGA_DEFINICOES', '{}')))
@@ -16,8 +16,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from interpreter.views import metricas_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metricas_view, name='metricas'),
     path('', include('interpreter.urls')), 
 ]
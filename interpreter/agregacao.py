@@ -0,0 +1,47 @@
+# AGREGAÇÃO POR GRUPOS (CALCULAR ... AGRUPAR POR)
+# Todas as estatísticas de um comando são calculadas com um único groupby do
+# pandas, sem ciclos em Python por grupo. A MODA não existe no groupby: conta
+# os pares (grupo, valor), ordena por contagem e fica com o primeiro de cada
+# grupo (o menor valor em caso de empate, como o scipy.stats.mode).
+
+FUNCOES = {
+    'MEDIA': 'mean',
+    'MEDIANA': 'median',
+}
+
+
+def nome_coluna_resultado(tipo, coluna):
+    return f"{tipo.lower()}_{coluna}"
+
+
+def moda_por_grupo(df, agrupar, coluna):
+    import pandas as pd
+    chaves = list(agrupar)
+    contagens = df.groupby(chaves + [coluna], observed=True).size().reset_index(name='_contagem')
+    if contagens.empty:
+        return pd.Series(dtype=df[coluna].dtype)
+    contagens = contagens.sort_values(['_contagem', coluna], ascending=[False, True], kind='stable')
+    return contagens.drop_duplicates(chaves).set_index(chaves)[coluna]
+
+
+def agregar(df, agrupar, calculos):
+    # Uma linha por grupo, ordenada pelas colunas de agrupamento; os grupos com
+    # valores em falta nas colunas de agrupamento ficam de fora
+    agrupar = list(agrupar)
+    grupos = df.groupby(agrupar, observed=True, sort=True)
+    pedidos, modas = {}, []
+    for tipo, coluna in dict.fromkeys(calculos):
+        nome = nome_coluna_resultado(tipo, coluna)
+        if tipo == 'MODA':
+            modas.append((nome, coluna))
+        else:
+            pedidos[nome] = (coluna, FUNCOES[tipo])
+
+    resultado = grupos.agg(**pedidos) if pedidos else grupos.size().to_frame('_contagem')
+    for nome, coluna in modas:
+        resultado[nome] = moda_por_grupo(df, agrupar, coluna)
+    if not pedidos:
+        resultado = resultado.drop(columns='_contagem')
+    # A ordem das colunas segue a ordem dos cálculos no comando
+    ordem = [nome_coluna_resultado(tipo, coluna) for tipo, coluna in dict.fromkeys(calculos)]
+    return resultado[ordem].reset_index()
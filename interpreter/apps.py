@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class InterpreterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'interpreter'
+
+    def ready(self):
+        from django.conf import settings
+        from .armazenamento import ativar_copy_on_write
+        if settings.GRAFICALC_COPY_ON_WRITE:
+            ativar_copy_on_write()
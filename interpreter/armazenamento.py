@@ -0,0 +1,392 @@
+import hashlib
+import io
+import os
+import pickle
+import re
+import struct
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from .metricas import cronometrar, segundos_fase
+
+
+# CODECS
+# Cada codec transforma um DataFrame em bytes e vice-versa. O pickle (protocolo 5)
+# não precisa de dependências extra; Parquet e Arrow IPC exigem o pyarrow.
+
+class CodecPickle:
+    nome = 'pickle'
+
+    def codificar(self, df):
+        return pickle.dumps(df, protocol=5)
+
+    def decodificar(self, dados):
+        return pickle.loads(dados)
+
+
+class CodecParquet:
+    nome = 'parquet'
+
+    def codificar(self, df):
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=True)
+        return buffer.getvalue()
+
+    def decodificar(self, dados):
+        import pandas as pd
+        return pd.read_parquet(io.BytesIO(dados))
+
+
+class CodecArrow:
+    nome = 'arrow'
+
+    def codificar(self, df):
+        buffer = io.BytesIO()
+        df.reset_index(drop=True).to_feather(buffer)
+        return buffer.getvalue()
+
+    def decodificar(self, dados):
+        import pandas as pd
+        return pd.read_feather(io.BytesIO(dados))
+
+
+def ativar_copy_on_write():
+    # As colunas mapeadas são só de leitura: um comando que as altere tem de
+    # receber uma cópia. No pandas 3 o copy-on-write está sempre ligado; no 2.x
+    # é uma opção global, ligada uma vez no arranque de cada processo
+    # (GRAFICALC_COPY_ON_WRITE). A versão é lida sem importar o pandas.
+    from importlib.metadata import version
+    if int(version('pandas').split('.')[0]) < 3:
+        import pandas as pd
+        pd.set_option('mode.copy_on_write', True)
+
+
+class CodecMapa:
+    """Formato que pode ser mapeado em memória: as colunas numéricas, booleanas
+    e de datas ficam como arrays contíguos, alinhados a 64 bytes, depois de um
+    cabeçalho em pickle com o resto do DataFrame (índice, colunas de texto e
+    nomes). Com `abrir`, as colunas são lidas do ficheiro sem cópia e só para
+    leitura; as páginas ficam na cache do sistema operativo, partilhadas por
+    todos os processos que abrem o mesmo ficheiro."""
+    nome = 'mapa'
+    MAGIA = b'GCMAPA01'
+    ALINHAMENTO = 64
+
+    def alinhar(self, posicao):
+        return -(-posicao // self.ALINHAMENTO) * self.ALINHAMENTO
+
+    def codificar(self, df):
+        mapeadas, outras, arrays = [], [], []
+        posicao_dados = 0
+        for posicao in range(df.shape[1]):
+            serie = df.iloc[:, posicao]
+            # Tipos de extensão (categorias, strings, datas com fuso) não são arrays simples
+            if type(serie.dtype).__module__ != 'numpy' or serie.dtype.kind not in 'biufcmM':
+                outras.append(posicao)
+                continue
+            array = serie.to_numpy()
+            if array.dtype.byteorder == '>':
+                array = array.astype(array.dtype.newbyteorder('<'))
+            array = memoryview(array.ravel(order='C')).cast('B') if array.size else b''
+            mapeadas.append((posicao, serie.dtype.str, posicao_dados, len(df)))
+            arrays.append((posicao_dados, array))
+            posicao_dados = self.alinhar(posicao_dados + len(array))
+
+        cabecalho = pickle.dumps({
+            'colunas': df.columns,
+            'mapeadas': mapeadas,
+            'outras': outras,
+            'resto': df.iloc[:, outras],
+        }, protocol=5)
+        inicio_dados = self.alinhar(len(self.MAGIA) + 8 + len(cabecalho))
+
+        buffer = bytearray(inicio_dados + posicao_dados)
+        buffer[:len(self.MAGIA) + 8] = self.MAGIA + struct.pack('<Q', len(cabecalho))
+        buffer[len(self.MAGIA) + 8:len(self.MAGIA) + 8 + len(cabecalho)] = cabecalho
+        for posicao, array in arrays:
+            buffer[inicio_dados + posicao:inicio_dados + posicao + len(array)] = array
+        return bytes(buffer)
+
+    def decodificar(self, dados):
+        import numpy as np
+        return self.montar(np.frombuffer(dados, dtype=np.uint8))
+
+    def abrir(self, caminho):
+        import numpy as np
+        return self.montar(np.memmap(caminho, dtype=np.uint8, mode='r'))
+
+    def montar(self, dados):
+        import numpy as np
+        import pandas as pd
+
+        tamanho_magia = len(self.MAGIA)
+        if bytes(dados[:tamanho_magia]) != self.MAGIA:
+            raise ValueError("Ficheiro de dados em formato desconhecido.")
+        tamanho_cabecalho = struct.unpack('<Q', bytes(dados[tamanho_magia:tamanho_magia + 8]))[0]
+        cabecalho = pickle.loads(bytes(dados[tamanho_magia + 8:tamanho_magia + 8 + tamanho_cabecalho]))
+        inicio_dados = self.alinhar(tamanho_magia + 8 + tamanho_cabecalho)
+
+        resto = cabecalho['resto']
+        partes = {}
+        for posicao, tipo, inicio, linhas in cabecalho['mapeadas']:
+            # np.frombuffer devolve uma vista só de leitura sobre o ficheiro mapeado
+            partes[posicao] = np.frombuffer(dados, dtype=np.dtype(tipo), count=linhas, offset=inicio_dados + inicio)
+        sem_indice = resto.reset_index(drop=True)
+        for indice, posicao in enumerate(cabecalho['outras']):
+            partes[posicao] = sem_indice.iloc[:, indice]
+
+        df = pd.DataFrame({posicao: partes[posicao] for posicao in sorted(partes)}, copy=False)
+        df.index = resto.index
+        df.columns = cabecalho['colunas']
+        df.attrs = resto.attrs
+        return df
+
+
+CODECS = {
+    CodecPickle.nome: CodecPickle,
+    CodecParquet.nome: CodecParquet,
+    CodecArrow.nome: CodecArrow,
+    CodecMapa.nome: CodecMapa,
+}
+
+
+def obter_codec(nome):
+    if nome not in CODECS:
+        raise ValueError(f"Codec de dados desconhecido: '{nome}'. Opções: {', '.join(CODECS)}")
+    return CODECS[nome]()
+
+
+# MAPAS PARTILHADOS
+# DataFrames abertos a partir de ficheiros do codec `mapa`, um por chave em
+# cada processo: sessões que usam o mesmo conjunto de dados recebem cópias
+# superficiais do mesmo mapa. Cada cópia entregue conta como uma referência e
+# mantém o mapa vivo; com o copy-on-write do pandas, um comando que altere a
+# sua cópia recebe colunas novas e nunca escreve no ficheiro. Os mapas sem
+# referências ficam numa LRU limitada em bytes e são fechados quando saem dela.
+
+class MapasPartilhados:
+
+    def __init__(self, limite_bytes=1024 * 1024 * 1024):
+        self.limite_bytes = limite_bytes
+        self._mapas = OrderedDict()
+        self._referencias = {}
+        self._bytes = 0
+        # RLock: o coletor de lixo pode libertar uma cópia com o lock já adquirido
+        self._lock = threading.RLock()
+        self.acertos = 0
+        self.falhas = 0
+        self.despejos = 0
+
+    def abrir(self, chave, caminho, codec):
+        with self._lock:
+            entrada = self._mapas.get(chave)
+            if entrada is not None:
+                self._mapas.move_to_end(chave)
+                self.acertos += 1
+
+        if entrada is None:
+            df = codec.abrir(caminho)
+            with self._lock:
+                self.falhas += 1
+                entrada = self._mapas.get(chave)
+                if entrada is None:
+                    entrada = self._mapas[chave] = (df, os.path.getsize(caminho))
+                    self._bytes += entrada[1]
+
+        copia = entrada[0].copy(deep=False)
+        with self._lock:
+            self._referencias[chave] = self._referencias.get(chave, 0) + 1
+        weakref.finalize(copia, self._libertar, chave)
+        self._despejar()
+        return copia
+
+    def _libertar(self, chave):
+        with self._lock:
+            self._referencias[chave] -= 1
+            if not self._referencias[chave]:
+                del self._referencias[chave]
+        self._despejar()
+
+    def _despejar(self):
+        with self._lock:
+            for chave in list(self._mapas):
+                if self._bytes <= self.limite_bytes:
+                    break
+                if chave in self._referencias:
+                    continue
+                _, tamanho = self._mapas.pop(chave)
+                self._bytes -= tamanho
+                self.despejos += 1
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'despejos': self.despejos,
+                'mapas': len(self._mapas),
+                'mapas_em_uso': len(self._referencias),
+                'referencias': sum(self._referencias.values()),
+                'bytes_mapeados': self._bytes,
+                'limite_bytes': self.limite_bytes,
+            }
+
+
+# ARMAZÉM DE DADOS
+# Os DataFrames ficam em disco, endereçados pelo hash do conteúdo codificado;
+# a sessão do Django guarda apenas a chave. Conteúdos iguais têm a mesma chave
+# e ficam gravados uma só vez; com o codec `mapa`, são também mapeados uma só
+# vez em memória.
+
+FORMATO_CHAVE = re.compile(r'^[0-9a-f]{64}\.[a-z0-9_]+$')
+
+
+def chave_valida(valor):
+    return isinstance(valor, str) and FORMATO_CHAVE.match(valor) is not None
+
+
+def gravar_atomicamente(caminho, dados):
+    # Quem lê ao mesmo tempo vê o ficheiro antigo ou o novo, nunca metade
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho))
+    with os.fdopen(descritor, 'wb') as ficheiro:
+        ficheiro.write(dados)
+    os.replace(temporario, caminho)
+
+
+class ArmazemDados:
+
+    def __init__(self, raiz, codec='pickle', limite_mapas_bytes=1024 * 1024 * 1024):
+        self.raiz = str(raiz)
+        self.codec = obter_codec(codec)
+        self.mapas = MapasPartilhados(limite_mapas_bytes)
+        # Objetos já gravados neste processo: voltar a guardá-los não os codifica de novo
+        self._chaves_por_objeto = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def _caminho(self, chave):
+        if not chave_valida(chave):
+            raise ValueError(f"Chave de dados inválida: '{chave}'")
+        return os.path.join(self.raiz, chave[:2], chave)
+
+    def existe(self, chave):
+        return os.path.exists(self._caminho(chave))
+
+    def tamanho(self, chave):
+        try:
+            return os.path.getsize(self._caminho(chave))
+        except FileNotFoundError:
+            return 0
+
+    def guardar(self, df):
+        with self._lock:
+            gravado = self._chaves_por_objeto.get(id(df))
+        if gravado is not None and gravado[0]() is df and self.existe(gravado[1]):
+            return gravado[1]
+
+        chave = self._guardar(df)
+        with self._lock:
+            self._chaves_por_objeto[id(df)] = (weakref.ref(df), chave)
+        weakref.finalize(df, self._chaves_por_objeto.pop, id(df), None)
+        return chave
+
+    def _guardar(self, df):
+        from .blocos import DadosEmBlocos
+        # Variáveis lidas em blocos só guardam o caminho e as opções de leitura
+        codec = CodecPickle() if isinstance(df, DadosEmBlocos) else self.codec
+        dados = codec.codificar(df)
+        chave = f"{hashlib.sha256(dados).hexdigest()}.{codec.nome}"
+        caminho = self._caminho(chave)
+        if os.path.exists(caminho):
+            # Dados reutilizados contam como recentes para a limpeza do disco (limpar_disco)
+            os.utime(caminho)
+        else:
+            gravar_atomicamente(caminho, dados)
+        return chave
+
+    def carregar(self, chave):
+        codec = obter_codec(chave.rsplit('.', 1)[1])
+        if hasattr(codec, 'abrir'):
+            return self.mapas.abrir(chave, self._caminho(chave), codec)
+        with open(self._caminho(chave), 'rb') as ficheiro:
+            dados = ficheiro.read()
+        return codec.decodificar(dados)
+
+
+# VARIÁVEIS DA SESSÃO
+# Mapeamento preguiçoso: cada variável só é descodificada quando um comando a
+# lê, e só as variáveis alteradas voltam a ser gravadas no armazém. Cada
+# descodificação é medida como a fase 'descodificar_sessao'.
+
+class VariaveisSessao(MutableMapping):
+
+    def __init__(self, armazem, chaves=None):
+        self.armazem = armazem
+        self._chaves = dict(chaves or {})
+        self._carregadas = {}
+        self._sujas = set()
+
+    def __getitem__(self, nome):
+        if nome not in self._carregadas:
+            valor = self._chaves[nome]
+            with cronometrar(segundos_fase, fase='descodificar_sessao'):
+                if chave_valida(valor):
+                    self._carregadas[nome] = self.armazem.carregar(valor)
+                else:
+                    # Sessões antigas guardavam o DataFrame serializado em JSON
+                    from .graficalc_engine import safe_read_json
+                    self._carregadas[nome] = safe_read_json(valor)
+                    self._sujas.add(nome)
+        return self._carregadas[nome]
+
+    def __setitem__(self, nome, valor):
+        self._carregadas[nome] = valor
+        self._sujas.add(nome)
+
+    def __delitem__(self, nome):
+        if nome not in self._chaves and nome not in self._carregadas:
+            raise KeyError(nome)
+        self._chaves.pop(nome, None)
+        self._carregadas.pop(nome, None)
+        self._sujas.discard(nome)
+
+    def __contains__(self, nome):
+        return nome in self._chaves or nome in self._carregadas
+
+    def __iter__(self):
+        yield from self._chaves
+        for nome in self._carregadas:
+            if nome not in self._chaves:
+                yield nome
+
+    def __len__(self):
+        return len(set(self._chaves) | set(self._carregadas))
+
+    def alteradas(self):
+        return set(self._sujas)
+
+    def carregada(self, nome):
+        # O valor já descodificado (ou atribuído) neste pedido, sem ir ao armazém; None se ainda não foi lido
+        return self._carregadas.get(nome)
+
+    def tamanho_guardado(self, nome):
+        # Bytes da variável no armazém (0 se não for uma chave ou o ficheiro já não existir)
+        valor = self._chaves.get(nome)
+        return self.armazem.tamanho(valor) if chave_valida(valor) else 0
+
+    def chave(self, nome):
+        # Chave no armazém de uma variável que não foi alterada neste pedido
+        valor = self._chaves.get(nome)
+        if nome in self._sujas or not chave_valida(valor):
+            return None
+        return valor
+
+    def persistir(self):
+        for nome in self._sujas:
+            self._chaves[nome] = self.armazem.guardar(self._carregadas[nome])
+        self._sujas.clear()
+        return dict(self._chaves)
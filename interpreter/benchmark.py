@@ -0,0 +1,235 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from . import graficalc_engine
+from .armazenamento import ArmazemDados
+from .graficalc_engine import Interpretador, compilar_sem_cache, safe_read_json
+
+
+# MICRO-BENCHMARKS DO MOTOR
+# Gera conjuntos de dados sintéticos e mede cada etapa do motor em separado.
+# Os resultados são gravados em JSON e podem ser comparados com uma baseline.
+
+ETAPAS = (
+    'importar', 'lexer', 'parser', 'carregar', 'calcular_media', 'calcular_mediana', 'calcular_moda',
+    'plotar_barras', 'plotar_linhas', 'sessao_json', 'sessao_armazem',
+)
+
+# Números de linhas de cada perfil. O 'grande' chega aos milhões de linhas,
+# onde ler, copiar e codificar os dados mais pesa (com 20 colunas, o CSV de
+# 2 000 000 linhas ocupa cerca de 400 MB)
+PERFIS_LINHAS = {
+    'normal': (1_000, 100_000),
+    'grande': (1_000, 100_000, 2_000_000),
+}
+
+MESES = np.array(['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho', 'Julho',
+                  'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'])
+
+
+def gerar_dataframe(linhas, colunas, semente=0):
+    gerador = np.random.default_rng(semente)
+    dados = {
+        'Mês': MESES[gerador.integers(0, len(MESES), linhas)],
+        'Total': np.round(gerador.normal(1000, 250, linhas), 2),
+    }
+    for indice in range(max(colunas - 2, 0)):
+        if indice % 3 == 2:
+            dados[f'Categoria_{indice}'] = np.char.add('C', gerador.integers(0, 50, linhas).astype(str))
+        elif indice % 3 == 1:
+            dados[f'Inteiro_{indice}'] = gerador.integers(0, 10_000, linhas)
+        else:
+            dados[f'Valor_{indice}'] = np.round(gerador.random(linhas) * 100, 3)
+    return pd.DataFrame(dados)
+
+
+def gerar_ficheiro(pasta, linhas, colunas, formato):
+    caminho = os.path.join(pasta, f'dados_{linhas}x{colunas}.{formato}')
+    if not os.path.exists(caminho):
+        df = gerar_dataframe(linhas, colunas)
+        if formato == 'csv':
+            df.to_csv(caminho, index=False)
+        else:
+            df.to_excel(caminho, index=False)
+    return caminho
+
+
+def gerar_script(comandos):
+    linhas = [
+        'CARREGAR ARQUIVO COMO tabela',
+        'MOSTRAR DADOS DE tabela',
+        'CALCULAR MEDIA DA COLUNA "Total" DE tabela',
+        'PLOTAR GRAFICO DE LINHAS COM EIXO_X "Mês" E EIXO_Y "Total" DE tabela SALVAR COMO "total.png"',
+    ]
+    return '\n'.join(linhas[indice % len(linhas)] for indice in range(comandos))
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return {'segundos': min(tempos), 'mediana_segundos': statistics.median(tempos), 'repeticoes': repeticoes}
+
+
+def executar_comando(codigo, variaveis=None, caminho_arquivo=None):
+    interpretador = Interpretador(variaveis if variaveis is not None else {}, caminho_arquivo, projecao_colunas=False)
+    resultados = interpretador.executar(codigo)
+    erros = [resultado['content'] for resultado in resultados if resultado['type'] == 'error']
+    if erros:
+        raise RuntimeError(erros[0])
+    return interpretador.variaveis
+
+
+# Corre num processo novo para que nada esteja ainda importado
+SCRIPT_IMPORTACAO = '''
+import json, sys, time
+inicio = time.perf_counter()
+import interpreter.graficalc_engine
+segundos = time.perf_counter() - inicio
+print(json.dumps({'segundos': segundos, 'modulos': [m for m in ('numpy', 'pandas', 'matplotlib', 'scipy') if m in sys.modules]}))
+'''
+
+
+def medir_importacao(repeticoes):
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    execucoes = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', SCRIPT_IMPORTACAO], cwd=raiz, capture_output=True, text=True, check=True)
+        execucoes.append(json.loads(saida.stdout))
+    tempos = [execucao['segundos'] for execucao in execucoes]
+    return {
+        'etapa': 'importar', 'segundos': min(tempos), 'mediana_segundos': statistics.median(tempos),
+        'repeticoes': repeticoes, 'modulos_carregados': execucoes[0]['modulos'],
+    }
+
+
+def medir_linguagem(repeticoes, comandos=2000):
+    codigo = gerar_script(comandos)
+
+    def lexer():
+        lexer_local = graficalc_engine.lexer.clone()
+        lexer_local.erros = []
+        lexer_local.input(codigo)
+        for _ in lexer_local:
+            pass
+
+    medicoes = []
+    for etapa, funcao in (('lexer', lexer), ('parser', lambda: compilar_sem_cache(codigo))):
+        medicoes.append({'etapa': etapa, 'comandos': comandos, **medir(funcao, repeticoes)})
+    return medicoes
+
+
+def medir_dados(caminho, linhas, colunas, formato, repeticoes, etapas):
+    chave = {'linhas': linhas, 'colunas': colunas, 'formato': formato}
+    medicoes = []
+
+    def registar(etapa, funcao):
+        if etapa in etapas:
+            medicoes.append({'etapa': etapa, **chave, **medir(funcao, repeticoes)})
+
+    registar('carregar', lambda: executar_comando('CARREGAR ARQUIVO COMO tabela', caminho_arquivo=caminho))
+
+    # As restantes etapas não dependem do formato do ficheiro
+    if formato != 'csv':
+        return medicoes
+
+    variaveis = executar_comando('CARREGAR ARQUIVO COMO tabela', caminho_arquivo=caminho)
+    for tipo in ('MEDIA', 'MEDIANA', 'MODA'):
+        registar(f'calcular_{tipo.lower()}', lambda tipo=tipo: executar_comando(
+            f'CALCULAR {tipo} DA COLUNA "Total" DE tabela', variaveis))
+    for tipo in ('BARRAS', 'LINHAS'):
+        registar(f'plotar_{tipo.lower()}', lambda tipo=tipo: executar_comando(
+            f'PLOTAR GRAFICO DE {tipo} COM EIXO_X "Mês" E EIXO_Y "Total" DE tabela', variaveis))
+
+    df = variaveis['tabela']
+    # Ida e volta da sessão como era feita nas views (to_json + safe_read_json)
+    registar('sessao_json', lambda: safe_read_json(df.to_json()))
+    with tempfile.TemporaryDirectory() as pasta_armazem:
+        armazem = ArmazemDados(pasta_armazem)
+        registar('sessao_armazem', lambda: armazem.carregar(armazem._guardar(df)))
+    return medicoes
+
+
+def executar_benchmark(linhas=PERFIS_LINHAS['normal'], colunas=(3, 20), formatos=('csv', 'xlsx'),
+                       repeticoes=3, pasta=None, etapas=ETAPAS, xlsx_max_linhas=100_000, perfil=None):
+    # `perfil`: nome do perfil de PERFIS_LINHAS usado, só para ficar registado no resultado
+    etapas = set(etapas)
+    medicoes = []
+    if 'importar' in etapas:
+        medicoes.append(medir_importacao(repeticoes))
+    if etapas & {'lexer', 'parser'}:
+        medicoes.extend(medicao for medicao in medir_linguagem(repeticoes) if medicao['etapa'] in etapas)
+
+    with tempfile.TemporaryDirectory() as pasta_temporaria:
+        pasta = pasta or pasta_temporaria
+        os.makedirs(pasta, exist_ok=True)
+        for quantidade in linhas:
+            for largura in colunas:
+                for formato in formatos:
+                    if formato == 'xlsx' and quantidade > xlsx_max_linhas:
+                        continue
+                    caminho = gerar_ficheiro(pasta, quantidade, largura, formato)
+                    medicoes.extend(medir_dados(caminho, quantidade, largura, formato, repeticoes, etapas))
+
+    return {
+        'meta': {
+            'data': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'plataforma': platform.platform(),
+            'perfil': perfil,
+            'linhas': list(linhas),
+            'colunas': list(colunas),
+            'formatos': list(formatos),
+            'repeticoes': repeticoes,
+        },
+        'medicoes': medicoes,
+    }
+
+
+def identificar(medicao):
+    return tuple((campo, medicao.get(campo)) for campo in ('etapa', 'linhas', 'colunas', 'formato', 'comandos'))
+
+
+def comparar(atual, baseline, limite_percentual=20.0):
+    # Devolve as etapas que ficaram mais de `limite_percentual` % mais lentas
+    referencias = {identificar(medicao): medicao for medicao in baseline['medicoes']}
+    regressoes = []
+    for medicao in atual['medicoes']:
+        referencia = referencias.get(identificar(medicao))
+        if referencia is None or referencia['segundos'] <= 0:
+            continue
+        variacao = (medicao['segundos'] / referencia['segundos'] - 1) * 100
+        if variacao > limite_percentual:
+            regressoes.append({**dict(identificar(medicao)), 'baseline': referencia['segundos'],
+                               'atual': medicao['segundos'], 'variacao_percentual': round(variacao, 1)})
+    return regressoes
+
+
+def linhas_sem_referencia(atual, baseline):
+    # Números de linhas medidos agora que a baseline não tem (ex.: uma execução
+    # --grande comparada com uma baseline do perfil normal): não são comparados
+    medidas = {medicao['linhas'] for medicao in baseline['medicoes'] if 'linhas' in medicao}
+    return sorted({medicao['linhas'] for medicao in atual['medicoes'] if 'linhas' in medicao} - medidas)
+
+
+def gravar_json(dados, caminho):
+    with open(caminho, 'w', encoding='utf-8') as ficheiro:
+        json.dump(dados, ficheiro, indent=2, ensure_ascii=False)
+
+
+def ler_json(caminho):
+    with open(caminho, encoding='utf-8') as ficheiro:
+        return json.load(ficheiro)
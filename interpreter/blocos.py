@@ -0,0 +1,96 @@
+# O pandas e o numpy só são importados quando um ficheiro é lido
+
+TAMANHO_BLOCO_PADRAO = 100_000
+BINS_MEDIANA = 1024
+
+
+class DadosEmBlocos:
+    """Variável ligada a um CSV lido em blocos de `tamanho_bloco` linhas, para
+    ficheiros maiores do que a memória. Só guarda o caminho e as opções de
+    leitura; cada cálculo percorre o ficheiro de novo."""
+
+    def __init__(self, caminho, tamanho_bloco=TAMANHO_BLOCO_PADRAO, usecols=None):
+        if not caminho.endswith('.csv'):
+            raise ValueError("A leitura EM BLOCOS só está disponível para ficheiros .csv")
+        self.caminho = caminho
+        self.tamanho_bloco = tamanho_bloco
+        self.usecols = sorted(usecols) if usecols else None
+        import pandas as pd
+        self.columns = pd.read_csv(caminho, nrows=0, usecols=self.usecols).columns
+
+    def blocos(self, colunas=None):
+        import pandas as pd
+        return pd.read_csv(self.caminho, chunksize=self.tamanho_bloco, usecols=colunas or self.usecols)
+
+    def head(self, n=5):
+        for bloco in self.blocos():
+            return bloco.head(n)
+        import pandas as pd
+        return pd.DataFrame(columns=self.columns)
+
+    def valores(self, coluna):
+        for bloco in self.blocos([coluna]):
+            yield bloco[coluna].dropna()
+
+    def media(self, coluna):
+        soma, quantidade = 0.0, 0
+        for valores in self.valores(coluna):
+            soma += valores.sum()
+            quantidade += len(valores)
+        return soma / quantidade if quantidade else float('nan')
+
+    def moda(self, coluna):
+        # A memória fica limitada pelo número de valores distintos da coluna
+        contagens = None
+        for valores in self.valores(coluna):
+            contagem_bloco = valores.value_counts()
+            contagens = contagem_bloco if contagens is None else contagens.add(contagem_bloco, fill_value=0)
+        if contagens is None or contagens.empty:
+            return float('nan')
+        # Em caso de empate devolve o menor valor, como o scipy.stats.mode
+        return contagens[contagens == contagens.max()].index.min()
+
+    def mediana(self, coluna):
+        # Seleção exata em várias passagens: cada passagem conta os valores num
+        # histograma dentro do intervalo que contém a posição procurada e
+        # estreita esse intervalo, até caber num bloco e poder ser ordenado.
+        import numpy as np
+        quantidade, minimo, maximo = 0, np.inf, -np.inf
+        for valores in self.valores(coluna):
+            if len(valores):
+                quantidade += len(valores)
+                minimo = min(minimo, valores.min())
+                maximo = max(maximo, valores.max())
+        if not quantidade:
+            return float('nan')
+
+        meio = (quantidade - 1) // 2
+        if quantidade % 2:
+            return self.selecionar(coluna, meio, minimo, maximo)
+        return (self.selecionar(coluna, meio, minimo, maximo) + self.selecionar(coluna, meio + 1, minimo, maximo)) / 2
+
+    def selecionar(self, coluna, posicao, minimo, maximo):
+        import numpy as np
+        abaixo = 0
+        while minimo != maximo:
+            limites = np.linspace(minimo, maximo, BINS_MEDIANA + 1)
+            contagens = np.zeros(BINS_MEDIANA, dtype=np.int64)
+            for valores in self.valores(coluna):
+                dentro = valores[(valores >= minimo) & (valores <= maximo)].to_numpy()
+                contagens += np.histogram(dentro, bins=limites)[0]
+
+            if contagens.sum() <= self.tamanho_bloco:
+                selecionados = [valores[(valores >= minimo) & (valores <= maximo)].to_numpy() for valores in self.valores(coluna)]
+                return np.sort(np.concatenate(selecionados))[posicao - abaixo]
+
+            acumuladas = np.cumsum(contagens)
+            indice = int(np.searchsorted(acumuladas, posicao - abaixo, side='right'))
+            abaixo += int(acumuladas[indice - 1]) if indice else 0
+            novo_minimo, novo_maximo = limites[indice], limites[indice + 1]
+            if indice < BINS_MEDIANA - 1:
+                # np.histogram só fecha o último intervalo à direita
+                novo_maximo = np.nextafter(novo_maximo, -np.inf)
+            if (novo_minimo, novo_maximo) == (minimo, maximo):
+                break
+            minimo, maximo = novo_minimo, novo_maximo
+        return minimo
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from .armazenamento import gravar_atomicamente, obter_codec
+
+
+TAMANHO_BLOCO_HASH = 1024 * 1024
+
+
+# Hashes já calculados, por (caminho, tamanho, data de modificação), para não
+# ler o mesmo ficheiro duas vezes no mesmo pedido
+hashes_recentes = OrderedDict()
+lock_hashes = threading.Lock()
+MAX_HASHES_RECENTES = 256
+
+
+def hash_ficheiro(caminho):
+    estado = os.stat(caminho)
+    identificacao = (os.path.realpath(caminho), estado.st_size, estado.st_mtime_ns)
+    with lock_hashes:
+        if identificacao in hashes_recentes:
+            hashes_recentes.move_to_end(identificacao)
+            return hashes_recentes[identificacao]
+
+    digest = hashlib.sha256()
+    with open(caminho, 'rb') as ficheiro:
+        for bloco in iter(lambda: ficheiro.read(TAMANHO_BLOCO_HASH), b''):
+            digest.update(bloco)
+
+    with lock_hashes:
+        hashes_recentes[identificacao] = digest.hexdigest()
+        while len(hashes_recentes) > MAX_HASHES_RECENTES:
+            hashes_recentes.popitem(last=False)
+    return digest.hexdigest()
+
+
+def codec_padrao():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return 'pickle'
+    return 'arrow'
+
+
+class CacheLeitura:
+    """Cache de ficheiros já lidos, endereçado pelo conteúdo do ficheiro e pelas
+    opções do leitor. Os DataFrames ficam em disco num formato binário e os mais
+    recentes também em memória, até `limite_bytes`."""
+
+    def __init__(self, raiz, limite_bytes=512 * 1024 * 1024, codec=None):
+        self.raiz = str(raiz)
+        self.limite_bytes = limite_bytes
+        self.codec = obter_codec(codec or codec_padrao())
+        self._memoria = OrderedDict()
+        self._bytes_memoria = 0
+        self._lock = threading.Lock()
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.falhas = 0
+        self.despejos = 0
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def chave(self, caminho, leitor, opcoes):
+        opcoes_json = json.dumps({'leitor': leitor.__name__, **opcoes}, sort_keys=True, default=str)
+        digest = hashlib.sha256(f"{hash_ficheiro(caminho)}:{opcoes_json}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def _caminho_disco(self, chave):
+        return os.path.join(self.raiz, chave[:2], f"{chave}.{self.codec.nome}")
+
+    def ler(self, caminho, leitor, opcoes):
+        chave = self.chave(caminho, leitor, opcoes)
+
+        with self._lock:
+            if chave in self._memoria:
+                self._memoria.move_to_end(chave)
+                self.acertos_memoria += 1
+                return self._memoria[chave][0].copy(deep=False)
+
+        caminho_disco = self._caminho_disco(chave)
+        if os.path.exists(caminho_disco):
+            with open(caminho_disco, 'rb') as ficheiro:
+                df = self.codec.decodificar(ficheiro.read())
+            # A limpeza do disco (limpar_disco) apaga primeiro as entradas usadas há mais tempo
+            os.utime(caminho_disco)
+            with self._lock:
+                self.acertos_disco += 1
+        else:
+            df = leitor(caminho, **opcoes)
+            gravar_atomicamente(caminho_disco, self.codec.codificar(df))
+            with self._lock:
+                self.falhas += 1
+
+        self._guardar_memoria(chave, df)
+        return df.copy(deep=False)
+
+    def _guardar_memoria(self, chave, df):
+        tamanho = int(df.memory_usage(deep=True).sum())
+        if tamanho > self.limite_bytes:
+            return
+        with self._lock:
+            if chave in self._memoria:
+                return
+            self._memoria[chave] = (df, tamanho)
+            self._bytes_memoria += tamanho
+            while self._bytes_memoria > self.limite_bytes:
+                _, (_, tamanho_antigo) = self._memoria.popitem(last=False)
+                self._bytes_memoria -= tamanho_antigo
+                self.despejos += 1
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'acertos_memoria': self.acertos_memoria,
+                'acertos_disco': self.acertos_disco,
+                'falhas': self.falhas,
+                'despejos': self.despejos,
+                'entradas_memoria': len(self._memoria),
+                'bytes_memoria': self._bytes_memoria,
+                'limite_bytes': self.limite_bytes,
+            }
@@ -0,0 +1,525 @@
+import http.client
+import importlib.util
+import json
+import os
+import platform
+import re
+import shlex
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+
+# TESTE DE CARGA
+# Arranca o servidor Django num processo próprio (WSGI, ASGI no uvicorn ou um
+# comando externo como o gunicorn), com a base de dados e as pastas de dados
+# numa pasta temporária (ver graficalc_project/settings_carga.py), e simula N
+# sessões em simultâneo: cada sessão abre a página, envia um ficheiro de vendas
+# gerado com o tamanho pedido e corre os cenários de CENARIOS pela ordem.
+# Mede, por nível de concorrência, o débito, os percentis de latência, as
+# fases do servidor (lidas de /metrics antes e depois), o pico de memória do
+# servidor e o crescimento da tabela de sessões. Não precisa de rede externa.
+
+ENDERECO = '127.0.0.1'
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMINHO_VENDAS = os.path.join(RAIZ, 'vendas_teste.csv')
+
+# (nome, envia o ficheiro, script)
+CENARIOS = (
+    ('carregar', True,
+     'CARREGAR ARQUIVO COMO vendas\n'
+     'MOSTRAR DADOS DE vendas\n'
+     'CALCULAR MEDIA DA COLUNA "Faturamento" DE vendas\n'
+     'PLOTAR GRAFICO DE BARRAS COM EIXO_X "Mês" E EIXO_Y "Faturamento" DE vendas'),
+    ('analisar', False,
+     'CRIAR COLUNA "Lucro" = "Faturamento" - "Despesas" EM vendas\n'
+     'CALCULAR MEDIANA DA COLUNA "Lucro" E MEDIA DA COLUNA "Despesas" DE vendas AGRUPAR POR "Mês" COMO por_mes\n'
+     'PLOTAR GRAFICO DE LINHAS COM EIXO_X "Mês" E EIXO_Y "mediana_Lucro" DE por_mes'),
+    ('filtrar', False,
+     'FILTRAR vendas ONDE "Faturamento" >= 20000 COMO altos\n'
+     'CALCULAR MODA DA COLUNA "Despesas" DE altos\n'
+     'PLOTAR GRAFICO DE BARRAS COM EIXO_X "Mês" E EIXO_Y "Despesas" DE altos'),
+)
+
+ROTAS = {'interface': '/', 'fluxo': '/executar/fluxo/?formato=ndjson'}
+
+
+# DADOS
+
+def gerar_vendas(caminho, linhas, semente):
+    # O vendas_teste.csv repetido até `linhas`, com ruído nos valores para que
+    # cada sessão envie dados diferentes (e as caches não os reconheçam)
+    import numpy as np
+    import pandas as pd
+    base = pd.read_csv(CAMINHO_VENDAS)
+    gerador = np.random.default_rng(semente)
+    indices = np.arange(linhas) % len(base)
+    df = base.iloc[indices].reset_index(drop=True)
+    for coluna in ('Faturamento', 'Despesas'):
+        df[coluna] = np.round(df[coluna] * gerador.uniform(0.8, 1.2, linhas), 2)
+    df.to_csv(caminho, index=False)
+    return caminho
+
+
+def corpo_multipart(campos, ficheiros):
+    fronteira = uuid.uuid4().hex
+    partes = []
+    for nome, valor in campos.items():
+        partes.append(f'--{fronteira}\r\nContent-Disposition: form-data; name="{nome}"\r\n\r\n'.encode('utf-8'))
+        partes.append(valor.encode('utf-8') + b'\r\n')
+    for nome, (nome_ficheiro, conteudo) in ficheiros.items():
+        partes.append((f'--{fronteira}\r\nContent-Disposition: form-data; name="{nome}"; filename="{nome_ficheiro}"\r\n'
+                       'Content-Type: text/csv\r\n\r\n').encode('utf-8'))
+        partes.append(conteudo + b'\r\n')
+    partes.append(f'--{fronteira}--\r\n'.encode('utf-8'))
+    return b''.join(partes), f'multipart/form-data; boundary={fronteira}'
+
+
+# SERVIDOR
+# O servidor WSGI embutido é o do runserver do Django (uma thread por ligação,
+# num único processo). A interface ASGI corre no uvicorn (dependência
+# opcional, pip install uvicorn); outros servidores, como o gunicorn, entram
+# com um comando externo.
+
+SCRIPT_SERVIDOR = '''
+import sys
+from interpreter.carga import servir
+servir(int(sys.argv[1]))
+'''
+
+COMANDO_ASGI = '"{python}" -m uvicorn graficalc_project.asgi:application --host {endereco} --port {porta} --log-level warning'
+
+
+def servir(porta):
+    import logging
+    from graficalc_project.wsgi import application
+    from django.core.servers.basehttp import run
+    # Depois do django.setup() (feito ao importar a aplicação): só os erros do
+    # servidor aparecem, uma linha por pedido atrasaria o teste
+    logging.getLogger('django.server').setLevel(logging.WARNING)
+    run(ENDERECO, porta, application, threading=True)
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind((ENDERECO, 0))
+        return sock.getsockname()[1]
+
+
+def ambiente_servidor(pasta, definicoes):
+    ambiente = dict(os.environ)
+    ambiente.update({
+        'DJANGO_SETTINGS_MODULE': 'graficalc_project.settings_carga',
+        'GRAFICALC_CARGA_PASTA': pasta,
+        'GRAFICALC_CARGA_DEFINICOES': json.dumps(definicoes or {}),
+    })
+    return ambiente
+
+
+def iniciar_servidor(interface, pasta, definicoes=None, comando=None):
+    # `comando`: servidor externo, com {porta}, {endereco} e {python} no texto
+    # (ex.: "gunicorn graficalc_project.wsgi -w 4 -b {endereco}:{porta}")
+    if interface == 'asgi' and not comando:
+        if importlib.util.find_spec('uvicorn') is None:
+            raise RuntimeError("A interface asgi corre no uvicorn, que não está instalado (pip install uvicorn).")
+        comando = COMANDO_ASGI
+    ambiente = ambiente_servidor(pasta, definicoes)
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '--verbosity', '0'], cwd=RAIZ, env=ambiente, check=True)
+
+    porta = porta_livre()
+    if comando:
+        argumentos = shlex.split(comando.format(porta=porta, endereco=ENDERECO, python=sys.executable))
+    else:
+        argumentos = [sys.executable, '-c', SCRIPT_SERVIDOR, str(porta)]
+    try:
+        # Um grupo de processos próprio, para terminar também os processos de renderização
+        processo = subprocess.Popen(argumentos, cwd=RAIZ, env=ambiente, start_new_session=True)
+    except FileNotFoundError:
+        raise RuntimeError(f"O comando do servidor não foi encontrado: {argumentos[0]}")
+    esperar_servidor(processo, porta)
+    return processo, porta
+
+
+def esperar_servidor(processo, porta, limite_segundos=60):
+    limite = time.monotonic() + limite_segundos
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError(f"O servidor terminou ao arrancar (código {processo.returncode}).")
+        try:
+            ler_metricas(porta)
+            return
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.1)
+    parar_servidor(processo)
+    raise RuntimeError(f"O servidor não respondeu em {limite_segundos} s.")
+
+
+def parar_servidor(processo):
+    if processo.poll() is None:
+        os.killpg(processo.pid, signal.SIGTERM)
+        try:
+            processo.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(processo.pid, signal.SIGKILL)
+            processo.wait()
+
+
+# MEMÓRIA DO SERVIDOR
+# Soma do RSS do servidor e dos seus descendentes (processos de renderização,
+# workers), amostrada a cada `intervalo` segundos. Lê o /proc, por isso só
+# funciona em Linux; nos outros sistemas o pico fica None.
+
+def memoria_processo(pid, campo='VmRSS'):
+    # VmRSS: memória residente agora; VmHWM: pico desde o arranque do processo
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii') as ficheiro:
+            for linha in ficheiro:
+                if linha.startswith(f'{campo}:'):
+                    return int(linha.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def descendentes(pid):
+    filhos = {}
+    for nome in os.listdir('/proc'):
+        if not nome.isdigit():
+            continue
+        try:
+            with open(f'/proc/{nome}/stat', encoding='ascii', errors='replace') as ficheiro:
+                # O nome do processo vem entre parênteses e pode ter espaços
+                pai = int(ficheiro.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        filhos.setdefault(pai, []).append(int(nome))
+    encontrados, pendentes = [], [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        encontrados.append(atual)
+        pendentes.extend(filhos.get(atual, []))
+    return encontrados
+
+
+class AmostradorMemoria:
+
+    def __init__(self, pid, intervalo=0.2):
+        self.pid = pid
+        self.intervalo = intervalo
+        self.pico = None
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+
+    def _amostrar(self):
+        while not self._parar.is_set():
+            self.pico = max(self.pico or 0, sum(memoria_processo(pid) or 0 for pid in descendentes(self.pid)))
+            self._parar.wait(self.intervalo)
+
+    def __enter__(self):
+        if os.path.isdir('/proc'):
+            self._thread.start()
+        return self
+
+    def __exit__(self, *excecao):
+        self._parar.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+# TABELA DE SESSÕES E ARMAZÉM
+
+def tamanho_pasta(pasta):
+    total = 0
+    for raiz, _, nomes in os.walk(pasta):
+        for nome in nomes:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nome))
+            except OSError:
+                pass
+    return total
+
+
+def estado_sessoes(pasta):
+    base_dados = os.path.join(pasta, 'db.sqlite3')
+    with sqlite3.connect(base_dados) as ligacao:
+        linhas = ligacao.execute('SELECT COUNT(*) FROM django_session').fetchone()[0]
+    ficheiros = [base_dados + sufixo for sufixo in ('', '-wal', '-journal')]
+    return {
+        'linhas': linhas,
+        'bytes_bd': sum(os.path.getsize(caminho) for caminho in ficheiros if os.path.exists(caminho)),
+        'bytes_armazem': tamanho_pasta(os.path.join(pasta, 'dados_sessao')),
+    }
+
+
+# MÉTRICAS DO SERVIDOR
+# Com vários processos do servidor (gunicorn -w N), /metrics mostra só o
+# processo que respondeu, por isso as fases são uma amostra.
+
+PADRAO_METRICA = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+PADRAO_ETIQUETA = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def ler_metricas(porta):
+    ligacao = http.client.HTTPConnection(ENDERECO, porta, timeout=10)
+    try:
+        ligacao.request('GET', '/metrics')
+        resposta = ligacao.getresponse()
+        texto = resposta.read().decode('utf-8')
+    finally:
+        ligacao.close()
+    if resposta.status != 200:
+        raise OSError(f"/metrics devolveu {resposta.status}")
+    return interpretar_metricas(texto)
+
+
+def interpretar_metricas(texto):
+    # {(nome, ((etiqueta, valor), ...)): valor}
+    valores = {}
+    for linha in texto.splitlines():
+        encontrado = PADRAO_METRICA.match(linha)
+        if not encontrado or linha.startswith('#'):
+            continue
+        nome, etiquetas, valor = encontrado.groups()
+        valores[(nome, tuple(sorted(PADRAO_ETIQUETA.findall(etiquetas or ''))))] = float(valor)
+    return valores
+
+
+def diferenca_histograma(antes, depois, nome, etiqueta):
+    # Tempo médio e total de cada série do histograma `nome` entre duas leituras
+    resumo = {}
+    for (metrica, etiquetas), soma in depois.items():
+        if metrica != f'{nome}_sum':
+            continue
+        contagem = depois.get((f'{nome}_count', etiquetas), 0) - antes.get((f'{nome}_count', etiquetas), 0)
+        soma -= antes.get((metrica, etiquetas), 0)
+        if contagem > 0:
+            serie = dict(etiquetas).get(etiqueta, '')
+            resumo[serie] = {'contagem': int(contagem), 'total_segundos': round(soma, 6),
+                             'media_segundos': round(soma / contagem, 6)}
+    return resumo
+
+
+# CLIENTE
+
+class SessaoCliente:
+    # Uma sessão de browser: ligação persistente, cookies e o token CSRF
+
+    def __init__(self, porta, ficheiro, rota):
+        self.porta = porta
+        self.rota = rota
+        self.cookies = {}
+        with open(ficheiro, 'rb') as origem:
+            self.ficheiro = (os.path.basename(ficheiro), origem.read())
+        self.ligacao = http.client.HTTPConnection(ENDERECO, porta, timeout=600)
+
+    def pedido(self, metodo, caminho, corpo=None, cabecalhos=None):
+        cabecalhos = dict(cabecalhos or {})
+        if self.cookies:
+            cabecalhos['Cookie'] = '; '.join(f'{nome}={valor}' for nome, valor in self.cookies.items())
+        inicio = time.perf_counter()
+        try:
+            self.ligacao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+            resposta = self.ligacao.getresponse()
+            primeiro_byte = time.perf_counter()
+            dados = resposta.read()
+        except (OSError, http.client.HTTPException):
+            # A ligação é reaberta no pedido seguinte
+            self.ligacao.close()
+            raise
+        fim = time.perf_counter()
+        for cookie in resposta.headers.get_all('Set-Cookie') or []:
+            nome, _, valor = cookie.split(';', 1)[0].partition('=')
+            self.cookies[nome.strip()] = valor.strip()
+        return resposta.status, dados, primeiro_byte - inicio, fim - inicio
+
+    def abrir(self):
+        return self.pedido('GET', '/')
+
+    def executar(self, script, com_ficheiro):
+        ficheiros = {'arquivo_dados': self.ficheiro} if com_ficheiro else {}
+        corpo, tipo = corpo_multipart({'codigo': script}, ficheiros)
+        return self.pedido('POST', ROTAS[self.rota], corpo, {
+            'Content-Type': tipo, 'X-CSRFToken': self.cookies.get('csrftoken', ''),
+        })
+
+    def fechar(self):
+        self.ligacao.close()
+
+
+MARCA_ERRO = 'class="resultado error"'
+
+
+def erros_no_script(dados, rota, erros_na_pagina):
+    # `erros_na_pagina`: marcas de erro da página vazia (o JavaScript tem uma)
+    texto = dados.decode('utf-8', errors='replace')
+    if rota == 'fluxo':
+        return sum(1 for linha in texto.splitlines() if linha and json.loads(linha).get('type') == 'error')
+    return texto.count(MARCA_ERRO) - erros_na_pagina
+
+
+def correr_sessao(indice, porta, ficheiro, rota, pedidos, inicio_comum):
+    sessao = SessaoCliente(porta, ficheiro, rota)
+    medicoes = []
+    erros_na_pagina = 0
+
+    def registar(cenario, executar):
+        nonlocal erros_na_pagina
+        try:
+            estado, dados, primeiro_byte, segundos = executar()
+            erros = 0
+            if cenario == 'abrir':
+                erros_na_pagina = dados.decode('utf-8', errors='replace').count(MARCA_ERRO)
+            elif estado == 200:
+                erros = erros_no_script(dados, rota, erros_na_pagina)
+            medicoes.append({
+                'sessao': indice, 'cenario': cenario, 'estado': estado, 'segundos': segundos,
+                'primeiro_byte': primeiro_byte, 'bytes': len(dados), 'erros_script': erros,
+            })
+        except (OSError, http.client.HTTPException) as e:
+            medicoes.append({'sessao': indice, 'cenario': cenario, 'estado': None, 'erro': str(e),
+                             'segundos': None, 'bytes': 0, 'erros_script': 0})
+
+    # Todas as sessões começam ao mesmo tempo
+    inicio_comum.wait()
+    try:
+        registar('abrir', sessao.abrir)
+        for pedido in range(pedidos):
+            nome, com_ficheiro, script = CENARIOS[pedido % len(CENARIOS)]
+            registar(nome, lambda: sessao.executar(script, com_ficheiro))
+    finally:
+        sessao.fechar()
+    return medicoes
+
+
+def percentil(valores, p):
+    # Interpolação linear entre as posições vizinhas (como numpy.percentile)
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+def resumo_latencias(segundos):
+    if not segundos:
+        return {'pedidos': 0}
+    return {
+        'pedidos': len(segundos),
+        'media': round(sum(segundos) / len(segundos), 6),
+        'p50': round(percentil(segundos, 50), 6),
+        'p95': round(percentil(segundos, 95), 6),
+        'p99': round(percentil(segundos, 99), 6),
+        'maximo': round(max(segundos), 6),
+    }
+
+
+def medir_nivel(porta, processo, pasta, ficheiros, sessoes, pedidos, rota):
+    metricas_antes = ler_metricas(porta)
+    sessoes_antes = estado_sessoes(pasta)
+    inicio_comum = threading.Barrier(sessoes + 1)
+
+    with AmostradorMemoria(processo.pid) as memoria, ThreadPoolExecutor(max_workers=sessoes) as executor:
+        futuros = [
+            executor.submit(correr_sessao, indice, porta, ficheiros[indice], rota, pedidos, inicio_comum)
+            for indice in range(sessoes)
+        ]
+        inicio_comum.wait()
+        inicio = time.perf_counter()
+        medicoes = [medicao for futuro in futuros for medicao in futuro.result()]
+        segundos = time.perf_counter() - inicio
+
+    metricas_depois = ler_metricas(porta)
+    sessoes_depois = estado_sessoes(pasta)
+    # A página inicial (GET) não conta para a latência dos scripts
+    scripts = [medicao for medicao in medicoes if medicao['cenario'] != 'abrir']
+    validos = [medicao for medicao in scripts if medicao['estado'] == 200]
+    return {
+        'sessoes': sessoes,
+        'pedidos': len(scripts),
+        'segundos': round(segundos, 4),
+        'pedidos_por_segundo': round(len(validos) / segundos, 3) if segundos else None,
+        'erros_http': sum(1 for medicao in medicoes if medicao['estado'] != 200),
+        'erros_script': sum(medicao['erros_script'] for medicao in scripts),
+        'latencia': resumo_latencias([medicao['segundos'] for medicao in validos]),
+        'primeiro_byte': resumo_latencias([medicao['primeiro_byte'] for medicao in validos]),
+        'por_cenario': {
+            nome: resumo_latencias([medicao['segundos'] for medicao in validos if medicao['cenario'] == nome])
+            for nome, _, _ in CENARIOS
+        },
+        'bytes_resposta_media': round(sum(medicao['bytes'] for medicao in validos) / len(validos)) if validos else 0,
+        'fases': diferenca_histograma(metricas_antes, metricas_depois, 'graficalc_fase_segundos', 'fase'),
+        'comandos': diferenca_histograma(metricas_antes, metricas_depois, 'graficalc_comando_segundos', 'comando'),
+        'memoria_pico_bytes': memoria.pico,
+        'tabela_sessoes': {
+            'antes': sessoes_antes, 'depois': sessoes_depois,
+            'linhas_novas': sessoes_depois['linhas'] - sessoes_antes['linhas'],
+            'bytes_bd_novos': sessoes_depois['bytes_bd'] - sessoes_antes['bytes_bd'],
+            'bytes_armazem_novos': sessoes_depois['bytes_armazem'] - sessoes_antes['bytes_armazem'],
+        },
+    }
+
+
+def executar_teste_carga(interfaces=('wsgi',), sessoes=(1, 4, 16), pedidos=6, linhas=100_000,
+                         rota='interface', definicoes=None, comando_servidor=None, pasta=None, ao_medir=None):
+    # Cada interface tem um servidor novo, com uma base de dados vazia; os
+    # níveis de concorrência correm por ordem no mesmo servidor.
+    # `ao_medir(interface, nivel)` é chamado no fim de cada nível.
+    import tempfile
+    with tempfile.TemporaryDirectory() as pasta_temporaria:
+        pasta = pasta or pasta_temporaria
+        pasta_dados = os.path.join(pasta, 'uploads')
+        os.makedirs(pasta_dados, exist_ok=True)
+        # Um ficheiro diferente por sessão de cada nível (e para o aquecimento),
+        # para que um nível não encontre nas caches os dados do anterior
+        def gerar(semente):
+            return gerar_vendas(os.path.join(pasta_dados, f'vendas_{linhas}_{semente}.csv'), linhas, semente)
+
+        aquecimento, ficheiros, semente = gerar(0), [], 1
+        for quantidade in sessoes:
+            ficheiros.append([gerar(semente + indice) for indice in range(quantidade)])
+            semente += quantidade
+
+        execucoes = []
+        for interface in interfaces:
+            pasta_servidor = os.path.join(pasta, f'servidor_{interface}')
+            os.makedirs(pasta_servidor, exist_ok=True)
+            processo, porta = iniciar_servidor(interface, pasta_servidor, definicoes, comando_servidor)
+            try:
+                # Uma sessão por cenário, sem medir: importa o pandas e o matplotlib
+                # e arranca os processos de renderização antes do primeiro nível
+                correr_sessao(-1, porta, aquecimento, rota, len(CENARIOS), threading.Barrier(1))
+                niveis = []
+                for quantidade, ficheiros_nivel in zip(sessoes, ficheiros):
+                    nivel = medir_nivel(porta, processo, pasta_servidor, ficheiros_nivel, quantidade, pedidos, rota)
+                    niveis.append(nivel)
+                    if ao_medir:
+                        ao_medir(interface, nivel)
+                pico_processo = memoria_processo(processo.pid, 'VmHWM')
+            finally:
+                parar_servidor(processo)
+            execucoes.append({'interface': interface, 'niveis': niveis, 'memoria_pico_processo_bytes': pico_processo})
+
+    return {
+        'meta': {
+            'data': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'linhas': linhas,
+            'pedidos_por_sessao': pedidos,
+            'rota': rota,
+            'definicoes': definicoes or {},
+            'comando_servidor': comando_servidor,
+        },
+        'execucoes': execucoes,
+    }
+
@@ -0,0 +1,172 @@
+from dataclasses import dataclass
+
+
+# Representação intermédia dos comandos GrafiCalc. O parser produz um plano
+# imutável (tuplo de comandos) que o Interpretador executa depois.
+
+@dataclass(frozen=True)
+class Comando:
+    linha: int
+
+    def leituras(self):
+        return ()
+
+    def escritas(self):
+        return ()
+
+    def colunas(self, variavel):
+        # Colunas de `variavel` que o comando usa; None significa todas
+        return None
+
+    def origem(self, variavel):
+        # Variável lida cujas colunas passam para `variavel` (uma das escritas),
+        # ou None se o comando produz colunas novas
+        return None
+
+    def colunas_criadas(self, variavel):
+        # Colunas que o comando acrescenta às da origem
+        return frozenset()
+
+
+@dataclass(frozen=True)
+class MostrarDados(Comando):
+    variavel: str
+
+    def leituras(self):
+        return (self.variavel,)
+
+
+@dataclass(frozen=True)
+class MostrarMemoria(Comando):
+    variavel: str
+
+    def leituras(self):
+        return (self.variavel,)
+
+
+@dataclass(frozen=True)
+class CarregarDados(Comando):
+    ficheiro: str
+    variavel: str
+    em_blocos: bool = False
+    compacto: bool = False
+    planilha: str = None
+    cabecalho: int = 1
+
+    def escritas(self):
+        return (self.variavel,)
+
+
+@dataclass(frozen=True)
+class CarregarArquivo(Comando):
+    variavel: str
+    em_blocos: bool = False
+    compacto: bool = False
+    planilha: str = None
+    cabecalho: int = 1
+
+    def escritas(self):
+        return (self.variavel,)
+
+
+@dataclass(frozen=True)
+class Calcular(Comando):
+    tipo: str
+    coluna: str
+    variavel: str
+
+    def leituras(self):
+        return (self.variavel,)
+
+    def colunas(self, variavel):
+        return frozenset([self.coluna])
+
+
+@dataclass(frozen=True)
+class CalcularAgrupado(Comando):
+    # `calculos`: pares (tipo, coluna), todos feitos na mesma passagem
+    calculos: tuple
+    variavel: str
+    agrupar: tuple
+    destino: str
+
+    def leituras(self):
+        return (self.variavel,)
+
+    def escritas(self):
+        return (self.destino,)
+
+    def colunas(self, variavel):
+        return frozenset(coluna for _, coluna in self.calculos) | frozenset(self.agrupar)
+
+
+@dataclass(frozen=True)
+class CriarColuna(Comando):
+    # `expressao`: árvore de tuplos (ver expressoes.py)
+    coluna: str
+    expressao: tuple
+    variavel: str
+
+    def leituras(self):
+        return (self.variavel,)
+
+    def escritas(self):
+        return (self.variavel,)
+
+    def colunas(self, variavel):
+        from .expressoes import colunas_usadas
+        return colunas_usadas(self.expressao)
+
+    def origem(self, variavel):
+        return self.variavel
+
+    def colunas_criadas(self, variavel):
+        return frozenset([self.coluna])
+
+
+@dataclass(frozen=True)
+class Filtrar(Comando):
+    # `operador`: '==', '!=', '>', '<', '>=' ou '<='
+    variavel: str
+    coluna: str
+    operador: str
+    valor: object
+    destino: str
+
+    def leituras(self):
+        return (self.variavel,)
+
+    def escritas(self):
+        return (self.destino,)
+
+    def colunas(self, variavel):
+        return frozenset([self.coluna])
+
+    def origem(self, variavel):
+        return self.variavel
+
+
+@dataclass(frozen=True)
+class Plotar(Comando):
+    tipo: str
+    coluna_x: str
+    coluna_y: str
+    variavel: str
+    ficheiro_saida: str = "grafico_gerado.png"
+    reduzir: bool = True
+
+    def leituras(self):
+        return (self.variavel,)
+
+    def colunas(self, variavel):
+        return frozenset([self.coluna_x, self.coluna_y])
+
+
+@dataclass(frozen=True)
+class PlanoCompilado:
+    comandos: tuple
+    erros: tuple = ()
+
+    @property
+    def valido(self):
+        return not self.erros
@@ -0,0 +1,86 @@
+# LEITURA DE FICHEIROS EXCEL
+# Lê uma folha com o openpyxl em modo só de leitura: as linhas são percorridas
+# uma a uma a partir do XML e os valores vão diretamente para uma lista por
+# coluna, sem construir o modelo do livro em memória. As outras folhas do
+# livro nunca são analisadas.
+
+
+def abrir_folha(livro, planilha):
+    if planilha is None:
+        return livro.worksheets[0]
+    if planilha not in livro.sheetnames:
+        disponiveis = ', '.join(f"'{nome}'" for nome in livro.sheetnames)
+        raise ValueError(f"A planilha '{planilha}' não existe no ficheiro. Planilhas: {disponiveis}")
+    return livro[planilha]
+
+
+def nomes_colunas(cabecalhos):
+    # Como no pandas: células vazias ficam "Unnamed: n" e nomes repetidos levam ".1", ".2", ...
+    nomes, vistos = [], {}
+    for indice, valor in enumerate(cabecalhos):
+        nome = f"Unnamed: {indice}" if valor is None else str(valor)
+        base = nome
+        while nome in vistos:
+            vistos[base] += 1
+            nome = f"{base}.{vistos[base]}"
+        vistos[nome] = 0
+        nomes.append(nome)
+    return nomes
+
+
+def ler_cabecalho(folha, cabecalho):
+    for linha in folha.iter_rows(min_row=cabecalho, max_row=cabecalho, values_only=True):
+        # O modo só de leitura devolve as células vazias no fim da linha
+        linha = list(linha)
+        while linha and linha[-1] is None:
+            linha.pop()
+        return nomes_colunas(linha)
+    return []
+
+
+def colunas_excel(caminho, planilha=None, cabecalho=1):
+    from openpyxl import load_workbook
+    livro = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        return ler_cabecalho(abrir_folha(livro, planilha), cabecalho)
+    finally:
+        livro.close()
+
+
+def ler_folha_excel(caminho, usecols=None, planilha=None, cabecalho=1):
+    # `cabecalho`: número (a partir de 1) da linha com os nomes das colunas
+    import pandas as pd
+    from openpyxl import load_workbook
+
+    livro = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        folha = abrir_folha(livro, planilha)
+        nomes = ler_cabecalho(folha, cabecalho)
+        if usecols is not None:
+            em_falta = [coluna for coluna in usecols if coluna not in nomes]
+            if em_falta:
+                raise ValueError(f"Colunas inexistentes na planilha: {em_falta}")
+        indices = [indice for indice, nome in enumerate(nomes) if usecols is None or nome in usecols]
+
+        valores = [[] for _ in indices]
+        linhas_lidas = ultima_com_dados = 0
+        # As células à direita da última coluna pedida não são convertidas
+        ultima_coluna = max(indices) + 1 if indices else 1
+        for linha in folha.iter_rows(min_row=cabecalho + 1, max_col=ultima_coluna, values_only=True):
+            tamanho = len(linha)
+            vazia = True
+            for destino, indice in zip(valores, indices):
+                valor = linha[indice] if indice < tamanho else None
+                destino.append(valor)
+                if valor is not None:
+                    vazia = False
+            linhas_lidas += 1
+            if not vazia:
+                ultima_com_dados = linhas_lidas
+    finally:
+        livro.close()
+
+    # Linhas vazias no fim da folha (com formatação, por exemplo) não contam
+    return pd.DataFrame({
+        nomes[indice]: pd.Series(coluna[:ultima_com_dados]) for indice, coluna in zip(indices, valores)
+    }, columns=[nomes[indice] for indice in indices])
@@ -0,0 +1,164 @@
+import functools
+
+
+# EXPRESSÕES (CRIAR COLUNA)
+# O parser representa cada expressão como uma árvore de tuplos:
+#   ('coluna', nome) | ('numero', valor) | ('negativo', expressao)
+#   ('binario', operador, esquerda, direita) | ('funcao', nome, argumentos)
+# A árvore é compilada uma vez numa função de ufuncs do NumPy e avaliada por
+# blocos de linhas: os arrays intermédios de cada bloco cabem na cache do
+# processador e são reaproveitados (out=) entre operações, em vez de cada
+# operação alocar um array do tamanho da coluna inteira. As ufuncs são
+# indicadas pelo nome para o NumPy só ser importado na primeira avaliação.
+
+TAMANHO_BLOCO = 65_536
+
+OPERADORES = {
+    '+': 'add',
+    '-': 'subtract',
+    '*': 'multiply',
+    '/': 'true_divide',
+    '^': 'power',
+    '>': 'greater',
+    '<': 'less',
+    '>=': 'greater_equal',
+    '<=': 'less_equal',
+    '==': 'equal',
+    '!=': 'not_equal',
+}
+
+# nome: (função, mínimo de argumentos, máximo de argumentos)
+FUNCOES = {
+    'ABS': ('absolute', 1, 1),
+    'RAIZ': ('sqrt', 1, 1),
+    'LOG': ('log', 1, 1),
+    'EXP': ('exp', 1, 1),
+    'MINIMO': ('fmin', 2, 2),
+    'MAXIMO': ('fmax', 2, 2),
+    'ARREDONDAR': ('round', 1, 2),
+}
+
+
+def erro_funcao(nome, argumentos):
+    # Mensagem de erro para uma chamada inválida, ou None se for válida
+    if nome not in FUNCOES:
+        return f"Função desconhecida '{nome}'. Use: {', '.join(FUNCOES)}."
+    _, minimo, maximo = FUNCOES[nome]
+    if not minimo <= len(argumentos) <= maximo:
+        esperado = minimo if minimo == maximo else f"{minimo} ou {maximo}"
+        return f"A função '{nome}' recebe {esperado} argumento(s)."
+    if nome == 'ARREDONDAR' and len(argumentos) == 2 and (
+            argumentos[1][0] != 'numero' or not isinstance(argumentos[1][1], int)):
+        return "O segundo argumento de 'ARREDONDAR' (casas decimais) tem de ser um número inteiro."
+    return None
+
+
+def colunas_usadas(arvore):
+    if arvore[0] == 'coluna':
+        return frozenset([arvore[1]])
+    if arvore[0] == 'numero':
+        return frozenset()
+    if arvore[0] == 'negativo':
+        return colunas_usadas(arvore[1])
+    if arvore[0] == 'binario':
+        return colunas_usadas(arvore[2]) | colunas_usadas(arvore[3])
+    return frozenset().union(*(colunas_usadas(argumento) for argumento in arvore[2]))
+
+
+def usa_decimais(arvore):
+    # Divisões, potências e funções dão decimais mesmo com colunas inteiras
+    if arvore[0] == 'binario':
+        return arvore[1] in ('/', '^') or usa_decimais(arvore[2]) or usa_decimais(arvore[3])
+    if arvore[0] == 'negativo':
+        return usa_decimais(arvore[1])
+    return arvore[0] == 'funcao'
+
+
+def promover(valores, tipo_inteiro):
+    # Colunas compactas (uint8, int16, float32, ...) e booleanas passam a 64
+    # bits antes de calcular: com o tipo original, 100 - 150 em uint8 daria 206
+    if valores.dtype.kind in 'biu':
+        return valores.astype(tipo_inteiro, copy=False)
+    if valores.dtype.kind == 'f':
+        return valores.astype('float64', copy=False)
+    return valores
+
+
+def aplicar(ufunc, *operandos):
+    import numpy as np
+    # Cada operando é (valor, temporario); um temporário deste bloco pode
+    # receber o resultado se já tiver o tipo certo
+    valores = [valor for valor, _ in operandos]
+    if not any(isinstance(valor, np.ndarray) for valor in valores):
+        return ufunc(*valores), False
+    # Os números do script ficam como escalares Python, para o NumPy manter o tipo das colunas
+    tipo = ufunc(*(np.zeros(1, dtype=valor.dtype) if isinstance(valor, np.ndarray) else valor for valor in valores)).dtype
+    for valor, temporario in operandos:
+        if temporario and valor.dtype == tipo and valor.shape == np.broadcast_shapes(*(np.shape(v) for v in valores)):
+            return ufunc(*valores, out=valor), True
+    resultado = ufunc(*valores)
+    return resultado, isinstance(resultado, np.ndarray)
+
+
+def compilar_no(arvore):
+    import numpy as np
+    tipo = arvore[0]
+    if tipo == 'coluna':
+        nome = arvore[1]
+        return lambda dados: (dados[nome], False)
+    if tipo == 'numero':
+        valor = arvore[1]
+        return lambda dados: (valor, False)
+    if tipo == 'negativo':
+        operando = compilar_no(arvore[1])
+        return lambda dados: aplicar(np.negative, operando(dados))
+    if tipo == 'binario':
+        ufunc, esquerda, direita = getattr(np, OPERADORES[arvore[1]]), compilar_no(arvore[2]), compilar_no(arvore[3])
+        return lambda dados: aplicar(ufunc, esquerda(dados), direita(dados))
+
+    nome, argumentos = arvore[1], [compilar_no(argumento) for argumento in arvore[2]]
+    funcao = getattr(np, FUNCOES[nome][0])
+    if nome == 'ARREDONDAR':
+        casas = int(arvore[2][1][1]) if len(arvore[2]) == 2 else 0
+        def arredondar(dados):
+            resultado = np.round(argumentos[0](dados)[0], casas)
+            return resultado, isinstance(resultado, np.ndarray)
+        return arredondar
+    return lambda dados: aplicar(funcao, *(argumento(dados) for argumento in argumentos))
+
+
+@functools.lru_cache(maxsize=256)
+def compilar_expressao(arvore):
+    no = compilar_no(arvore)
+    return lambda dados: no(dados)[0]
+
+
+def avaliar(arvore, colunas, linhas):
+    # `colunas`: nome -> array NumPy com `linhas` valores
+    import numpy as np
+    funcao = compilar_expressao(arvore)
+    tipo_inteiro = 'float64' if usa_decimais(arvore) else 'int64'
+    with np.errstate(all='ignore'):
+        if linhas <= TAMANHO_BLOCO:
+            return completar(funcao({nome: promover(valores, tipo_inteiro) for nome, valores in colunas.items()}), linhas)
+
+        saida = None
+        for inicio in range(0, linhas, TAMANHO_BLOCO):
+            fim = min(inicio + TAMANHO_BLOCO, linhas)
+            # A conversão é feita bloco a bloco, sem cópias da coluna inteira
+            bloco = completar(funcao({
+                nome: promover(valores[inicio:fim], tipo_inteiro) for nome, valores in colunas.items()
+            }), fim - inicio)
+            if saida is None:
+                saida = np.empty(linhas, dtype=bloco.dtype)
+            saida[inicio:fim] = bloco
+        return saida
+
+
+def completar(resultado, linhas):
+    # Expressões só com números dão um valor único, repetido em todas as linhas
+    import numpy as np
+    resultado = np.asarray(resultado)
+    if resultado.ndim == 0:
+        return np.full(linhas, resultado)
+    return resultado
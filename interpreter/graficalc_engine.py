@@ -1,18 +1,101 @@
 import ply.lex as lex
 import ply.yacc as yacc
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from scipy import stats
 import os
 import io
-import base64
+import copy
+import dataclasses
+import hashlib
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import Future
+from .comandos import (
+    PlanoCompilado, MostrarDados, CarregarDados, CarregarArquivo, Calcular, Plotar,
+    MostrarMemoria, CalcularAgrupado, CriarColuna, Filtrar,
+)
+from .planeamento import planear_projecoes, grafo_dependencias
+from .incremental import impressao_digital, derivar_impressao
+from .cache_leitura import hash_ficheiro
+from .armazenamento import VariaveisSessao
+from .blocos import DadosEmBlocos, TAMANHO_BLOCO_PADRAO
+from .memoria import otimizar_tipos, relatorio_memoria
+from . import metricas
+from .renderizador import RenderizadorGraficos
+from .reducao import reduzir_pontos
+from .agregacao import agregar
+from .excel import ler_folha_excel, colunas_excel
+from .expressoes import avaliar, erro_funcao
+from .indices import filtrar_posicoes
 
 
-variaveis = {}
-resultados_execucao = []
-caminho_arquivo_upload_temporario = None
+# O pandas, o matplotlib e o scipy demoram mais a importar do que o resto do
+# servidor; só são importados no primeiro comando que precisa deles.
+
+# Sem renderizador configurado, os gráficos são desenhados na própria thread
+renderizador_padrao = RenderizadorGraficos()
+
+
+# LEITURA DE FICHEIROS
+
+def ler_csv(caminho, usecols=None):
+    import pandas as pd
+    return pd.read_csv(caminho, usecols=usecols)
+
+def ler_ficheiro(caminho, cache_leitura=None, colunas=None, planilha=None, cabecalho=1):
+    opcoes = {}
+    if caminho.endswith('.csv'):
+        if planilha is not None or cabecalho != 1:
+            raise ValueError("As opções PLANILHA e CABECALHO só se aplicam a ficheiros .xlsx")
+        leitor = ler_csv
+        if colunas:
+            opcoes['usecols'] = sorted(colunas)
+    elif caminho.endswith('.xlsx'):
+        return ler_excel(caminho, cache_leitura, colunas, planilha, cabecalho)
+    else:
+        raise ValueError("Formato de ficheiro não suportado. Use .csv ou .xlsx")
+
+    if cache_leitura is None:
+        return leitor(caminho, **opcoes)
+    return cache_leitura.ler(caminho, leitor, opcoes)
+
+def opcoes_excel(planilha, cabecalho):
+    # Só as opções diferentes do padrão, para a chave na cache não mudar
+    opcoes = {}
+    if planilha is not None:
+        opcoes['planilha'] = planilha
+    if cabecalho != 1:
+        opcoes['cabecalho'] = cabecalho
+    return opcoes
+
+def ler_excel(caminho, cache_leitura=None, colunas=None, planilha=None, cabecalho=1):
+    # Com a cache de leitura, a folha é convertida uma só vez e inteira: as
+    # projeções seguintes são recortadas da cópia em cache, sem voltar ao XLSX
+    opcoes = opcoes_excel(planilha, cabecalho)
+    if cache_leitura is None:
+        return ler_folha_excel(caminho, sorted(colunas) if colunas else None, **opcoes)
+    df = cache_leitura.ler(caminho, ler_folha_excel, opcoes)
+    if not colunas:
+        return df
+    em_falta = [coluna for coluna in colunas if coluna not in df.columns]
+    if em_falta:
+        raise ValueError(f"Colunas inexistentes na planilha: {em_falta}")
+    return df[[coluna for coluna in df.columns if coluna in colunas]]
+
+def contar_colunas(caminho, cache_leitura=None, planilha=None, cabecalho=1):
+    if caminho.endswith('.xlsx'):
+        if cache_leitura is not None:
+            # A folha inteira acabou de ser lida para a cache
+            return len(cache_leitura.ler(caminho, ler_folha_excel, opcoes_excel(planilha, cabecalho)).columns)
+        return len(colunas_excel(caminho, planilha, cabecalho))
+    import pandas as pd
+    return len(pd.read_csv(caminho, nrows=0).columns)
+
+def formatar_bytes(quantidade):
+    for unidade in ('B', 'KB', 'MB', 'GB'):
+        if quantidade < 1024 or unidade == 'GB':
+            return f"{quantidade:.0f} {unidade}" if unidade == 'B' else f"{quantidade:.1f} {unidade}"
+        quantidade /= 1024
 
 
 # LEXER 
@@ -23,15 +106,49 @@ reserved = {
     'MEDIANA': 'MEDIANA', 'MODA': 'MODA', 'DA': 'DA', 'COLUNA': 'COLUNA',
     'PLOTAR': 'PLOTAR', 'GRAFICO': 'GRAFICO', 'BARRAS': 'BARRAS',
     'LINHAS': 'LINHAS', 'COM': 'COM', 'EIXO_X': 'EIXO_X', 'EIXO_Y': 'EIXO_Y',
-    'E': 'E', 'SALVAR': 'SALVAR', 'ARQUIVO': 'ARQUIVO',
+    'E': 'E', 'SALVAR': 'SALVAR', 'ARQUIVO': 'ARQUIVO', 'EM': 'EM',
+    'BLOCOS': 'BLOCOS', 'COMPACTO': 'COMPACTO', 'MEMORIA': 'MEMORIA',
+    'SEM': 'SEM', 'REDUCAO': 'REDUCAO', 'AGRUPAR': 'AGRUPAR', 'POR': 'POR',
+    'PLANILHA': 'PLANILHA', 'CABECALHO': 'CABECALHO', 'CRIAR': 'CRIAR',
+    'FILTRAR': 'FILTRAR', 'ONDE': 'ONDE',
 }
-tokens = ['ID', 'STRING'] + list(reserved.values())
+tokens = [
+    'ID', 'STRING', 'NUMERO', 'DECIMAL',
+    'ATRIBUICAO', 'MAIS', 'MENOS', 'VEZES', 'DIVIDIR', 'POTENCIA', 'ABRE_PARENTESES', 'FECHA_PARENTESES',
+    'VIRGULA', 'MAIOR', 'MENOR', 'MAIOR_IGUAL', 'MENOR_IGUAL', 'IGUAL', 'DIFERENTE',
+] + list(reserved.values())
+
+t_ATRIBUICAO = r'='
+t_MAIS = r'\+'
+t_MENOS = r'-'
+t_VEZES = r'\*'
+t_DIVIDIR = r'/'
+t_POTENCIA = r'\^'
+t_ABRE_PARENTESES = r'\('
+t_FECHA_PARENTESES = r'\)'
+t_VIRGULA = r','
+t_MAIOR = r'>'
+t_MENOR = r'<'
+t_MAIOR_IGUAL = r'>='
+t_MENOR_IGUAL = r'<='
+t_IGUAL = r'=='
+t_DIFERENTE = r'!='
 
 def t_STRING(t):
     r'\"[^\"]*\"'
     t.value = t.value[1:-1]
     return t
 
+def t_DECIMAL(t):
+    r'\d+\.\d+'
+    t.value = float(t.value)
+    return t
+
+def t_NUMERO(t):
+    r'\d+'
+    t.value = int(t.value)
+    return t
+
 def t_ID(t):
     r'[a-zA-Z_][a-zA-Z_0-9]*'
     t.type = reserved.get(t.value.upper(), 'ID')
@@ -45,100 +162,110 @@ t_ignore = ' \t\r'
 
 def t_error(t):
     error_msg = f"Caractere ilegal encontrado: '{t.value[0]}'"
-    resultados_execucao.append({'type': 'error', 'content': error_msg})
+    t.lexer.erros.append(error_msg)
     t.lexer.skip(1)
 
 lexer = lex.lex()
 
 
 # PARSER
+# As ações da gramática só constroem os comandos (ver comandos.py); a execução
+# fica a cargo do Interpretador.
+
+precedence = (
+    ('nonassoc', 'MAIOR', 'MENOR', 'MAIOR_IGUAL', 'MENOR_IGUAL', 'IGUAL', 'DIFERENTE'),
+    ('left', 'MAIS', 'MENOS'),
+    ('left', 'VEZES', 'DIVIDIR'),
+    ('right', 'MENOS_UNARIO'),
+    ('right', 'POTENCIA'),
+)
 
 def p_programa(p):
     '''
     programa : comando
              | programa comando
     '''
-    pass
+    # Um comando pode dar origem a vários (ver p_comando_calcular)
+    if len(p) == 2:
+        p[0] = list(p[1]) if isinstance(p[1], list) else [p[1]]
+    else:
+        p[1].extend(p[2] if isinstance(p[2], list) else [p[2]])
+        p[0] = p[1]
 
 def p_comando_mostrar(p):
     'comando : MOSTRAR DADOS DE ID'
-    nome_variavel = p[4]
+    p[0] = MostrarDados(p.lineno(1), p[4])
 
-    if nome_variavel not in variaveis:
-        msg = f"Erro: A variável de dados '{nome_variavel}' não existe."
-        resultados_execucao.append({'type': 'error', 'content': msg})
-        return
+def p_comando_mostrar_memoria(p):
+    'comando : MOSTRAR MEMORIA DE ID'
+    p[0] = MostrarMemoria(p.lineno(1), p[4])
 
-    try:
-        df = variaveis[nome_variavel]
-        df_head = df.head()
-        tabela_html = df_head.to_html(classes='data-table', border=0, index=False, justify='left')
-        resultados_execucao.append({
-            'type': 'table', 
-            'content': tabela_html,
-            'variable_name': nome_variavel
-        })
+def p_comando_carregar(p):
+    'comando : CARREGAR DADOS DE STRING COMO ID opcoes_carga'
+    p[0] = CarregarDados(p.lineno(1), p[4], p[6], **p[7])
 
-    except Exception as e:
-        msg = f"Ocorreu um erro ao tentar mostrar os dados: {e}"
-        resultados_execucao.append({'type': 'error', 'content': msg})
+def p_opcoes_carga(p):
+    '''
+    opcoes_carga :
+                 | opcoes_carga opcao_carga
+    '''
+    if len(p) == 1:
+        p[0] = {}
+    else:
+        p[0] = {**p[1], **p[2]}
 
-def p_comando_carregar(p):
-    'comando : CARREGAR DADOS DE STRING COMO ID'
-    nome_ficheiro = p[4]
-    nome_variavel = p[6]
-    try:
-        if nome_ficheiro.endswith('.csv'):
-            df = pd.read_csv(nome_ficheiro)
-        elif nome_ficheiro.endswith('.xlsx'):
-            df = pd.read_excel(nome_ficheiro)
-        else:
-            raise ValueError("Formato de ficheiro não suportado. Use .csv ou .xlsx")
+def p_opcao_carga_blocos(p):
+    'opcao_carga : EM BLOCOS'
+    p[0] = {'em_blocos': True}
 
-        variaveis[nome_variavel] = df
-        msg = f"Dados do ficheiro '{nome_ficheiro}' carregados com sucesso na variável '{nome_variavel}'."
-        resultados_execucao.append({'type': 'message', 'content': msg})
+def p_opcao_carga_compacto(p):
+    'opcao_carga : COMPACTO'
+    p[0] = {'compacto': True}
 
-    except FileNotFoundError:
-        msg = f"Erro: O ficheiro '{nome_ficheiro}' não foi encontrado."
-        resultados_execucao.append({'type': 'error', 'content': msg})
-    except Exception as e:
-        msg = f"Ocorreu um erro ao carregar o ficheiro: {e}"
-        resultados_execucao.append({'type': 'error', 'content': msg})
+def p_opcao_carga_planilha(p):
+    'opcao_carga : PLANILHA STRING'
+    p[0] = {'planilha': p[2]}
+
+def p_opcao_carga_cabecalho(p):
+    'opcao_carga : CABECALHO NUMERO'
+    p[0] = {'cabecalho': p[2]}
 
 def p_comando_calcular(p):
-    'comando : CALCULAR tipo_calculo DA COLUNA STRING DE ID'
-    tipo_calculo = p[2]
-    nome_coluna = p[5]
-    nome_variavel = p[7]
-
-    if nome_variavel not in variaveis:
-        msg = f"Erro: A variável de dados '{nome_variavel}' não existe."
-        resultados_execucao.append({'type': 'error', 'content': msg})
-        return
-
-    df = variaveis[nome_variavel]
-    if nome_coluna not in df.columns:
-        msg = f"Erro: A coluna '{nome_coluna}' não existe na variável '{nome_variavel}'."
-        resultados_execucao.append({'type': 'error', 'content': msg})
-        return
+    'comando : CALCULAR calculos DE ID'
+    # Sem agrupamento, cada cálculo é um comando CALCULAR separado
+    p[0] = [Calcular(p.lineno(1), tipo, coluna, p[4]) for tipo, coluna in p[2]]
 
-    try:
-        coluna = df[nome_coluna].dropna() 
-        resultado = 0
-        if tipo_calculo.upper() == 'MEDIA':
-            resultado = coluna.mean()
-        elif tipo_calculo.upper() == 'MEDIANA':
-            resultado = coluna.median()
-        elif tipo_calculo.upper() == 'MODA':
-            resultado = stats.mode(coluna, keepdims=False)[0]
-
-        msg = f"A {tipo_calculo} da coluna '{nome_coluna}' é: {resultado:.2f}"
-        resultados_execucao.append({'type': 'message', 'content': msg})
+def p_comando_calcular_agrupado(p):
+    '''
+    comando : CALCULAR calculos DE ID AGRUPAR POR colunas_grupo
+            | CALCULAR calculos DE ID AGRUPAR POR colunas_grupo COMO ID
+    '''
+    destino = p[9] if len(p) == 10 else f"{p[4]}_agrupado"
+    p[0] = CalcularAgrupado(p.lineno(1), tuple(p[2]), p[4], tuple(p[7]), destino)
 
-    except Exception as e:
-        msg = f"Erro ao calcular a {tipo_calculo}: {e}"
-        resultados_execucao.append({'type': 'error', 'content': msg})
+def p_calculos(p):
+    '''
+    calculos : calculo
+             | calculos E calculo
+    '''
+    if len(p) == 2:
+        p[0] = [p[1]]
+    else:
+        p[0] = p[1] + [p[3]]
+
+def p_calculo(p):
+    'calculo : tipo_calculo DA COLUNA STRING'
+    p[0] = (p[1].upper(), p[4])
+
+def p_colunas_grupo(p):
+    '''
+    colunas_grupo : STRING
+                  | colunas_grupo E STRING
+    '''
+    if len(p) == 2:
+        p[0] = [p[1]]
+    else:
+        p[0] = p[1] + [p[3]]
 
 
 def p_tipo_calculo_media(p):
@@ -154,85 +281,126 @@ def p_tipo_calculo_moda(p):
     p[0] = p[1]
 
 def p_comando_plotar(p):
+    'comando : PLOTAR GRAFICO DE tipo_grafico COM EIXO_X STRING E EIXO_Y STRING DE ID opcoes_plotar'
+    p[0] = Plotar(p.lineno(1), p[4].upper(), p[7], p[10], p[12], **p[13])
+
+def p_opcoes_plotar(p):
     '''
-    comando : PLOTAR GRAFICO DE tipo_grafico COM EIXO_X STRING E EIXO_Y STRING DE ID SALVAR COMO STRING
-            | PLOTAR GRAFICO DE tipo_grafico COM EIXO_X STRING E EIXO_Y STRING DE ID
+    opcoes_plotar :
+                  | opcoes_plotar opcao_plotar
     '''
-    
-    if len(p) == 16: 
-        tipo_grafico = p[4]
-        coluna_x = p[7]
-        coluna_y = p[10]
-        nome_variavel = p[12]
-        nome_ficheiro_saida = p[15]
-    else: 
-        tipo_grafico = p[4]
-        coluna_x = p[7]
-        coluna_y = p[10]
-        nome_variavel = p[12]
-        nome_ficheiro_saida = "grafico_gerado.png" 
-
-    if nome_variavel not in variaveis:
-        msg = f"Erro: A variável de dados '{nome_variavel}' não existe."
-        resultados_execucao.append({'type': 'error', 'content': msg})
-        return
-
-    df = variaveis[nome_variavel]
-    if coluna_x not in df.columns or coluna_y not in df.columns:
-        msg = f"Erro: Uma ou ambas as colunas '{coluna_x}', '{coluna_y}' não existem em '{nome_variavel}'."
-        resultados_execucao.append({'type': 'error', 'content': msg})
-        return
+    if len(p) == 1:
+        p[0] = {}
+    else:
+        p[0] = {**p[1], **p[2]}
 
-    try:
-        plt.figure(figsize=(12, 5)) 
-        if tipo_grafico.upper() == 'BARRAS':
-            plt.bar(df[coluna_x], df[coluna_y])
-        elif tipo_grafico.upper() == 'LINHAS':
-            plt.plot(df[coluna_x], df[coluna_y])
-
-        plt.xlabel(coluna_x)
-        plt.ylabel(coluna_y)
-        plt.title(f'Gráfico de {tipo_grafico.capitalize()} de {coluna_y} por {coluna_x}')
-        plt.grid(True)
-        
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        plt.close()
-
-        resultados_execucao.append({'type': 'image', 'content': image_base64, 'filename': nome_ficheiro_saida})
+def p_opcao_plotar_salvar(p):
+    'opcao_plotar : SALVAR COMO STRING'
+    p[0] = {'ficheiro_saida': p[3]}
 
-    except Exception as e:
-        msg = f"Ocorreu um erro ao gerar o gráfico: {e}"
-        resultados_execucao.append({'type': 'error', 'content': msg})
+def p_opcao_plotar_sem_reducao(p):
+    'opcao_plotar : SEM REDUCAO'
+    p[0] = {'reduzir': False}
 
 
 def p_comando_carregar_arquivo(p):
-    'comando : CARREGAR ARQUIVO COMO ID'
-    nome_variavel = p[4]
+    'comando : CARREGAR ARQUIVO COMO ID opcoes_carga'
+    p[0] = CarregarArquivo(p.lineno(1), p[4], **p[5])
 
-    if not caminho_arquivo_upload_temporario:
-        msg = "Erro: O comando 'CARREGAR ARQUIVO' só pode ser usado com um upload de ficheiro."
-        resultados_execucao.append({'type': 'error', 'content': msg})
-        return
 
-    try:
-        if caminho_arquivo_upload_temporario.endswith('.csv'):
-            df = pd.read_csv(caminho_arquivo_upload_temporario)
-        elif caminho_arquivo_upload_temporario.endswith('.xlsx'):
-            df = pd.read_excel(caminho_arquivo_upload_temporario)
-        else:
-            raise ValueError("Formato de ficheiro não suportado. Use .csv ou .xlsx")
+def p_comando_criar_coluna(p):
+    'comando : CRIAR COLUNA STRING ATRIBUICAO expressao EM ID'
+    p[0] = CriarColuna(p.lineno(1), p[3], p[5], p[7])
 
-        variaveis[nome_variavel] = df
-        msg = f"Ficheiro enviado com sucesso e carregado na variável '{nome_variavel}'."
-        resultados_execucao.append({'type': 'message', 'content': msg})
+def p_expressao_binaria(p):
+    '''
+    expressao : expressao MAIS expressao
+              | expressao MENOS expressao
+              | expressao VEZES expressao
+              | expressao DIVIDIR expressao
+              | expressao POTENCIA expressao
+              | expressao MAIOR expressao
+              | expressao MENOR expressao
+              | expressao MAIOR_IGUAL expressao
+              | expressao MENOR_IGUAL expressao
+              | expressao IGUAL expressao
+              | expressao DIFERENTE expressao
+    '''
+    p[0] = ('binario', p[2], p[1], p[3])
 
-    except Exception as e:
-        msg = f"Ocorreu um erro ao carregar o ficheiro enviado: {e}"
-        resultados_execucao.append({'type': 'error', 'content': msg})
+def p_expressao_negativa(p):
+    'expressao : MENOS expressao %prec MENOS_UNARIO'
+    p[0] = ('negativo', p[2])
+
+def p_expressao_parenteses(p):
+    'expressao : ABRE_PARENTESES expressao FECHA_PARENTESES'
+    p[0] = p[2]
+
+def p_expressao_coluna(p):
+    'expressao : STRING'
+    p[0] = ('coluna', p[1])
+
+def p_expressao_numero(p):
+    '''
+    expressao : NUMERO
+              | DECIMAL
+    '''
+    p[0] = ('numero', p[1])
+
+def p_expressao_funcao(p):
+    'expressao : ID ABRE_PARENTESES argumentos FECHA_PARENTESES'
+    nome = p[1].upper()
+    erro = erro_funcao(nome, p[3])
+    if erro:
+        # Fica junto dos erros de sintaxe: o script não chega a ser executado
+        p.lexer.erros.append(f"{erro} (linha {p.lineno(1)})")
+    p[0] = ('funcao', nome, tuple(p[3]))
+
+def p_argumentos(p):
+    '''
+    argumentos : expressao
+               | argumentos VIRGULA expressao
+    '''
+    if len(p) == 2:
+        p[0] = [p[1]]
+    else:
+        p[0] = p[1] + [p[3]]
+
+def p_comando_filtrar(p):
+    '''
+    comando : FILTRAR ID ONDE STRING operador_filtro valor_filtro
+            | FILTRAR ID ONDE STRING operador_filtro valor_filtro COMO ID
+    '''
+    destino = p[8] if len(p) == 9 else f"{p[2]}_filtrado"
+    p[0] = Filtrar(p.lineno(1), p[2], p[4], p[5], p[6], destino)
+
+def p_operador_filtro(p):
+    '''
+    operador_filtro : IGUAL
+                    | ATRIBUICAO
+                    | DIFERENTE
+                    | MAIOR
+                    | MENOR
+                    | MAIOR_IGUAL
+                    | MENOR_IGUAL
+    '''
+    # "=" e "==" são a mesma comparação
+    p[0] = '==' if p[1] == '=' else p[1]
 
+def p_valor_filtro(p):
+    '''
+    valor_filtro : STRING
+                 | NUMERO
+                 | DECIMAL
+    '''
+    p[0] = p[1]
+
+def p_valor_filtro_negativo(p):
+    '''
+    valor_filtro : MENOS NUMERO
+                 | MENOS DECIMAL
+    '''
+    p[0] = -p[2]
 
 def p_tipo_grafico_barras(p):
     'tipo_grafico : BARRAS'
@@ -242,31 +410,700 @@ def p_tipo_grafico_linhas(p):
     'tipo_grafico : LINHAS'
     p[0] = p[1]
 
-def p_error(p):
+def mensagem_erro_sintaxe(p):
     if p:
-        msg = f"Erro de sintaxe no token '{p.value}' (tipo: {p.type}) na linha {p.lineno}"
-    else:
-        msg = "Erro de sintaxe: Fim inesperado do comando."
-    resultados_execucao.append({'type': 'error', 'content': msg})
+        return f"Erro de sintaxe no token '{p.value}' (tipo: {p.type}) na linha {p.lineno}"
+    return "Erro de sintaxe: Fim inesperado do comando."
 
-parser = yacc.yacc()
+def p_error(p):
+    # Cada compilação substitui a função de erro da sua cópia do parser
+    # (ver compilar_sem_cache)
+    raise SyntaxError(mensagem_erro_sintaxe(p))
 
+# As tabelas LALR vêm do interpreter/parsetab.py, gerado de antemão (ver
+# gerar_tabelas); importar o módulo não escreve nada no disco
+parser = yacc.yacc(debug=False, write_tables=False, tabmodule='interpreter.parsetab')
 
-# Comando principal
-def executar_comandos(codigo_graficalc, variaveis_sessao, caminho_arquivo=None):
-    global resultados_execucao, variaveis, caminho_arquivo_upload_temporario
+def gerar_tabelas():
+    # Regenera o interpreter/parsetab.py depois de alterar a gramática
+    return yacc.yacc(debug=False, tabmodule='parsetab', outputdir=os.path.dirname(os.path.abspath(__file__)))
+
+
+# COMPILAÇÃO
+# Cada compilação usa um clone do lexer e uma cópia do parser; as tabelas LALR
+# são partilhadas em modo de leitura. Os planos ficam numa LRU indexada pelo
+# hash do código, para que scripts reenviados não voltem a ser analisados.
+
+TAMANHO_CACHE_PLANOS = 256
+
+cache_planos = OrderedDict()
+lock_cache_planos = threading.Lock()
+
+def compilar_sem_cache(codigo_graficalc):
+    erros = []
+    lexer_local = lexer.clone()
+    lexer_local.lineno = 1
+    lexer_local.erros = erros
+    parser_local = copy.copy(parser)
+    parser_local.errorfunc = lambda p: erros.append(mensagem_erro_sintaxe(p))
+
+    comandos = parser_local.parse(codigo_graficalc, lexer=lexer_local) or []
+    return PlanoCompilado(tuple(comandos), tuple(erros))
+
+def compilar(codigo_graficalc):
+    with metricas.cronometrar(metricas.segundos_fase, fase='compilar'):
+        return compilar_com_cache(codigo_graficalc)
+
+def compilar_com_cache(codigo_graficalc):
+    chave = hashlib.sha256(codigo_graficalc.encode('utf-8')).hexdigest()
+    with lock_cache_planos:
+        if chave in cache_planos:
+            cache_planos.move_to_end(chave)
+            return cache_planos[chave]
+
+    plano = compilar_sem_cache(codigo_graficalc)
+    with lock_cache_planos:
+        cache_planos[chave] = plano
+        while len(cache_planos) > TAMANHO_CACHE_PLANOS:
+            cache_planos.popitem(last=False)
+    return plano
+
+
+# INTERPRETADOR
+# Cada execução tem o seu contexto: variáveis, resultados e ficheiro enviado.
+# O plano compilado é imutável e pode ser partilhado, por isso vários scripts
+# podem correr ao mesmo tempo no mesmo processo.
+
+class Interpretador:
 
-    resultados_execucao = []
-    variaveis = variaveis_sessao
-    caminho_arquivo_upload_temporario = caminho_arquivo 
+    def __init__(self, variaveis=None, caminho_arquivo=None, cache_leitura=None, projecao_colunas=True,
+                 tamanho_bloco=TAMANHO_BLOCO_PADRAO, strings_arrow=False, cache_execucao=None, perfil=False,
+                 renderizador=None, cache_indices=None, variaveis_guardadas=True):
+        self.variaveis = variaveis if variaveis is not None else {}
+        self.resultados = []
+        self.caminho_arquivo_upload = caminho_arquivo
+        self.cache_leitura = cache_leitura
+        self.projecao_colunas = projecao_colunas
+        self.projecoes = {}
+        self.tamanho_bloco = tamanho_bloco
+        self.strings_arrow = strings_arrow
+        self.cache_execucao = cache_execucao
+        self.impressoes = {}
+        self.escritas = {}
+        self.perfil = perfil
+        self.renderizador = renderizador or renderizador_padrao
+        self.cache_indices = cache_indices
+        self.variaveis_guardadas = variaveis_guardadas
 
-    parser.parse(codigo_graficalc, lexer=lexer)
+    def executar(self, codigo_graficalc):
+        return self.executar_plano(compilar(codigo_graficalc))
 
-    caminho_arquivo_upload_temporario = None 
-    return resultados_execucao, variaveis
+    def executar_plano(self, plano):
+        for _ in self.executar_passos(plano):
+            pass
+        return self.resultados
+
+    def executar_passos(self, plano, guardar_resultados=True):
+        # Gerador: devolve cada resultado assim que o comando que o produziu termina.
+        # Sem guardar_resultados, cada resultado é largado depois de entregue
+        # (fica None em self.resultados, para não mudar as posições dos seguintes)
+        if isinstance(plano, str):
+            plano = compilar(plano)
+        self.resultados = []
+
+        # O script inteiro é validado antes de correr qualquer comando
+        if not plano.valido:
+            for erro in plano.erros:
+                self.resultados.append({'type': 'error', 'content': erro})
+            yield from self.resultados
+            return
+
+        self.projecoes = planear_projecoes(plano, self.variaveis_guardadas) if self.projecao_colunas else {}
+        grafo = grafo_dependencias(plano)
+        self.impressoes = {}
+        emitidos = 0
+        for indice, comando in enumerate(plano.comandos):
+            self.executar_com_perfil(indice, comando, grafo[indice])
+            # Os gráficos ainda por desenhar não bloqueiam os comandos seguintes
+            emitidos = yield from self.emitir_resultados(emitidos, False, guardar_resultados)
+        yield from self.emitir_resultados(emitidos, True, guardar_resultados)
+
+    def emitir_resultados(self, emitidos, esperar, guardar):
+        # Devolve os resultados pela ordem dos comandos, trocando cada Future
+        # pelo resultado que produziu
+        while emitidos < len(self.resultados):
+            resultado = self.resultados[emitidos]
+            if isinstance(resultado, Future):
+                if not esperar and not resultado.done():
+                    break
+                resultado = self.resultados[emitidos] = resultado_final(resultado)
+            yield resultado
+            if not guardar:
+                self.resultados[emitidos] = None
+            emitidos += 1
+        return emitidos
+
+    def definir_variavel(self, nome, valor):
+        self.variaveis[nome] = valor
+        self.escritas[nome] = valor
+        self.impressoes.pop(nome, None)
+
+    # PERFIL
+    # Todos os comandos são cronometrados e contados nas métricas do processo.
+    # Com `perfil=True` mede-se também o pico de memória (tracemalloc, que torna
+    # as alocações mais lentas) e os números são juntos a cada resultado.
+
+    def executar_com_perfil(self, indice, comando, dependencias):
+        inicio = len(self.resultados)
+        if self.perfil:
+            memoria_inicial = iniciar_medicao_memoria()
+        tempo_inicial = time.perf_counter()
+        reutilizado = self.executar_comando(indice, comando, dependencias)
+        if self.perfil:
+            # Com o perfil ativo os gráficos são esperados para contarem no comando
+            self.resultados[inicio:] = [resultado_final(resultado) for resultado in self.resultados[inicio:]]
+        segundos = time.perf_counter() - tempo_inicial
+
+        nome = type(comando).__name__
+        metricas.segundos_comando.observar(segundos, comando=nome)
+        # Um comando reposto da cache não processou dados
+        linhas, quantidade_bytes = (0, 0) if reutilizado else self.volume_comando(comando)
+        if not reutilizado:
+            metricas.linhas_comando.incrementar(linhas, comando=nome)
+            metricas.bytes_comando.incrementar(quantidade_bytes, comando=nome)
+        if not self.perfil:
+            return
+
+        pico_memoria = terminar_medicao_memoria(memoria_inicial)
+        metricas.memoria_comando.observar(pico_memoria, comando=nome)
+        perfil = {'segundos': round(segundos, 6), 'memoria_pico': pico_memoria,
+                  'linhas': linhas, 'bytes': quantidade_bytes}
+        # Cópias: os dicionários originais podem estar guardados na cache de execução
+        self.resultados[inicio:] = [dict(resultado, perfil=perfil) for resultado in self.resultados[inicio:]]
+
+    def volume_comando(self, comando):
+        # Tamanho da variável escrita pelo comando ou, se não escreveu nenhuma, da que leu.
+        # Uma variável da sessão nunca é descodificada só para ser medida: se nenhum
+        # comando a leu, conta o tamanho guardado no armazém (e zero linhas).
+        nomes = list(self.escritas) or [nome for nome in comando.leituras() if nome in self.variaveis]
+        if not nomes:
+            return 0, 0
+        if isinstance(self.variaveis, VariaveisSessao):
+            dados = self.variaveis.carregada(nomes[0])
+            if dados is None:
+                return 0, self.variaveis.tamanho_guardado(nomes[0])
+        else:
+            dados = self.variaveis[nomes[0]]
+        if isinstance(dados, DadosEmBlocos):
+            return 0, os.path.getsize(dados.caminho)
+        return len(dados), int(dados.memory_usage(index=False).sum())
+
+    # REEXECUÇÃO INCREMENTAL
+    # Com uma cache de execução, cada comando é identificado pelo seu texto e
+    # pelas impressões digitais das entradas (variáveis lidas, ficheiros e
+    # opções). Se a chave já foi vista, os resultados (incluindo gráficos) e as
+    # variáveis escritas são repostos sem executar o comando.
+
+    def executar_comando(self, indice, comando, dependencias):
+        executor = getattr(self, self.EXECUTORES[type(comando)])
+        self.escritas = {}
+        if self.cache_execucao is None:
+            executor(comando)
+            return False
+
+        # Devolve True se os resultados foram repostos da cache
+        chave = self.chave_comando(indice, comando, dependencias)
+        guardado = self.cache_execucao.obter(chave)
+        repostos = None if guardado is None else self.repor_resultados(guardado[0])
+        if repostos is None and guardado is not None:
+            # Um gráfico já não está na cache de gráficos: o comando volta a ser executado
+            self.cache_execucao.descartar(chave)
+        if repostos is not None:
+            self.resultados.extend(repostos)
+            for nome, valor in guardado[1].items():
+                self.definir_variavel(nome, valor)
+                self.impressoes[nome] = derivar_impressao(chave, nome)
+            return True
+
+        inicio = len(self.resultados)
+        executor(comando)
+        for nome in self.escritas:
+            self.impressoes[nome] = derivar_impressao(chave, nome)
+        self.cache_execucao.guardar(chave, self.resultados[inicio:], self.escritas)
+        return False
+
+    def repor_resultados(self, resultados):
+        # Os gráficos guardados por URL podem ter sido apagados da cache de gráficos
+        # (limpar_disco); confirmar cada um também o marca como usado agora.
+        # Devolve None se algum já não existir.
+        repostos = []
+        for resultado in map(resultado_final, resultados):
+            if resultado.get('type') == 'image' and 'url' in resultado:
+                chave_grafico = resultado['url'].rsplit('/', 1)[1]
+                if self.renderizador.em_cache(chave_grafico, resultado['filename']) is None:
+                    return None
+            repostos.append(dict(resultado, reutilizado=True))
+        return repostos
+
+    def chave_comando(self, indice, comando, dependencias):
+        # A linha não entra na chave: mover um comando não o invalida
+        partes = [repr(dataclasses.replace(comando, linha=0))]
+        partes.append(repr((self.projecoes.get(comando), self.tamanho_bloco, self.strings_arrow)))
+        for variavel in sorted(dependencias):
+            partes.append(f"{variavel}={self.impressao_variavel(variavel)}")
+        partes.extend(self.entradas_externas(comando))
+        return hashlib.sha256('\n'.join(partes).encode('utf-8')).hexdigest()
+
+    def impressao_variavel(self, nome):
+        if nome in self.impressoes:
+            return self.impressoes[nome]
+        if nome not in self.variaveis:
+            return 'ausente'
+        chave_armazenada = getattr(self.variaveis, 'chave', lambda nome: None)(nome)
+        impressao = chave_armazenada or impressao_digital(self.variaveis[nome])
+        self.impressoes[nome] = impressao
+        return impressao
+
+    def entradas_externas(self, comando):
+        if isinstance(comando, CarregarDados):
+            caminho = comando.ficheiro
+        elif isinstance(comando, CarregarArquivo):
+            caminho = self.caminho_arquivo_upload
+        else:
+            return []
+        if not caminho or not os.path.exists(caminho):
+            return ['ficheiro=inexistente']
+        if comando.em_blocos:
+            estado = os.stat(caminho)
+            return [f"ficheiro={os.path.abspath(caminho)}:{estado.st_size}:{estado.st_mtime_ns}"]
+        return [f"ficheiro={os.path.splitext(caminho)[1]}:{hash_ficheiro(caminho)}"]
+
+    def comando_mostrar(self, comando):
+        nome_variavel = comando.variavel
+
+        if nome_variavel not in self.variaveis:
+            msg = f"Erro: A variável de dados '{nome_variavel}' não existe."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+
+        try:
+            df = self.variaveis[nome_variavel]
+            df_head = df.head()
+            tabela_html = df_head.to_html(classes='data-table', border=0, index=False, justify='left')
+            resultado = {
+                'type': 'table', 
+                'content': tabela_html,
+                'variable_name': nome_variavel
+            }
+            if isinstance(self.variaveis, VariaveisSessao):
+                # A janela de tabela mostra estes dados, mesmo que a variável mude depois
+                resultado['chave_dados'] = (self.variaveis.chave(nome_variavel)
+                                            or self.variaveis.armazem.guardar(df))
+            self.resultados.append(resultado)
+
+        except Exception as e:
+            msg = f"Ocorreu um erro ao tentar mostrar os dados: {e}"
+            self.resultados.append({'type': 'error', 'content': msg})
+
+    def comando_mostrar_memoria(self, comando):
+        nome_variavel = comando.variavel
+
+        if nome_variavel not in self.variaveis:
+            msg = f"Erro: A variável de dados '{nome_variavel}' não existe."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+
+        df = self.variaveis[nome_variavel]
+        if isinstance(df, DadosEmBlocos):
+            msg = f"A variável '{nome_variavel}' é lida em blocos de {df.tamanho_bloco} linhas e não fica em memória."
+            self.resultados.append({'type': 'message', 'content': msg})
+            return
+
+        try:
+            relatorio = relatorio_memoria(df)
+            tabela_html = relatorio.to_html(classes='data-table', border=0, index=False, justify='left')
+            self.resultados.append({
+                'type': 'table',
+                'content': tabela_html,
+                'variable_name': nome_variavel,
+                'title': f"Memória ocupada por '{nome_variavel}' (bytes por coluna):",
+            })
+
+        except Exception as e:
+            msg = f"Ocorreu um erro ao calcular a memória ocupada: {e}"
+            self.resultados.append({'type': 'error', 'content': msg})
+
+    def comando_carregar(self, comando):
+        nome_ficheiro = comando.ficheiro
+        nome_variavel = comando.variavel
+        try:
+            if comando.em_blocos:
+                self.carregar_em_blocos(nome_ficheiro, comando)
+                return
+
+            df, projecao = self.ler_com_projecao(nome_ficheiro, comando)
+            if comando.compacto:
+                df = otimizar_tipos(df, self.strings_arrow)
+
+            self.definir_variavel(nome_variavel, df)
+            msg = f"Dados do ficheiro '{nome_ficheiro}' carregados com sucesso na variável '{nome_variavel}'."
+            self.resultados.append(self.resultado_carga(msg, projecao))
+
+        except FileNotFoundError:
+            msg = f"Erro: O ficheiro '{nome_ficheiro}' não foi encontrado."
+            self.resultados.append({'type': 'error', 'content': msg})
+        except Exception as e:
+            msg = f"Ocorreu um erro ao carregar o ficheiro: {e}"
+            self.resultados.append({'type': 'error', 'content': msg})
+
+    def carregar_em_blocos(self, nome_ficheiro, comando):
+        if comando.planilha is not None or comando.cabecalho != 1:
+            raise ValueError("As opções PLANILHA e CABECALHO só se aplicam a ficheiros .xlsx")
+        caminho = os.path.abspath(nome_ficheiro)
+        try:
+            dados = DadosEmBlocos(caminho, self.tamanho_bloco, self.projecoes.get(comando))
+        except ValueError:
+            if not self.projecoes.get(comando):
+                raise
+            dados = DadosEmBlocos(caminho, self.tamanho_bloco)
+
+        self.definir_variavel(comando.variavel, dados)
+        msg = (f"Ficheiro '{nome_ficheiro}' ligado à variável '{comando.variavel}' para leitura em blocos"
+               f" de {self.tamanho_bloco} linhas.")
+        self.resultados.append({'type': 'message', 'content': msg})
+
+    def ler_com_projecao(self, caminho, comando):
+        opcoes = {'planilha': comando.planilha, 'cabecalho': comando.cabecalho}
+        colunas = self.projecoes.get(comando)
+        if not colunas:
+            return ler_ficheiro(caminho, self.cache_leitura, **opcoes), None
+
+        try:
+            df = ler_ficheiro(caminho, self.cache_leitura, colunas, **opcoes)
+        except ValueError:
+            # O script usa colunas que o ficheiro não tem: carga completa, e o
+            # comando que as usa reporta o erro habitual
+            return ler_ficheiro(caminho, self.cache_leitura, **opcoes), None
+
+        total_colunas = contar_colunas(caminho, self.cache_leitura, **opcoes)
+        ignoradas = max(total_colunas - len(df.columns), 0)
+        df.attrs['graficalc_projecao'] = list(df.columns)
+        projecao = {
+            'colunas_lidas': len(df.columns),
+            'colunas_ignoradas': ignoradas,
+            'bytes_ignorados': int(os.path.getsize(caminho) * ignoradas / total_colunas) if total_colunas else 0,
+        }
+        return df, projecao
+
+    def resultado_carga(self, msg, projecao):
+        if not projecao:
+            return {'type': 'message', 'content': msg}
+        if projecao['colunas_ignoradas']:
+            total = projecao['colunas_lidas'] + projecao['colunas_ignoradas']
+            msg += (f" Colunas lidas: {projecao['colunas_lidas']} de {total}, só as usadas no script"
+                    f" (~{formatar_bytes(projecao['bytes_ignorados'])} do ficheiro ignorados).")
+        return {'type': 'message', 'content': msg, 'projecao': projecao}
+
+    def erro_coluna_inexistente(self, msg, df):
+        if 'graficalc_projecao' in df.attrs:
+            msg += " A variável foi carregada só com as colunas usadas no script em que foi criada; carregue-a novamente para usar outras colunas."
+        self.resultados.append({'type': 'error', 'content': msg})
+
+    def comando_calcular(self, comando):
+        tipo_calculo = comando.tipo
+        nome_coluna = comando.coluna
+        nome_variavel = comando.variavel
+
+        if nome_variavel not in self.variaveis:
+            msg = f"Erro: A variável de dados '{nome_variavel}' não existe."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+
+        df = self.variaveis[nome_variavel]
+        if nome_coluna not in df.columns:
+            msg = f"Erro: A coluna '{nome_coluna}' não existe na variável '{nome_variavel}'."
+            self.erro_coluna_inexistente(msg, df)
+            return
+
+        try:
+            if isinstance(df, DadosEmBlocos):
+                resultado = self.calcular_em_blocos(df, tipo_calculo, nome_coluna)
+                msg = f"A {tipo_calculo} da coluna '{nome_coluna}' é: {resultado:.2f}"
+                self.resultados.append({'type': 'message', 'content': msg})
+                return
+
+            coluna = df[nome_coluna].dropna() 
+            resultado = 0
+            if tipo_calculo == 'MEDIA':
+                resultado = coluna.mean()
+            elif tipo_calculo == 'MEDIANA':
+                resultado = coluna.median()
+            elif tipo_calculo == 'MODA':
+                from scipy import stats
+                resultado = stats.mode(coluna, keepdims=False)[0]
+
+            msg = f"A {tipo_calculo} da coluna '{nome_coluna}' é: {resultado:.2f}"
+            self.resultados.append({'type': 'message', 'content': msg})
+
+        except Exception as e:
+            msg = f"Erro ao calcular a {tipo_calculo}: {e}"
+            self.resultados.append({'type': 'error', 'content': msg})
+
+    def calcular_em_blocos(self, dados, tipo_calculo, nome_coluna):
+        if tipo_calculo == 'MEDIA':
+            return dados.media(nome_coluna)
+        if tipo_calculo == 'MEDIANA':
+            return dados.mediana(nome_coluna)
+        return dados.moda(nome_coluna)
+
+    def comando_calcular_agrupado(self, comando):
+        nome_variavel = comando.variavel
+
+        if nome_variavel not in self.variaveis:
+            msg = f"Erro: A variável de dados '{nome_variavel}' não existe."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+
+        df = self.variaveis[nome_variavel]
+        if isinstance(df, DadosEmBlocos):
+            msg = f"Erro: A variável '{nome_variavel}' é lida em blocos e não pode ser usada em AGRUPAR POR."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+        inexistentes = [coluna for coluna in dict.fromkeys(comando.agrupar + tuple(c for _, c in comando.calculos))
+                        if coluna not in df.columns]
+        if inexistentes:
+            nomes = ', '.join(f"'{coluna}'" for coluna in inexistentes)
+            msg = f"Erro: A(s) coluna(s) {nomes} não existe(m) na variável '{nome_variavel}'."
+            self.erro_coluna_inexistente(msg, df)
+            return
+
+        try:
+            resultado = agregar(df, comando.agrupar, comando.calculos)
+        except Exception as e:
+            msg = f"Erro ao calcular por grupos: {e}"
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+
+        self.definir_variavel(comando.destino, resultado)
+        grupos = ', '.join(f"'{coluna}'" for coluna in comando.agrupar)
+        colunas = ', '.join(f"'{coluna}'" for coluna in resultado.columns)
+        msg = (f"Cálculo agrupado por {grupos} guardado na variável '{comando.destino}'"
+               f" ({len(resultado)} grupos; colunas: {colunas}).")
+        self.resultados.append({'type': 'message', 'content': msg})
+
+    def comando_criar_coluna(self, comando):
+        nome_variavel = comando.variavel
+
+        if nome_variavel not in self.variaveis:
+            msg = f"Erro: A variável de dados '{nome_variavel}' não existe."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+
+        df = self.variaveis[nome_variavel]
+        if isinstance(df, DadosEmBlocos):
+            msg = f"Erro: A variável '{nome_variavel}' é lida em blocos e não pode ser usada em CRIAR COLUNA."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+        usadas = sorted(comando.colunas(nome_variavel))
+        inexistentes = [coluna for coluna in usadas if coluna not in df.columns]
+        if inexistentes:
+            nomes = ', '.join(f"'{coluna}'" for coluna in inexistentes)
+            msg = f"Erro: A(s) coluna(s) {nomes} não existe(m) na variável '{nome_variavel}'."
+            self.erro_coluna_inexistente(msg, df)
+            return
+
+        import pandas as pd
+        colunas = {}
+        for coluna in usadas:
+            serie = df[coluna]
+            if not pd.api.types.is_numeric_dtype(serie) or isinstance(serie.dtype, pd.CategoricalDtype):
+                msg = f"Erro: A coluna '{coluna}' não é numérica e não pode ser usada numa expressão."
+                self.resultados.append({'type': 'error', 'content': msg})
+                return
+            # Inteiros com valores em falta (Int64, ...) passam a decimais com NaN
+            colunas[coluna] = serie.to_numpy(dtype='float64', na_value=float('nan')) if serie.hasnans else serie.to_numpy()
+
+        try:
+            valores = avaliar(comando.expressao, colunas, len(df))
+        except Exception as e:
+            msg = f"Erro ao calcular a coluna '{comando.coluna}': {e}"
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+
+        # Cópia superficial: as restantes colunas continuam partilhadas
+        novo = df.copy(deep=False)
+        novo[comando.coluna] = valores
+        self.definir_variavel(nome_variavel, novo)
+        msg = f"Coluna '{comando.coluna}' criada na variável '{nome_variavel}'."
+        self.resultados.append({'type': 'message', 'content': msg})
+
+    def comando_filtrar(self, comando):
+        nome_variavel = comando.variavel
+
+        if nome_variavel not in self.variaveis:
+            msg = f"Erro: A variável de dados '{nome_variavel}' não existe."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+
+        df = self.variaveis[nome_variavel]
+        if isinstance(df, DadosEmBlocos):
+            msg = f"Erro: A variável '{nome_variavel}' é lida em blocos e não pode ser usada em FILTRAR."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+        if comando.coluna not in df.columns:
+            msg = f"Erro: A coluna '{comando.coluna}' não existe na variável '{nome_variavel}'."
+            self.erro_coluna_inexistente(msg, df)
+            return
+
+        # Os índices da cache são procurados pela impressão digital dos dados
+        impressao = self.impressao_variavel(nome_variavel) if self.cache_indices is not None else None
+        try:
+            posicoes = filtrar_posicoes(
+                df[comando.coluna], comando.coluna, comando.operador, comando.valor, self.cache_indices, impressao,
+            )
+        except ValueError as e:
+            self.resultados.append({'type': 'error', 'content': f"Erro: {e}"})
+            return
+        except Exception as e:
+            msg = f"Erro ao filtrar a variável '{nome_variavel}': {e}"
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+
+        resultado = df.take(posicoes)
+        self.definir_variavel(comando.destino, resultado)
+        msg = (f"{len(resultado)} de {len(df)} linhas de '{nome_variavel}' guardadas na variável"
+               f" '{comando.destino}'.")
+        self.resultados.append({'type': 'message', 'content': msg})
+
+    def comando_plotar(self, comando):
+        tipo_grafico = comando.tipo
+        coluna_x = comando.coluna_x
+        coluna_y = comando.coluna_y
+        nome_variavel = comando.variavel
+        nome_ficheiro_saida = comando.ficheiro_saida
+
+        if nome_variavel not in self.variaveis:
+            msg = f"Erro: A variável de dados '{nome_variavel}' não existe."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+
+        df = self.variaveis[nome_variavel]
+        if isinstance(df, DadosEmBlocos):
+            msg = f"Erro: A variável '{nome_variavel}' é lida em blocos e não pode ser usada em PLOTAR."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+        if coluna_x not in df.columns or coluna_y not in df.columns:
+            msg = f"Erro: Uma ou ambas as colunas '{coluna_x}', '{coluna_y}' não existem em '{nome_variavel}'."
+            self.erro_coluna_inexistente(msg, df)
+            return
+
+        # Com cache de gráficos, um gráfico igual (mesmos dados e opções) não é desenhado outra vez
+        chave = None
+        if self.renderizador.cache is not None:
+            chave = self.renderizador.chave_grafico(
+                self.impressao_variavel(nome_variavel), nome_ficheiro_saida,
+                tipo_grafico, coluna_x, coluna_y, comando.reduzir,
+            )
+            guardado = self.renderizador.em_cache(chave, nome_ficheiro_saida)
+            if guardado is not None:
+                self.resultados.append(guardado)
+                return
+
+        x, y = df[coluna_x].to_numpy(), df[coluna_y].to_numpy()
+        reducao = None
+        if comando.reduzir:
+            x, y, reducao = reduzir_pontos(tipo_grafico, x, y, self.renderizador.largura_pixeis)
+
+        # O desenho corre no renderizador; o resultado fica como Future até estar pronto
+        self.resultados.append(self.renderizador.submeter(
+            tipo_grafico, x, y, coluna_x, coluna_y, nome_ficheiro_saida, reducao, chave,
+        ))
+
+    def comando_carregar_arquivo(self, comando):
+        nome_variavel = comando.variavel
+
+        if not self.caminho_arquivo_upload:
+            msg = "Erro: O comando 'CARREGAR ARQUIVO' só pode ser usado com um upload de ficheiro."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+
+        if comando.em_blocos:
+            # O ficheiro enviado é apagado no fim do pedido, por isso não pode ficar ligado à sessão
+            msg = "Erro: A leitura EM BLOCOS só está disponível em 'CARREGAR DADOS DE'."
+            self.resultados.append({'type': 'error', 'content': msg})
+            return
+
+        try:
+            df, projecao = self.ler_com_projecao(self.caminho_arquivo_upload, comando)
+            if comando.compacto:
+                df = otimizar_tipos(df, self.strings_arrow)
+
+            self.definir_variavel(nome_variavel, df)
+            msg = f"Ficheiro enviado com sucesso e carregado na variável '{nome_variavel}'."
+            self.resultados.append(self.resultado_carga(msg, projecao))
+
+        except Exception as e:
+            msg = f"Ocorreu um erro ao carregar o ficheiro enviado: {e}"
+            self.resultados.append({'type': 'error', 'content': msg})
+
+    EXECUTORES = {
+        MostrarDados: 'comando_mostrar',
+        MostrarMemoria: 'comando_mostrar_memoria',
+        CarregarDados: 'comando_carregar',
+        Calcular: 'comando_calcular',
+        CalcularAgrupado: 'comando_calcular_agrupado',
+        CriarColuna: 'comando_criar_coluna',
+        Filtrar: 'comando_filtrar',
+        Plotar: 'comando_plotar',
+        CarregarArquivo: 'comando_carregar_arquivo',
+    }
+
+
+def resultado_final(resultado):
+    if not isinstance(resultado, Future):
+        return resultado
+    try:
+        return resultado.result()
+    except Exception as e:
+        return {'type': 'error', 'content': f"Ocorreu um erro ao gerar o gráfico: {e}"}
+
+lock_memoria = threading.Lock()
+medicoes_memoria = 0
+tracemalloc_iniciado = False
+
+def iniciar_medicao_memoria():
+    # O tracemalloc é global ao processo: com vários perfis em simultâneo os
+    # picos medidos incluem as alocações das outras threads
+    global medicoes_memoria, tracemalloc_iniciado
+    with lock_memoria:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            tracemalloc_iniciado = True
+        medicoes_memoria += 1
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+
+def terminar_medicao_memoria(memoria_inicial):
+    global medicoes_memoria, tracemalloc_iniciado
+    with lock_memoria:
+        pico = tracemalloc.get_traced_memory()[1]
+        medicoes_memoria -= 1
+        # Só pára o tracemalloc se foi iniciado aqui
+        if medicoes_memoria == 0 and tracemalloc_iniciado:
+            tracemalloc.stop()
+            tracemalloc_iniciado = False
+    return max(pico - memoria_inicial, 0)
+
+
+# Comando principal
+def executar_comandos(codigo_graficalc, variaveis_sessao, caminho_arquivo=None, cache_leitura=None, **opcoes):
+    interpretador = Interpretador(variaveis_sessao, caminho_arquivo, cache_leitura, **opcoes)
+    resultados = interpretador.executar(codigo_graficalc)
+    return resultados, interpretador.variaveis
 
 # Apenas para evitar problemas
 def safe_read_json(value):
+    import pandas as pd
     if isinstance(value, str):
         if os.path.exists(value):
             return pd.read_json(value)
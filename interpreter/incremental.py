@@ -0,0 +1,103 @@
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+from .blocos import DadosEmBlocos
+
+
+# IMPRESSÕES DIGITAIS
+# Identificam o conteúdo de uma variável. Duas impressões iguais garantem o
+# mesmo conteúdo; o contrário não (uma variável vinda do armazém usa a chave do
+# armazém e a mesma variável calculada agora usa o hash dos dados), o que no
+# pior caso só custa uma reexecução.
+
+impressoes_por_objeto = {}
+lock_impressoes = threading.Lock()
+
+
+def impressao_digital(valor):
+    with lock_impressoes:
+        if id(valor) in impressoes_por_objeto:
+            return impressoes_por_objeto[id(valor)]
+
+    digest = hashlib.sha256()
+    if isinstance(valor, DadosEmBlocos):
+        estado = os.stat(valor.caminho)
+        digest.update(repr((valor.caminho, estado.st_size, estado.st_mtime_ns, valor.usecols, valor.tamanho_bloco)).encode('utf-8'))
+    else:
+        import pandas as pd
+        digest.update(repr((list(valor.columns), [str(tipo) for tipo in valor.dtypes])).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(valor, index=True).to_numpy().tobytes())
+        # DadosEmBlocos dependem do ficheiro no disco, por isso só os DataFrames ficam na cache
+        with lock_impressoes:
+            impressoes_por_objeto[id(valor)] = digest.hexdigest()
+        weakref.finalize(valor, impressoes_por_objeto.pop, id(valor), None)
+    return digest.hexdigest()
+
+
+def derivar_impressao(chave_comando, variavel):
+    # A saída de um comando determinístico é função das suas entradas
+    return hashlib.sha256(f"{chave_comando}:{variavel}".encode('utf-8')).hexdigest()
+
+
+# CACHE DE EXECUÇÃO
+# Guarda, por chave de comando (texto do comando + impressões das entradas),
+# os resultados produzidos e as variáveis escritas, para os repor sem voltar a
+# executar o comando. As variáveis guardadas ficam vivas enquanto estiverem na
+# cache, por isso o total é limitado em entradas e em bytes.
+
+def tamanho_entrada(resultados, saidas):
+    # Estimativa: o texto dos resultados (incluindo imagens em base64) e a memória dos DataFrames escritos
+    tamanho = sum(len(resultado['content']) for resultado in resultados
+                  if isinstance(resultado, dict) and isinstance(resultado.get('content'), str))
+    for valor in saidas.values():
+        if not isinstance(valor, DadosEmBlocos):
+            tamanho += int(valor.memory_usage(index=True).sum())
+    return tamanho
+
+
+class CacheExecucao:
+
+    def __init__(self, max_entradas=128, limite_bytes=512 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.limite_bytes = limite_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave):
+        with self._lock:
+            if chave not in self._entradas:
+                self.falhas += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            return self._entradas[chave][:2]
+
+    def descartar(self, chave):
+        with self._lock:
+            if chave in self._entradas:
+                self._bytes -= self._entradas.pop(chave)[2]
+
+    def guardar(self, chave, resultados, saidas):
+        tamanho = tamanho_entrada(resultados, saidas)
+        # Uma entrada maior do que a cache inteira despejaria todas as outras sem nunca ser reutilizada
+        if tamanho > self.limite_bytes:
+            return
+        with self._lock:
+            if chave in self._entradas:
+                self._bytes -= self._entradas.pop(chave)[2]
+            self._entradas[chave] = (tuple(resultados), dict(saidas), tamanho)
+            self._bytes += tamanho
+            while len(self._entradas) > self.max_entradas or self._bytes > self.limite_bytes:
+                _, (_, _, tamanho_despejado) = self._entradas.popitem(last=False)
+                self._bytes -= tamanho_despejado
+
+    def estatisticas(self):
+        with self._lock:
+            return {'acertos': self.acertos, 'falhas': self.falhas,
+                    'entradas': len(self._entradas), 'bytes': self._bytes}
@@ -0,0 +1,178 @@
+import operator
+import threading
+from collections import OrderedDict
+
+
+# ÍNDICES DE COLUNA (FILTRAR)
+# Um filtro sem índice compara a coluna inteira. Com uma cache de índices, a
+# primeira vez que uma coluna é filtrada constrói-se um índice e os filtros
+# seguintes sobre os mesmos dados custam O(resultados) em vez de O(linhas):
+#   - índice de hash (texto, categorias, verdadeiro/falso): as posições das
+#     linhas agrupadas por valor, para igualdades;
+#   - índice ordenado (números e datas): as posições pela ordem dos valores,
+#     onde igualdades e intervalos são procurados por bisseção.
+# Os índices ficam numa LRU limitada em bytes, indexada pela impressão digital
+# da variável (a chave no armazém, para variáveis da sessão) e pela coluna, e
+# são partilhados entre comandos, pedidos e sessões.
+
+COMPARACOES = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+}
+
+
+def tipo_indice(serie, nome, operador):
+    import pandas as pd
+    if pd.api.types.is_bool_dtype(serie) or not (
+            pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_datetime64_dtype(serie)):
+        if operador not in ('==', '!='):
+            raise ValueError(f"A coluna '{nome}' não é numérica nem de datas: só pode ser filtrada com == ou !=.")
+        return 'hash'
+    return 'ordenado'
+
+
+def converter_valor(serie, nome, valor):
+    # Datas escritas como texto no script passam a Timestamp
+    import pandas as pd
+    if pd.api.types.is_datetime64_dtype(serie):
+        try:
+            return pd.Timestamp(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{valor}' não é uma data válida para a coluna '{nome}'.") from None
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie) and isinstance(valor, str):
+        raise ValueError(f"A coluna '{nome}' é numérica: compare-a com um número.")
+    return valor
+
+
+class IndiceHash:
+
+    def __init__(self, serie):
+        import numpy as np
+        import pandas as pd
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories
+        else:
+            codigos, valores = pd.factorize(serie)
+        # Ordenação estável: dentro de cada valor as posições ficam crescentes;
+        # as linhas sem valor (código -1) ficam no início
+        self.ordem = np.argsort(codigos, kind='stable')
+        contagens = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+        self.fins = len(codigos) - int(contagens.sum()) + np.cumsum(contagens)
+        self.inicios = self.fins - contagens
+        self.codigos = {valor: codigo for codigo, valor in enumerate(valores.tolist())}
+        self.linhas = len(codigos)
+
+    @property
+    def nbytes(self):
+        # Estimativa: os arrays mais ~100 bytes por valor distinto no dicionário
+        return self.ordem.nbytes + self.fins.nbytes + self.inicios.nbytes + 100 * len(self.codigos)
+
+    def posicoes(self, operador, valor):
+        import numpy as np
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            iguais = np.empty(0, dtype=np.intp)
+        else:
+            iguais = self.ordem[self.inicios[codigo]:self.fins[codigo]]
+        return iguais if operador == '==' else complemento(iguais, self.linhas)
+
+
+class IndiceOrdenado:
+
+    def __init__(self, serie):
+        import numpy as np
+        import pandas as pd
+        if pd.api.types.is_datetime64_dtype(serie):
+            valores = serie.to_numpy()
+            validos = ~np.isnat(valores)
+        else:
+            valores = serie.to_numpy(dtype='float64', na_value=np.nan) if serie.hasnans else serie.to_numpy()
+            validos = ~np.isnan(valores) if valores.dtype.kind == 'f' else np.ones(len(valores), dtype=bool)
+        # Os valores em falta não entram no índice: nenhuma comparação os seleciona (exceto !=)
+        posicoes = np.flatnonzero(validos)
+        self.ordem = posicoes[np.argsort(valores[posicoes], kind='stable')]
+        self.ordenados = valores[self.ordem]
+        self.linhas = len(valores)
+
+    @property
+    def nbytes(self):
+        return self.ordem.nbytes + self.ordenados.nbytes
+
+    def posicoes(self, operador, valor):
+        import numpy as np
+        if hasattr(valor, 'to_datetime64'):
+            valor = valor.to_datetime64()
+        ordenados = self.ordenados
+        if operador in ('==', '!='):
+            inicio, fim = np.searchsorted(ordenados, valor, 'left'), np.searchsorted(ordenados, valor, 'right')
+        elif operador in ('>', '>='):
+            inicio, fim = np.searchsorted(ordenados, valor, 'right' if operador == '>' else 'left'), len(ordenados)
+        else:
+            inicio, fim = 0, np.searchsorted(ordenados, valor, 'left' if operador == '<' else 'right')
+        selecionadas = self.ordem[inicio:fim]
+        if operador == '!=':
+            return complemento(selecionadas, self.linhas)
+        # Valores iguais já estão por ordem de linha; um intervalo tem de ser reordenado
+        return selecionadas if operador == '==' else np.sort(selecionadas)
+
+
+def complemento(posicoes, linhas):
+    import numpy as np
+    mascara = np.ones(linhas, dtype=bool)
+    mascara[posicoes] = False
+    return np.flatnonzero(mascara)
+
+
+INDICES = {'hash': IndiceHash, 'ordenado': IndiceOrdenado}
+
+
+class CacheIndices:
+
+    def __init__(self, limite_bytes=256 * 1024 * 1024):
+        self.limite_bytes = limite_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def indice(self, impressao, coluna, tipo, serie):
+        chave = (impressao, coluna, tipo)
+        with self._lock:
+            if chave in self._entradas:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return self._entradas[chave]
+            self.falhas += 1
+
+        indice = INDICES[tipo](serie)
+        with self._lock:
+            if chave not in self._entradas:
+                self._entradas[chave] = indice
+                self._bytes += indice.nbytes
+            # O índice acabado de construir nunca é despejado, mesmo que sozinho passe o limite
+            while self._bytes > self.limite_bytes and len(self._entradas) > 1:
+                _, despejado = self._entradas.popitem(last=False)
+                self._bytes -= despejado.nbytes
+        return indice
+
+    def estatisticas(self):
+        with self._lock:
+            return {'acertos': self.acertos, 'falhas': self.falhas,
+                    'entradas': len(self._entradas), 'bytes': self._bytes}
+
+
+def filtrar_posicoes(serie, nome, operador, valor, cache=None, impressao=None):
+    # Posições (crescentes) das linhas que cumprem `serie <operador> valor`,
+    # com a mesma semântica do pandas: valores em falta só passam em !=
+    import numpy as np
+    tipo = tipo_indice(serie, nome, operador)
+    valor = converter_valor(serie, nome, valor)
+    if cache is None:
+        # Sem cache, construir um índice para o usar uma vez sairia mais caro do que comparar
+        return np.flatnonzero(COMPARACOES[operador](serie, valor).to_numpy(dtype=bool, na_value=operador == '!='))
+    return cache.indice(impressao, nome, tipo, serie).posicoes(operador, valor)
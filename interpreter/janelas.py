@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from .blocos import DadosEmBlocos
+
+
+# JANELAS DE TABELA
+# Devolvem um retângulo (linhas × colunas) de uma variável da sessão, para a
+# interface percorrer tabelas com milhões de linhas sem as receber inteiras.
+# As variáveis descodificadas e os índices de ordenação ficam numa LRU limitada
+# em bytes, indexada pela chave no armazém: como a chave resume o conteúdo,
+# pode ser partilhada entre sessões e nunca fica desatualizada. Nas variáveis
+# lidas EM BLOCOS, a cache guarda a posição em bytes de uma linha em cada
+# PASSO_POSICOES, para cada janela começar a ler perto da primeira linha pedida.
+# As posições só são procuradas até à janela mais funda já pedida: as janelas
+# do início do ficheiro não obrigam a percorrê-lo.
+
+MAXIMO_LINHAS = 1000
+MAXIMO_COLUNAS = 100
+PASSO_POSICOES = 10_000
+TAMANHO_LEITURA = 4 * 1024 * 1024
+
+
+class CacheJanelas:
+
+    def __init__(self, armazem, limite_bytes=256 * 1024 * 1024):
+        self.armazem = armazem
+        self.limite_bytes = limite_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _obter(self, chave, calcular, tamanho):
+        with self._lock:
+            if chave in self._entradas:
+                self._entradas.move_to_end(chave)
+                return self._entradas[chave][0]
+
+        valor = calcular()
+        with self._lock:
+            if chave not in self._entradas:
+                self._entradas[chave] = (valor, tamanho(valor))
+                self._bytes += self._entradas[chave][1]
+            # A entrada acabada de usar nunca é despejada, mesmo que sozinha passe o limite
+            while self._bytes > self.limite_bytes and len(self._entradas) > 1:
+                _, (_, tamanho_despejado) = self._entradas.popitem(last=False)
+                self._bytes -= tamanho_despejado
+        return valor
+
+    def dados(self, chave):
+        return self._obter(('dados', chave), lambda: self.armazem.carregar(chave), tamanho_dados)
+
+    def ordem(self, chave, df, coluna, decrescente):
+        return self._obter(
+            ('ordem', chave, coluna, decrescente), lambda: calcular_ordem(df, coluna, decrescente),
+            lambda indice: indice.nbytes,
+        )
+
+    def posicoes(self, dados):
+        # A chave inclui o tamanho e a data do ficheiro: se ele mudar, as posições são calculadas de novo
+        estado = os.stat(dados.caminho)
+        return self._obter(
+            ('posicoes', dados.caminho, estado.st_size, estado.st_mtime_ns),
+            # As posições crescem com as janelas pedidas, mas ocupam só 8 bytes por PASSO_POSICOES linhas
+            lambda: PosicoesLinhas(dados.caminho), lambda posicoes: 0,
+        )
+
+
+def calcular_ordem(df, coluna, decrescente=False):
+    # Posições das linhas pela ordem pedida (estável, valores em falta no fim)
+    serie = df[coluna].reset_index(drop=True)
+    return serie.sort_values(ascending=not decrescente, kind='stable', na_position='last').index.to_numpy()
+
+
+class PosicoesLinhas:
+    """Posição em bytes do início das linhas de dados 0, passo, 2 * passo, ...
+    de um CSV, procuradas à medida que são pedidas. Uma quebra de linha só
+    termina a linha se estiver fora de aspas; a primeira termina o cabeçalho.
+    Como no read_csv, as linhas vazias ou só com espaços não contam."""
+
+    def __init__(self, caminho, passo=None):
+        self.caminho = caminho
+        self.passo = passo or PASSO_POSICOES
+        self._posicoes = []
+        self._lidos = 0
+        self._quebras = 0
+        self._aspas_abertas = 0
+        self._linha_com_conteudo = False
+        self._fim = False
+        self._lock = threading.Lock()
+
+    def posicao(self, ponto):
+        # Início da linha de dados `ponto * passo`, ou None se o ficheiro tiver menos linhas
+        with self._lock:
+            while len(self._posicoes) <= ponto and not self._fim:
+                self._ler_bloco()
+            return self._posicoes[ponto] if ponto < len(self._posicoes) else None
+
+    def _ler_bloco(self):
+        import numpy as np
+        with open(self.caminho, 'rb') as ficheiro:
+            ficheiro.seek(self._lidos)
+            bloco = ficheiro.read(TAMANHO_LEITURA)
+        if not bloco:
+            self._fim = True
+            return
+        octetos = np.frombuffer(bloco, dtype=np.uint8)
+        # Paridade das aspas vistas até cada byte (as aspas escapadas "" não a alteram)
+        dentro = np.bitwise_xor.accumulate((octetos == ord('"')).view(np.uint8)) ^ self._aspas_abertas
+        quebras = np.flatnonzero((octetos == ord('\n')) & (dentro == 0))
+        # Bytes que não são espaço, tab ou quebra de linha vistos até cada byte
+        conteudo = np.cumsum(~np.isin(octetos, np.frombuffer(b' \t\r\n', dtype=np.uint8)))
+        fins = conteudo[quebras]
+        anteriores = np.concatenate(([0], fins[:-1]))
+        com_conteudo = fins > anteriores
+        if len(quebras):
+            com_conteudo[0] |= self._linha_com_conteudo
+            self._linha_com_conteudo = bool(conteudo[-1] > fins[-1])
+        else:
+            self._linha_com_conteudo |= bool(conteudo[-1])
+        quebras = quebras[com_conteudo]
+        numeros = self._quebras + np.arange(len(quebras))
+        self._posicoes.extend((quebras[numeros % self.passo == 0] + self._lidos + 1).tolist())
+        self._aspas_abertas = int(dentro[-1])
+        self._quebras += len(quebras)
+        self._lidos += len(bloco)
+
+
+def ler_linhas_em_blocos(dados, nomes, inicio, linhas, posicoes):
+    import pandas as pd
+    # As linhas a saltar são descartadas depois da leitura e não com skiprows, que
+    # conta também as linhas vazias que o read_csv ignora
+    ponto = inicio // posicoes.passo if posicoes is not None else 0
+    if not ponto:
+        # Perto do início lê-se o ficheiro desde o cabeçalho, sem procurar posições
+        return pd.read_csv(dados.caminho, usecols=nomes, nrows=inicio + linhas)[nomes].iloc[inicio:]
+    posicao = posicoes.posicao(ponto)
+    if posicao is None:
+        return pd.DataFrame(columns=nomes)
+    # Depois do seek já não há cabeçalho: os nomes de todas as colunas do ficheiro vêm da primeira linha
+    todas = list(pd.read_csv(dados.caminho, nrows=0).columns)
+    desvio = inicio - ponto * posicoes.passo
+    with open(dados.caminho, 'rb') as ficheiro:
+        ficheiro.seek(posicao)
+        try:
+            recorte = pd.read_csv(ficheiro, header=None, names=todas, usecols=nomes, nrows=desvio + linhas)
+        except pd.errors.EmptyDataError:
+            # Depois da posição só há linhas vazias
+            return pd.DataFrame(columns=nomes)
+    return recorte[nomes].iloc[desvio:]
+
+
+def tamanho_dados(dados):
+    if isinstance(dados, DadosEmBlocos):
+        return 0
+    return int(dados.memory_usage(index=True).sum())
+
+
+def janela(dados, inicio=0, linhas=100, coluna_inicio=0, colunas=MAXIMO_COLUNAS, ordem=None, posicoes=None):
+    # Devolve o texto JSON da janela; as linhas vêm do to_json do pandas sem serem convertidas outra vez.
+    # `ordem`: posições das linhas já ordenadas (ver CacheJanelas.ordem) ou None;
+    # `posicoes`: posições em bytes das linhas de uma variável EM BLOCOS (ver CacheJanelas.posicoes) ou None
+    linhas = max(min(linhas, MAXIMO_LINHAS), 0)
+    colunas = max(min(colunas, MAXIMO_COLUNAS), 0)
+    inicio, coluna_inicio = max(inicio, 0), max(coluna_inicio, 0)
+    nomes = list(dados.columns[coluna_inicio:coluna_inicio + colunas])
+
+    if isinstance(dados, DadosEmBlocos):
+        # Só lê do ficheiro as linhas pedidas; o total de linhas não é conhecido
+        recorte = ler_linhas_em_blocos(dados, nomes, inicio, linhas, posicoes)
+        total_linhas = None
+    else:
+        total_linhas = len(dados)
+        if ordem is None:
+            recorte = dados.iloc[inicio:inicio + linhas, coluna_inicio:coluna_inicio + colunas]
+        else:
+            recorte = dados.iloc[ordem[inicio:inicio + linhas], coluna_inicio:coluna_inicio + colunas]
+
+    cabecalho = json.dumps({
+        'total_linhas': total_linhas,
+        'total_colunas': len(dados.columns),
+        'inicio': inicio,
+        'coluna_inicio': coluna_inicio,
+        'colunas': [str(nome) for nome in nomes],
+    })
+    valores = recorte.to_json(orient='values', date_format='iso') if nomes else json.dumps([[]] * len(recorte))
+    return f'{cabecalho[:-1]}, "linhas": {valores}}}'
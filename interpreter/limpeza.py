@@ -0,0 +1,70 @@
+import os
+import time
+
+
+# LIMPEZA DO DISCO
+# O armazém de dados da sessão e as caches em disco gravam ficheiros
+# endereçados pelo conteúdo e nunca os apagam durante os pedidos. A limpeza
+# (python manage.py limpar_disco) corre à parte:
+#   - armazém: apaga os dados que nenhuma sessão ativa nem nenhuma tarefa
+#     referencia. Os ficheiros gravados (ou reutilizados) há menos de `margem`
+#     segundos ficam sempre: podem pertencer a um pedido que ainda não gravou
+#     a sessão;
+#   - caches: apagam as entradas não usadas há mais de `idade_maxima` segundos
+#     e, se a pasta ainda passar `limite_bytes`, as usadas há mais tempo até
+#     caber. A data de modificação de uma entrada é a da sua última utilização.
+
+def ficheiros_da_pasta(raiz):
+    # (caminho, bytes, data de modificação) de cada ficheiro, em todas as subpastas
+    for pasta, _, nomes in os.walk(raiz):
+        for nome in nomes:
+            caminho = os.path.join(pasta, nome)
+            try:
+                estado = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            yield caminho, estado.st_size, estado.st_mtime
+
+
+def apagar(caminhos):
+    # Devolve os bytes libertados; um ficheiro já apagado por outro processo não conta
+    libertados = 0
+    for caminho in caminhos:
+        try:
+            libertados += os.stat(caminho).st_size
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+    return libertados
+
+
+def limpar_armazem(raiz, referenciadas, margem=3600, agora=None):
+    agora = time.time() if agora is None else agora
+    removidos = libertados = 0
+    for caminho, _, modificado in ficheiros_da_pasta(raiz):
+        if os.path.basename(caminho) in referenciadas or agora - modificado <= margem:
+            continue
+        libertados += apagar([caminho])
+        removidos += 1
+    return {'ficheiros': removidos, 'bytes': libertados}
+
+
+def limpar_cache(raiz, limite_bytes=None, idade_maxima=None, agora=None):
+    agora = time.time() if agora is None else agora
+    # Os ficheiros de uma entrada (ex.: um gráfico e o JSON ao lado) são apagados juntos
+    entradas = {}
+    for caminho, tamanho, modificado in ficheiros_da_pasta(raiz):
+        chave = caminho[:-len('.json')] if caminho.endswith('.json') else caminho
+        caminhos, total, usado = entradas.get(chave, ([], 0, 0))
+        entradas[chave] = (caminhos + [caminho], total + tamanho, max(usado, modificado))
+
+    ocupados = sum(total for _, total, _ in entradas.values())
+    removidos = libertados = 0
+    for caminhos, total, usado in sorted(entradas.values(), key=lambda entrada: entrada[2]):
+        antiga = idade_maxima is not None and agora - usado > idade_maxima
+        if not antiga and (limite_bytes is None or ocupados <= limite_bytes):
+            break
+        libertados += apagar(caminhos)
+        ocupados -= total
+        removidos += len(caminhos)
+    return {'ficheiros': removidos, 'bytes': libertados}
@@ -0,0 +1,128 @@
+import base64
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from .graficalc_engine import Interpretador
+from .renderizador import contexto_processos
+
+
+# EXECUÇÃO EM LOTE
+# Corre o mesmo script GrafiCalc sobre vários ficheiros, um processo por
+# ficheiro de cada vez. Cada ficheiro fica ligado a CARREGAR ARQUIVO e as
+# saídas (tabelas, estatísticas e gráficos) vão para uma pasta própria.
+
+def nome_saida(indice, nome):
+    # O índice evita que dois resultados com o mesmo nome se sobreponham
+    return f"{indice:02d}_{os.path.basename(nome)}"
+
+
+def gravar_resultados(resultados, pasta):
+    saidas, mensagens, erros = [], [], []
+    linhas_texto = []
+    for indice, resultado in enumerate(resultados, start=1):
+        if resultado['type'] == 'table':
+            nome = nome_saida(indice, f"tabela_{resultado.get('variable_name', 'dados')}.html")
+            with open(os.path.join(pasta, nome), 'w', encoding='utf-8') as ficheiro:
+                ficheiro.write(resultado['content'])
+            saidas.append(nome)
+        elif resultado['type'] == 'image':
+            nome = nome_saida(indice, resultado['filename'])
+            with open(os.path.join(pasta, nome), 'wb') as ficheiro:
+                ficheiro.write(base64.b64decode(resultado['content']))
+            saidas.append(nome)
+        elif resultado['type'] == 'error':
+            erros.append(resultado['content'])
+            linhas_texto.append(f"ERRO: {resultado['content']}")
+        else:
+            mensagens.append(resultado['content'])
+            linhas_texto.append(resultado['content'])
+
+    if linhas_texto:
+        with open(os.path.join(pasta, 'resultados.txt'), 'w', encoding='utf-8') as ficheiro:
+            ficheiro.write('\n'.join(linhas_texto) + '\n')
+        saidas.append('resultados.txt')
+    return saidas, mensagens, erros
+
+
+def executar_ficheiro(codigo, caminho, pasta, opcoes):
+    # Corre num processo do pool; as exceções ficam no relatório do ficheiro
+    inicio = time.perf_counter()
+    relatorio = {'ficheiro': caminho, 'pasta': pasta, 'saidas': [], 'mensagens': [], 'erros': []}
+    try:
+        os.makedirs(pasta, exist_ok=True)
+        # As variáveis de cada ficheiro são descartadas no fim: as cargas podem ser sempre projetadas
+        resultados = Interpretador(caminho_arquivo=caminho, variaveis_guardadas=False, **opcoes).executar(codigo)
+        relatorio['saidas'], relatorio['mensagens'], relatorio['erros'] = gravar_resultados(resultados, pasta)
+    except Exception as e:
+        relatorio['erros'].append(f"{type(e).__name__}: {e}")
+        relatorio['traceback'] = traceback.format_exc()
+    relatorio['segundos'] = round(time.perf_counter() - inicio, 4)
+    relatorio['estado'] = 'erro' if relatorio['erros'] else 'ok'
+    return relatorio
+
+
+def pastas_de_saida(ficheiros, raiz):
+    # Uma pasta por ficheiro, com o nome do ficheiro; nomes repetidos levam sufixo
+    usadas, pastas = set(), []
+    for caminho in ficheiros:
+        base = os.path.splitext(os.path.basename(caminho))[0]
+        nome, sufixo = base, 2
+        while nome in usadas:
+            nome, sufixo = f"{base}_{sufixo}", sufixo + 1
+        usadas.add(nome)
+        pastas.append(os.path.join(raiz, nome))
+    return pastas
+
+
+def executar_lote(codigo, ficheiros, raiz_saida, processos=None, isolar=False, parar_no_erro=False,
+                  opcoes=None, ao_terminar=None):
+    # `isolar`: cada ficheiro corre num processo novo, para que uma falha grave
+    # (memória, biblioteca nativa) ou estado deixado por um ficheiro não afete
+    # os outros. `ao_terminar(relatorio)` é chamado à medida que cada ficheiro termina.
+    opcoes = opcoes or {}
+    processos = processos or os.cpu_count() or 1
+    # Os relatórios ficam pela posição de cada ficheiro: o mesmo caminho pode aparecer mais de uma vez
+    relatorios = {}
+    pastas = pastas_de_saida(ficheiros, raiz_saida)
+    inicio = time.perf_counter()
+
+    executor = ProcessPoolExecutor(max_workers=processos, mp_context=contexto_processos(),
+                                   max_tasks_per_child=1 if isolar else None)
+    try:
+        futuros = {
+            executor.submit(executar_ficheiro, codigo, caminho, pasta, opcoes): indice
+            for indice, (caminho, pasta) in enumerate(zip(ficheiros, pastas))
+        }
+        for futuro in as_completed(futuros):
+            indice = futuros[futuro]
+            caminho = ficheiros[indice]
+            try:
+                relatorio = futuro.result()
+            except BrokenProcessPool as e:
+                relatorio = {'ficheiro': caminho, 'estado': 'erro', 'erros': [f"O processo terminou inesperadamente: {e}"]}
+            except Exception as e:
+                relatorio = {'ficheiro': caminho, 'estado': 'erro', 'erros': [str(e)]}
+            relatorios[indice] = relatorio
+            if ao_terminar:
+                ao_terminar(relatorio)
+            if parar_no_erro and relatorio['estado'] == 'erro':
+                for pendente in futuros:
+                    pendente.cancel()
+                break
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    segundos = time.perf_counter() - inicio
+    for indice, caminho in enumerate(ficheiros):
+        relatorios.setdefault(indice, {'ficheiro': caminho, 'estado': 'cancelado', 'erros': []})
+    concluidos = sum(1 for relatorio in relatorios.values() if relatorio['estado'] != 'cancelado')
+    return {
+        'segundos': round(segundos, 4),
+        'ficheiros_por_segundo': round(concluidos / segundos, 3) if segundos else None,
+        'processos': processos,
+        'isolar': isolar,
+        'ficheiros': [relatorios[indice] for indice in range(len(ficheiros))],
+    }
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from interpreter.benchmark import (
+    ETAPAS, PERFIS_LINHAS, comparar, executar_benchmark, gravar_json, ler_json, linhas_sem_referencia,
+)
+
+
+def lista_inteiros(texto):
+    return [int(valor.replace('_', '')) for valor in texto.split(',') if valor.strip()]
+
+
+class Command(BaseCommand):
+    help = "Mede cada etapa do motor GrafiCalc com dados sintéticos e compara com uma baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=lista_inteiros,
+                            help="Números de linhas a gerar, separados por vírgulas (ex.: 1000,100000,10000000). "
+                                 "Por omissão, os do perfil normal: 1000,100000.")
+        parser.add_argument('--grande', action='store_true',
+                            help="Perfil grande: 1000, 100000 e 2000000 linhas (o CSV maior ocupa ~400 MB).")
+        parser.add_argument('--colunas', type=lista_inteiros, default=[3, 20],
+                            help="Larguras dos conjuntos de dados, separadas por vírgulas.")
+        parser.add_argument('--formatos', default='csv,xlsx', help="Formatos a gerar: csv, xlsx ou ambos.")
+        parser.add_argument('--xlsx-max-linhas', type=int, default=100_000,
+                            help="Não gera ficheiros .xlsx acima deste número de linhas.")
+        parser.add_argument('--etapas', default=','.join(ETAPAS), help="Etapas a medir, separadas por vírgulas.")
+        parser.add_argument('--repeticoes', type=int, default=3)
+        parser.add_argument('--pasta', help="Pasta onde os dados sintéticos são gerados e reaproveitados.")
+        parser.add_argument('--saida', default='benchmark.json', help="Ficheiro JSON com os resultados.")
+        parser.add_argument('--baseline', help="Ficheiro JSON de uma execução anterior para comparar.")
+        parser.add_argument('--limite', type=float, default=20.0,
+                            help="Regressão máxima tolerada por etapa, em percentagem.")
+
+    def handle(self, *args, **opcoes):
+        formatos = [formato.strip() for formato in opcoes['formatos'].split(',') if formato.strip()]
+        etapas = [etapa.strip() for etapa in opcoes['etapas'].split(',') if etapa.strip()]
+        desconhecidos = [valor for valor in formatos if valor not in ('csv', 'xlsx')]
+        desconhecidos += [valor for valor in etapas if valor not in ETAPAS]
+        if desconhecidos:
+            raise CommandError(f"Valores desconhecidos: {', '.join(desconhecidos)}")
+
+        if opcoes['grande'] and opcoes['linhas']:
+            raise CommandError("Use --grande ou --linhas, não os dois.")
+        perfil = 'grande' if opcoes['grande'] else None if opcoes['linhas'] else 'normal'
+        linhas = opcoes['linhas'] or PERFIS_LINHAS[perfil]
+
+        resultado = executar_benchmark(
+            linhas, opcoes['colunas'], formatos, opcoes['repeticoes'], opcoes['pasta'],
+            etapas, opcoes['xlsx_max_linhas'], perfil,
+        )
+
+        for medicao in resultado['medicoes']:
+            dimensao = medicao.get('formato') and f"{medicao['linhas']}x{medicao['colunas']} {medicao['formato']}"
+            dimensao = dimensao or (f"{medicao['comandos']} comandos" if 'comandos' in medicao else '')
+            self.stdout.write(f"{medicao['etapa']:<18} {dimensao:<24} {medicao['segundos'] * 1000:10.2f} ms")
+
+        if opcoes['baseline']:
+            baseline = ler_json(opcoes['baseline'])
+            resultado['regressoes'] = comparar(resultado, baseline, opcoes['limite'])
+            em_falta = linhas_sem_referencia(resultado, baseline)
+            if em_falta:
+                self.stderr.write(f"A baseline não tem medições com {', '.join(map(str, em_falta))} linhas: "
+                                  "grave uma baseline com o mesmo perfil para as comparar.")
+        gravar_json(resultado, opcoes['saida'])
+        self.stdout.write(f"Resultados gravados em {opcoes['saida']}")
+
+        if resultado.get('regressoes'):
+            for regressao in resultado['regressoes']:
+                self.stderr.write(
+                    f"Regressão em {regressao['etapa']}: {regressao['baseline'] * 1000:.2f} ms → "
+                    f"{regressao['atual'] * 1000:.2f} ms (+{regressao['variacao_percentual']}%)"
+                )
+            raise CommandError(f"{len(resultado['regressoes'])} etapa(s) acima do limite de {opcoes['limite']}%.")
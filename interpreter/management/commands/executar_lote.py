@@ -0,0 +1,75 @@
+import glob
+import json
+import os
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from interpreter.graficalc_engine import compilar
+from interpreter.lote import executar_lote
+
+
+class Command(BaseCommand):
+    help = ("Executa um script GrafiCalc (.gcalc) sobre vários ficheiros em paralelo; cada ficheiro "
+            "fica ligado a CARREGAR ARQUIVO e as saídas vão para uma pasta por ficheiro.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('script', help="Ficheiro .gcalc com o script a executar.")
+        parser.add_argument('padroes', nargs='+', help="Padrões glob dos ficheiros de entrada (ex.: 'regioes/*.csv').")
+        parser.add_argument('--saida', default='saida_lote', help="Pasta onde ficam as saídas e o manifesto.")
+        parser.add_argument('--processos', type=int, default=None, help="Número de processos (por omissão, um por CPU).")
+        parser.add_argument('--isolar', action='store_true',
+                            help="Corre cada ficheiro num processo novo, para isolar falhas graves.")
+        parser.add_argument('--parar-no-erro', action='store_true',
+                            help="Cancela os ficheiros por executar ao primeiro erro.")
+
+    def handle(self, *args, **opcoes):
+        try:
+            with open(opcoes['script'], encoding='utf-8') as ficheiro:
+                codigo = ficheiro.read()
+        except OSError as e:
+            raise CommandError(f"Não foi possível ler o script: {e}")
+
+        plano = compilar(codigo)
+        if not plano.valido:
+            raise CommandError("O script tem erros:\n" + '\n'.join(plano.erros))
+
+        ficheiros = sorted({
+            os.path.abspath(caminho) for padrao in opcoes['padroes'] for caminho in glob.glob(padrao, recursive=True)
+            if os.path.isfile(caminho)
+        })
+        if not ficheiros:
+            raise CommandError("Nenhum ficheiro corresponde aos padrões indicados.")
+
+        os.makedirs(opcoes['saida'], exist_ok=True)
+        inicio = datetime.now(timezone.utc).isoformat()
+
+        def ao_terminar(relatorio):
+            tempo = f"{relatorio['segundos']:.2f} s" if 'segundos' in relatorio else '-'
+            linha = f"[{relatorio['estado']}] {relatorio['ficheiro']} ({tempo})"
+            if relatorio['estado'] == 'ok':
+                self.stdout.write(linha)
+            else:
+                self.stderr.write(linha + ''.join(f"\n    {erro}" for erro in relatorio['erros']))
+
+        lote = executar_lote(
+            codigo, ficheiros, os.path.abspath(opcoes['saida']), opcoes['processos'], opcoes['isolar'],
+            opcoes['parar_no_erro'],
+            {'tamanho_bloco': settings.GRAFICALC_TAMANHO_BLOCO, 'strings_arrow': settings.GRAFICALC_STRINGS_ARROW},
+            ao_terminar,
+        )
+
+        manifesto = {'script': os.path.abspath(opcoes['script']), 'inicio': inicio, **lote}
+        caminho_manifesto = os.path.join(opcoes['saida'], 'manifesto.json')
+        with open(caminho_manifesto, 'w', encoding='utf-8') as ficheiro:
+            json.dump(manifesto, ficheiro, indent=2, ensure_ascii=False)
+
+        estados = [relatorio['estado'] for relatorio in lote['ficheiros']]
+        self.stdout.write(
+            f"{estados.count('ok')} de {len(estados)} ficheiros sem erros em {lote['segundos']:.2f} s "
+            f"({lote['ficheiros_por_segundo']} ficheiros/s, {lote['processos']} processos). "
+            f"Manifesto: {caminho_manifesto}"
+        )
+        if estados.count('ok') != len(estados):
+            raise CommandError(f"{len(estados) - estados.count('ok')} ficheiro(s) com erros ou cancelados.")
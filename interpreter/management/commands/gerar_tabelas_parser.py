@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from interpreter import graficalc_engine
+
+
+class Command(BaseCommand):
+    help = "Regenera interpreter/parsetab.py a partir da gramática em graficalc_engine.py."
+
+    def handle(self, *args, **opcoes):
+        graficalc_engine.gerar_tabelas()
+        self.stdout.write("Tabelas do parser gravadas em interpreter/parsetab.py")
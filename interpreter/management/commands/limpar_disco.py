@@ -0,0 +1,48 @@
+import glob
+import json
+import os
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from interpreter.armazenamento import chave_valida
+from interpreter.graficalc_engine import formatar_bytes
+from interpreter.limpeza import limpar_armazem, limpar_cache
+
+
+def chaves_referenciadas():
+    # Chaves do armazém usadas pelas sessões por expirar e pelas tarefas ainda em disco
+    chaves = set()
+    for sessao in Session.objects.filter(expire_date__gt=timezone.now()).iterator():
+        chaves.update(sessao.get_decoded().get('graficalc_variaveis', {}).values())
+    for caminho in glob.glob(os.path.join(settings.GRAFICALC_TAREFAS_ROOT, '*', 'estado.json')):
+        try:
+            with open(caminho, encoding='utf-8') as ficheiro:
+                chaves.update(json.load(ficheiro).get('variaveis', {}).values())
+        except (OSError, ValueError):
+            continue
+    return {chave for chave in chaves if chave_valida(chave)}
+
+
+class Command(BaseCommand):
+    help = ("Apaga do disco os dados da sessão que já nenhuma sessão ativa nem tarefa usa e as entradas "
+            "antigas ou em excesso da cache de leitura e da cache de gráficos. Corra depois de 'clearsessions'.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--margem', type=int, default=settings.GRAFICALC_LIMPEZA_MARGEM_DADOS,
+                            help="Segundos durante os quais os dados acabados de gravar nunca são apagados.")
+        parser.add_argument('--idade-maxima', type=int, default=settings.GRAFICALC_LIMPEZA_IDADE_CACHES,
+                            help="Segundos sem uso a partir dos quais as entradas das caches são apagadas.")
+
+    def handle(self, *args, **opcoes):
+        self.relatar("Armazém de dados", limpar_armazem(
+            settings.GRAFICALC_DADOS_ROOT, chaves_referenciadas(), opcoes['margem']))
+        self.relatar("Cache de leitura", limpar_cache(
+            settings.GRAFICALC_CACHE_LEITURA_ROOT, settings.GRAFICALC_CACHE_LEITURA_DISCO_BYTES, opcoes['idade_maxima']))
+        self.relatar("Cache de gráficos", limpar_cache(
+            settings.GRAFICALC_GRAFICOS_ROOT, settings.GRAFICALC_GRAFICOS_DISCO_BYTES, opcoes['idade_maxima']))
+
+    def relatar(self, pasta, removidos):
+        self.stdout.write(f"{pasta}: {removidos['ficheiros']} ficheiro(s), {formatar_bytes(removidos['bytes'])} libertados")
@@ -0,0 +1,92 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from interpreter.benchmark import gravar_json
+from interpreter.carga import ROTAS, executar_teste_carga
+from interpreter.graficalc_engine import formatar_bytes
+from interpreter.management.commands.benchmark_motor import lista_inteiros
+
+
+def definicao(texto):
+    # NOME=VALOR; o valor é lido como JSON (números, listas, true/false) ou fica como texto
+    nome, separador, valor = texto.partition('=')
+    if not separador or not nome.strip():
+        raise ValueError(texto)
+    try:
+        return nome.strip(), json.loads(valor)
+    except json.JSONDecodeError:
+        return nome.strip(), valor
+
+
+class Command(BaseCommand):
+    help = ("Arranca o servidor localmente e simula sessões em simultâneo, medindo débito, latência, "
+            "fases do pedido, memória e crescimento da tabela de sessões.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interfaces', default='wsgi',
+                            help="Servidores a comparar, separados por vírgulas: wsgi (o do runserver), asgi "
+                                 "(uvicorn, que tem de estar instalado) ou ambos (ignorado com --comando-servidor).")
+        parser.add_argument('--sessoes', type=lista_inteiros, default=[1, 4, 16],
+                            help="Níveis de concorrência (sessões em simultâneo), separados por vírgulas.")
+        parser.add_argument('--pedidos', type=int, default=6, help="Scripts enviados por cada sessão.")
+        parser.add_argument('--linhas', type=lambda texto: int(texto.replace('_', '')), default=100_000,
+                            help="Linhas do ficheiro de vendas enviado por cada sessão.")
+        parser.add_argument('--rota', choices=sorted(ROTAS), default='interface',
+                            help="interface: a página (POST /); fluxo: resultados em NDJSON (/executar/fluxo/).")
+        parser.add_argument('--definir', type=definicao, action='append', default=[], metavar='NOME=VALOR',
+                            help="Altera uma definição do servidor (ex.: GRAFICALC_RENDER_PROCESSOS=0). Repetível.")
+        parser.add_argument('--comando-servidor',
+                            help="Servidor externo em vez dos anteriores, com {endereco}, {porta} e {python} "
+                                 "(ex.: \"gunicorn graficalc_project.wsgi -w 4 -b {endereco}:{porta}\").")
+        parser.add_argument('--pasta', help="Pasta de trabalho (dados gerados, base de dados e armazém do servidor).")
+        parser.add_argument('--saida', default='carga.json', help="Ficheiro JSON com os resultados.")
+
+    def handle(self, *args, **opcoes):
+        interfaces = [interface.strip() for interface in opcoes['interfaces'].split(',') if interface.strip()]
+        if opcoes['comando_servidor']:
+            interfaces = ['externo']
+        else:
+            desconhecidas = [interface for interface in interfaces if interface not in ('wsgi', 'asgi')]
+            if desconhecidas:
+                raise CommandError(f"Interfaces desconhecidas: {', '.join(desconhecidas)}")
+        if not opcoes['sessoes'] or min(opcoes['sessoes']) < 1 or opcoes['pedidos'] < 1 or opcoes['linhas'] < 1:
+            raise CommandError("--sessoes, --pedidos e --linhas têm de ser maiores do que zero.")
+
+        def ao_medir(interface, nivel):
+            latencia = nivel['latencia']
+            self.stdout.write(
+                f"{interface:<8} {nivel['sessoes']:>4} sessões {nivel['pedidos_por_segundo'] or 0:9.2f} pedidos/s"
+                f"  p50 {milissegundos(latencia.get('p50'))}  p95 {milissegundos(latencia.get('p95'))}"
+                f"  p99 {milissegundos(latencia.get('p99'))}  RSS {memoria(nivel['memoria_pico_bytes'])}"
+                f"  +{nivel['tabela_sessoes']['linhas_novas']} sessões"
+                f"  erros {nivel['erros_http']} HTTP / {nivel['erros_script']} script"
+            )
+            fases = ', '.join(f"{fase} {milissegundos(valores['media_segundos'])}"
+                              for fase, valores in sorted(nivel['fases'].items()))
+            self.stdout.write(f"{'':<14}fases (média): {fases}")
+
+        try:
+            resultado = executar_teste_carga(
+                interfaces, opcoes['sessoes'], opcoes['pedidos'], opcoes['linhas'], opcoes['rota'],
+                dict(opcoes['definir']), opcoes['comando_servidor'], opcoes['pasta'], ao_medir,
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        gravar_json(resultado, opcoes['saida'])
+        self.stdout.write(f"Resultados gravados em {opcoes['saida']}")
+
+        erros = sum(nivel['erros_http'] + nivel['erros_script']
+                    for execucao in resultado['execucoes'] for nivel in execucao['niveis'])
+        if erros:
+            raise CommandError(f"{erros} pedido(s) ou comando(s) com erro durante o teste.")
+
+
+def memoria(quantidade):
+    # O pico de memória só é medido em Linux
+    return '-' if quantidade is None else formatar_bytes(quantidade)
+
+
+def milissegundos(segundos):
+    return '-' if segundos is None else f"{segundos * 1000:.1f} ms"
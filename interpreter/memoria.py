@@ -0,0 +1,55 @@
+# Colunas de texto com menos valores distintos do que esta fração das linhas
+# passam a `category`
+LIMITE_CATEGORIA = 0.5
+
+
+def otimizar_tipos(df, strings_arrow=False):
+    import numpy as np
+    import pandas as pd
+
+    antes = df.memory_usage(deep=True, index=False)
+    otimizado = df.copy(deep=False)
+
+    for nome in otimizado.columns:
+        serie = otimizado[nome]
+        if pd.api.types.is_bool_dtype(serie):
+            continue
+        if pd.api.types.is_integer_dtype(serie):
+            tipo = 'unsigned' if len(serie) and serie.min() >= 0 else 'integer'
+            otimizado[nome] = pd.to_numeric(serie, downcast=tipo)
+        elif pd.api.types.is_float_dtype(serie):
+            # Só passa a float32 quando não há perda de precisão
+            convertida = serie.astype(np.float32)
+            if ((convertida.astype(serie.dtype) == serie) | serie.isna()).all():
+                otimizado[nome] = convertida
+        elif pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie):
+            if len(serie) and serie.nunique(dropna=True) < LIMITE_CATEGORIA * len(serie):
+                otimizado[nome] = serie.astype('category')
+            elif strings_arrow:
+                otimizado[nome] = serie.astype('string[pyarrow]')
+
+    otimizado.attrs['graficalc_memoria_original'] = {str(nome): int(antes[nome]) for nome in df.columns}
+    return otimizado
+
+
+def relatorio_memoria(df):
+    import pandas as pd
+
+    atual = df.memory_usage(deep=True, index=False)
+    original = df.attrs.get('graficalc_memoria_original', {})
+
+    linhas = []
+    for nome in df.columns:
+        depois = int(atual[nome])
+        antes = original.get(str(nome), depois)
+        linhas.append({'Coluna': str(nome), 'Tipo': str(df[nome].dtype), 'Bytes antes': antes, 'Bytes depois': depois})
+
+    relatorio = pd.DataFrame(linhas, columns=['Coluna', 'Tipo', 'Bytes antes', 'Bytes depois'])
+    total = {
+        'Coluna': 'Total', 'Tipo': '',
+        'Bytes antes': int(relatorio['Bytes antes'].sum()), 'Bytes depois': int(relatorio['Bytes depois'].sum()),
+    }
+    relatorio = pd.concat([relatorio, pd.DataFrame([total])], ignore_index=True)
+    reducao = 1 - relatorio['Bytes depois'] / relatorio['Bytes antes'].where(relatorio['Bytes antes'] > 0)
+    relatorio['Redução'] = (reducao.fillna(0) * 100).map(lambda valor: f"{valor:.1f}%")
+    return relatorio
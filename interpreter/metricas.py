@@ -0,0 +1,140 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+# MÉTRICAS
+# Histogramas e contadores em memória, exportados no formato de texto do
+# Prometheus. Cada processo tem os seus valores: com vários processos do
+# servidor web, o Prometheus deve recolher cada um deles.
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LIMITES_BYTES = tuple(1024 * 4 ** expoente for expoente in range(12))  # 1 KiB .. 4 GiB
+
+
+def escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def formatar_etiquetas(etiquetas):
+    if not etiquetas:
+        return ''
+    pares = (f'{nome}="{escapar(valor)}"' for nome, valor in etiquetas)
+    return '{' + ','.join(pares) + '}'
+
+
+def formatar_numero(valor):
+    if valor == math.inf:
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Histograma:
+
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, limites=LIMITES_SEGUNDOS):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.limites = tuple(limites) + (math.inf,)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **etiquetas):
+        chave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            contagens, soma = self._series.get(chave, ([0] * len(self.limites), 0.0))
+            for posicao, limite in enumerate(self.limites):
+                if valor <= limite:
+                    contagens[posicao] += 1
+            self._series[chave] = (contagens, soma + valor)
+
+    def linhas(self):
+        with self._lock:
+            series = {chave: (list(contagens), soma) for chave, (contagens, soma) in self._series.items()}
+        for chave, (contagens, soma) in sorted(series.items()):
+            for limite, contagem in zip(self.limites, contagens):
+                yield f"{self.nome}_bucket{formatar_etiquetas(chave + (('le', formatar_numero(limite)),))} {contagem}"
+            yield f"{self.nome}_sum{formatar_etiquetas(chave)} {formatar_numero(soma)}"
+            yield f"{self.nome}_count{formatar_etiquetas(chave)} {contagens[-1]}"
+
+
+class Contador:
+
+    tipo = 'counter'
+
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor=1, **etiquetas):
+        chave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            self._series[chave] = self._series.get(chave, 0) + valor
+
+    def linhas(self):
+        with self._lock:
+            series = dict(self._series)
+        for chave, valor in sorted(series.items()):
+            yield f"{self.nome}{formatar_etiquetas(chave)} {formatar_numero(valor)}"
+
+
+class Medidor:
+    # Valores lidos no momento da exportação (por exemplo, estatísticas das caches)
+
+    tipo = 'gauge'
+
+    def __init__(self, nome, ajuda, funcao):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.funcao = funcao
+
+    def linhas(self):
+        for etiquetas, valor in self.funcao():
+            yield f"{self.nome}{formatar_etiquetas(tuple(sorted(etiquetas.items())))} {formatar_numero(valor)}"
+
+
+@contextmanager
+def cronometrar(histograma, **etiquetas):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        histograma.observar(time.perf_counter() - inicio, **etiquetas)
+
+
+class Registo:
+
+    def __init__(self):
+        self.metricas = []
+
+    def registar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def exportar(self):
+        linhas = []
+        for metrica in list(self.metricas):
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.linhas())
+        return '\n'.join(linhas) + '\n'
+
+
+registo = Registo()
+
+segundos_comando = registo.registar(Histograma(
+    'graficalc_comando_segundos', "Duração de cada comando GrafiCalc.", LIMITES_SEGUNDOS))
+memoria_comando = registo.registar(Histograma(
+    'graficalc_comando_memoria_pico_bytes', "Pico de memória alocada por comando (só com o perfil ativo).",
+    LIMITES_BYTES))
+linhas_comando = registo.registar(Contador(
+    'graficalc_comando_linhas_total', "Linhas processadas pelos comandos."))
+bytes_comando = registo.registar(Contador(
+    'graficalc_comando_bytes_total', "Bytes processados pelos comandos."))
+segundos_fase = registo.registar(Histograma(
+    'graficalc_fase_segundos', "Duração das fases de um pedido (compilar, sessão, execução, template).",
+    LIMITES_SEGUNDOS))
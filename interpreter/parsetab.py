@@ -6,9 +6,9 @@ _tabversion = '3.10'
 
 _lr_method = 'LALR'
 
-_lr_signature = 'ARQUIVO BARRAS CALCULAR CARREGAR COLUNA COM COMO DA DADOS DE E EIXO_X EIXO_Y GRAFICO ID LINHAS MEDIA MEDIANA MODA MOSTRAR PLOTAR SALVAR STRING\nprograma : comando\n         | programa comando\ncomando : MOSTRAR DADOS DE IDcomando : CARREGAR DADOS DE STRING COMO IDcomando : CALCULAR tipo_calculo DA COLUNA STRING DE IDtipo_calculo : MEDIAtipo_calculo : MEDIANAtipo_calculo : MODA\ncomando : PLOTAR GRAFICO DE tipo_grafico COM EIXO_X STRING E EIXO_Y STRING DE ID SALVAR COMO STRING\n        | PLOTAR GRAFICO DE tipo_grafico COM EIXO_X STRING E EIXO_Y STRING DE ID\ncomando : CARREGAR ARQUIVO COMO IDtipo_grafico : BARRAStipo_grafico : LINHAS'
+_lr_signature = 'nonassocMAIORMENORMAIOR_IGUALMENOR_IGUALIGUALDIFERENTEleftMAISMENOSleftVEZESDIVIDIRrightMENOS_UNARIOrightPOTENCIAABRE_PARENTESES AGRUPAR ARQUIVO ATRIBUICAO BARRAS BLOCOS CABECALHO CALCULAR CARREGAR COLUNA COM COMO COMPACTO CRIAR DA DADOS DE DECIMAL DIFERENTE DIVIDIR E EIXO_X EIXO_Y EM FECHA_PARENTESES FILTRAR GRAFICO ID IGUAL LINHAS MAIOR MAIOR_IGUAL MAIS MEDIA MEDIANA MEMORIA MENOR MENOR_IGUAL MENOS MODA MOSTRAR NUMERO ONDE PLANILHA PLOTAR POR POTENCIA REDUCAO SALVAR SEM STRING VEZES VIRGULA\n    programa : comando\n             | programa comando\n    comando : MOSTRAR DADOS DE IDcomando : MOSTRAR MEMORIA DE IDcomando : CARREGAR DADOS DE STRING COMO ID opcoes_carga\n    opcoes_carga :\n                 | opcoes_carga opcao_carga\n    opcao_carga : EM BLOCOSopcao_carga : COMPACTOopcao_carga : PLANILHA STRINGopcao_carga : CABECALHO NUMEROcomando : CALCULAR calculos DE ID\n    comando : CALCULAR calculos DE ID AGRUPAR POR colunas_grupo\n            | CALCULAR calculos DE ID AGRUPAR POR colunas_grupo COMO ID\n    \n    calculos : calculo\n             | calculos E calculo\n    calculo : tipo_calculo DA COLUNA STRING\n    colunas_grupo : STRING\n                  | colunas_grupo E STRING\n    tipo_calculo : MEDIAtipo_calculo : MEDIANAtipo_calculo : MODAcomando : PLOTAR GRAFICO DE tipo_grafico COM EIXO_X STRING E EIXO_Y STRING DE ID opcoes_plotar\n    opcoes_plotar :\n                  | opcoes_plotar opcao_plotar\n    opcao_plotar : SALVAR COMO STRINGopcao_plotar : SEM REDUCAOcomando : CARREGAR ARQUIVO COMO ID opcoes_cargacomando : CRIAR COLUNA STRING ATRIBUICAO expressao EM ID\n    expressao : expressao MAIS expressao\n              | expressao MENOS expressao\n              | expressao VEZES expressao\n              | expressao DIVIDIR expressao\n              | expressao POTENCIA expressao\n              | expressao MAIOR expressao\n              | expressao MENOR expressao\n              | expressao MAIOR_IGUAL expressao\n              | expressao MENOR_IGUAL expressao\n              | expressao IGUAL expressao\n              | expressao DIFERENTE expressao\n    expressao : MENOS expressao %prec MENOS_UNARIOexpressao : ABRE_PARENTESES expressao FECHA_PARENTESESexpressao : STRING\n    expressao : NUMERO\n              | DECIMAL\n    expressao : ID ABRE_PARENTESES argumentos FECHA_PARENTESES\n    argumentos : expressao\n               | argumentos VIRGULA expressao\n    \n    comando : FILTRAR ID ONDE STRING operador_filtro valor_filtro\n            | FILTRAR ID ONDE STRING operador_filtro valor_filtro COMO ID\n    \n    operador_filtro : IGUAL\n                    | ATRIBUICAO\n                    | DIFERENTE\n                    | MAIOR\n                    | MENOR\n                    | MAIOR_IGUAL\n                    | MENOR_IGUAL\n    \n    valor_filtro : STRING\n                 | NUMERO\n                 | DECIMAL\n    \n    valor_filtro : MENOS NUMERO\n                 | MENOS DECIMAL\n    tipo_grafico : BARRAStipo_grafico : LINHAS'
     
-_lr_action_items = {'MOSTRAR':([0,1,2,7,21,23,31,34,40,43,],[3,3,-1,-2,-3,-11,-4,-5,-10,-9,]),'CARREGAR':([0,1,2,7,21,23,31,34,40,43,],[4,4,-1,-2,-3,-11,-4,-5,-10,-9,]),'CALCULAR':([0,1,2,7,21,23,31,34,40,43,],[5,5,-1,-2,-3,-11,-4,-5,-10,-9,]),'PLOTAR':([0,1,2,7,21,23,31,34,40,43,],[6,6,-1,-2,-3,-11,-4,-5,-10,-9,]),'$end':([1,2,7,21,23,31,34,40,43,],[0,-1,-2,-3,-11,-4,-5,-10,-9,]),'DADOS':([3,4,],[8,9,]),'ARQUIVO':([4,],[10,]),'MEDIA':([5,],[12,]),'MEDIANA':([5,],[13,]),'MODA':([5,],[14,]),'GRAFICO':([6,],[15,]),'DE':([8,9,15,29,38,],[16,17,20,32,39,]),'COMO':([10,22,41,],[18,28,42,]),'DA':([11,12,13,14,],[19,-6,-7,-8,]),'ID':([16,18,28,32,39,],[21,23,31,34,40,]),'STRING':([17,24,33,37,42,],[22,29,35,38,43,]),'COLUNA':([19,],[24,]),'BARRAS':([20,],[26,]),'LINHAS':([20,],[27,]),'COM':([25,26,27,],[30,-12,-13,]),'EIXO_X':([30,],[33,]),'E':([35,],[36,]),'EIXO_Y':([36,],[37,]),'SALVAR':([40,],[41,]),}
+_lr_action_items = {'MOSTRAR':([0,1,2,9,33,34,36,37,46,65,66,68,88,89,90,91,93,94,95,96,97,98,100,116,117,123,124,125,130,131,132,136,137,],[3,3,-1,-2,-3,-4,-6,-12,-28,-6,-7,-9,-58,-49,-59,-60,-5,-8,-10,-11,-13,-18,-29,-61,-62,-50,-14,-19,-24,-23,-25,-27,-26,]),'CARREGAR':([0,1,2,9,33,34,36,37,46,65,66,68,88,89,90,91,93,94,95,96,97,98,100,116,117,123,124,125,130,131,132,136,137,],[4,4,-1,-2,-3,-4,-6,-12,-28,-6,-7,-9,-58,-49,-59,-60,-5,-8,-10,-11,-13,-18,-29,-61,-62,-50,-14,-19,-24,-23,-25,-27,-26,]),'CALCULAR':([0,1,2,9,33,34,36,37,46,65,66,68,88,89,90,91,93,94,95,96,97,98,100,116,117,123,124,125,130,131,132,136,137,],[5,5,-1,-2,-3,-4,-6,-12,-28,-6,-7,-9,-58,-49,-59,-60,-5,-8,-10,-11,-13,-18,-29,-61,-62,-50,-14,-19,-24,-23,-25,-27,-26,]),'PLOTAR':([0,1,2,9,33,34,36,37,46,65,66,68,88,89,90,91,93,94,95,96,97,98,100,116,117,123,124,125,130,131,132,136,137,],[6,6,-1,-2,-3,-4,-6,-12,-28,-6,-7,-9,-58,-49,-59,-60,-5,-8,-10,-11,-13,-18,-29,-61,-62,-50,-14,-19,-24,-23,-25,-27,-26,]),'CRIAR':([0,1,2,9,33,34,36,37,46,65,66,68,88,89,90,91,93,94,95,96,97,98,100,116,117,123,124,125,130,131,132,136,137,],[7,7,-1,-2,-3,-4,-6,-12,-28,-6,-7,-9,-58,-49,-59,-60,-5,-8,-10,-11,-13,-18,-29,-61,-62,-50,-14,-19,-24,-23,-25,-27,-26,]),'FILTRAR':([0,1,2,9,33,34,36,37,46,65,66,68,88,89,90,91,93,94,95,96,97,98,100,116,117,123,124,125,130,131,132,136,137,],[8,8,-1,-2,-3,-4,-6,-12,-28,-6,-7,-9,-58,-49,-59,-60,-5,-8,-10,-11,-13,-18,-29,-61,-62,-50,-14,-19,-24,-23,-25,-27,-26,]),'$end':([1,2,9,33,34,36,37,46,65,66,68,88,89,90,91,93,94,95,96,97,98,100,116,117,123,124,125,130,131,132,136,137,],[0,-1,-2,-3,-4,-6,-12,-28,-6,-7,-9,-58,-49,-59,-60,-5,-8,-10,-11,-13,-18,-29,-61,-62,-50,-14,-19,-24,-23,-25,-27,-26,]),'DADOS':([3,4,],[10,12,]),'MEMORIA':([3,],[11,]),'ARQUIVO':([4,],[13,]),'MEDIA':([5,28,],[17,17,]),'MEDIANA':([5,28,],[18,18,]),'MODA':([5,28,],[19,19,]),'GRAFICO':([6,],[20,]),'COLUNA':([7,29,],[21,39,]),'ID':([8,23,24,26,27,43,45,53,54,73,74,75,76,77,78,79,80,81,82,83,84,85,115,118,122,129,],[22,33,34,36,37,52,65,52,52,100,52,52,52,52,52,52,52,52,52,52,52,52,123,124,52,130,]),'DE':([10,11,12,14,15,20,38,48,128,],[23,24,25,27,-15,30,-16,-17,129,]),'COMO':([13,35,88,89,90,91,97,98,116,117,125,133,],[26,45,-58,115,-59,-60,118,-18,-61,-62,-19,135,]),'E':([14,15,38,48,97,98,99,125,],[28,-15,-16,-17,119,-18,120,-19,]),'DA':([16,17,18,19,],[29,-20,-21,-22,]),'STRING':([21,25,32,39,43,53,54,57,58,59,60,61,62,63,64,69,71,72,74,75,76,77,78,79,80,81,82,83,84,85,119,122,126,135,],[31,35,44,48,50,50,50,88,-51,-52,-53,-54,-55,-56,-57,95,98,99,50,50,50,50,50,50,50,50,50,50,50,50,125,50,128,137,]),'ONDE':([22,],[32,]),'BARRAS':([30,],[41,]),'LINHAS':([30,],[42,]),'ATRIBUICAO':([31,44,],[43,59,]),'EM':([36,46,50,51,55,56,65,66,68,86,93,94,95,96,101,102,103,104,105,106,107,108,109,110,111,114,121,],[-6,67,-43,73,-44,-45,-6,-7,-9,-41,67,-8,-10,-11,-30,-31,-32,-33,-34,-35,-36,-37,-38,-39,-40,-42,-46,]),'COMPACTO':([36,46,65,66,68,93,94,95,96,],[-6,68,-6,-7,-9,68,-8,-10,-11,]),'PLANILHA':([36,46,65,66,68,93,94,95,96,],[-6,69,-6,-7,-9,69,-8,-10,-11,]),'CABECALHO':([36,46,65,66,68,93,94,95,96,],[-6,70,-6,-7,-9,70,-8,-10,-11,]),'AGRUPAR':([37,],[47,]),'COM':([40,41,42,],[49,-63,-64,]),'MENOS':([43,50,51,53,54,55,56,57,58,59,60,61,62,63,64,74,75,76,77,78,79,80,81,82,83,84,85,86,87,101,102,103,104,105,106,107,108,109,110,111,113,114,121,122,127,],[53,-43,75,53,53,-44,-45,92,-51,-52,-53,-54,-55,-56,-57,53,53,53,53,53,53,53,53,53,53,53,53,-41,75,-30,-31,-32,-33,-34,75,75,75,75,75,75,75,-42,-46,53,75,]),'ABRE_PARENTESES':([43,52,53,54,74,75,76,77,78,79,80,81,82,83,84,85,122,],[54,85,54,54,54,54,54,54,54,54,54,54,54,54,54,54,54,]),'NUMERO':([43,53,54,57,58,59,60,61,62,63,64,70,74,75,76,77,78,79,80,81,82,83,84,85,92,122,],[55,55,55,90,-51,-52,-53,-54,-55,-56,-57,96,55,55,55,55,55,55,55,55,55,55,55,55,116,55,]),'DECIMAL':([43,53,54,57,58,59,60,61,62,63,64,74,75,76,77,78,79,80,81,82,83,84,85,92,122,],[56,56,56,91,-51,-52,-53,-54,-55,-56,-57,56,56,56,56,56,56,56,56,56,56,56,56,117,56,]),'IGUAL':([44,50,51,55,56,86,87,101,102,103,104,105,106,107,108,109,110,111,113,114,121,127,],[58,-43,83,-44,-45,-41,83,-30,-31,-32,-33,-34,None,None,None,None,None,None,83,-42,-46,83,]),'DIFERENTE':([44,50,51,55,56,86,87,101,102,103,104,105,106,107,108,109,110,111,113,114,121,127,],[60,-43,84,-44,-45,-41,84,-30,-31,-32,-33,-34,None,None,None,None,None,None,84,-42,-46,84,]),'MAIOR':([44,50,51,55,56,86,87,101,102,103,104,105,106,107,108,109,110,111,113,114,121,127,],[61,-43,79,-44,-45,-41,79,-30,-31,-32,-33,-34,None,None,None,None,None,None,79,-42,-46,79,]),'MENOR':([44,50,51,55,56,86,87,101,102,103,104,105,106,107,108,109,110,111,113,114,121,127,],[62,-43,80,-44,-45,-41,80,-30,-31,-32,-33,-34,None,None,None,None,None,None,80,-42,-46,80,]),'MAIOR_IGUAL':([44,50,51,55,56,86,87,101,102,103,104,105,106,107,108,109,110,111,113,114,121,127,],[63,-43,81,-44,-45,-41,81,-30,-31,-32,-33,-34,None,None,None,None,None,None,81,-42,-46,81,]),'MENOR_IGUAL':([44,50,51,55,56,86,87,101,102,103,104,105,106,107,108,109,110,111,113,114,121,127,],[64,-43,82,-44,-45,-41,82,-30,-31,-32,-33,-34,None,None,None,None,None,None,82,-42,-46,82,]),'POR':([47,],[71,]),'EIXO_X':([49,],[72,]),'MAIS':([50,51,55,56,86,87,101,102,103,104,105,106,107,108,109,110,111,113,114,121,127,],[-43,74,-44,-45,-41,74,-30,-31,-32,-33,-34,74,74,74,74,74,74,74,-42,-46,74,]),'VEZES':([50,51,55,56,86,87,101,102,103,104,105,106,107,108,109,110,111,113,114,121,127,],[-43,76,-44,-45,-41,76,76,76,-32,-33,-34,76,76,76,76,76,76,76,-42,-46,76,]),'DIVIDIR':([50,51,55,56,86,87,101,102,103,104,105,106,107,108,109,110,111,113,114,121,127,],[-43,77,-44,-45,-41,77,77,77,-32,-33,-34,77,77,77,77,77,77,77,-42,-46,77,]),'POTENCIA':([50,51,55,56,86,87,101,102,103,104,105,106,107,108,109,110,111,113,114,121,127,],[-43,78,-44,-45,78,78,78,78,78,78,78,78,78,78,78,78,78,78,-42,-46,78,]),'FECHA_PARENTESES':([50,55,56,86,87,101,102,103,104,105,106,107,108,109,110,111,112,113,114,121,127,],[-43,-44,-45,-41,114,-30,-31,-32,-33,-34,-35,-36,-37,-38,-39,-40,121,-47,-42,-46,-48,]),'VIRGULA':([50,55,56,86,101,102,103,104,105,106,107,108,109,110,111,112,113,114,121,127,],[-43,-44,-45,-41,-30,-31,-32,-33,-34,-35,-36,-37,-38,-39,-40,122,-47,-42,-46,-48,]),'BLOCOS':([67,],[94,]),'EIXO_Y':([120,],[126,]),'SALVAR':([130,131,132,136,137,],[-24,133,-25,-27,-26,]),'SEM':([130,131,132,136,137,],[-24,134,-25,-27,-26,]),'REDUCAO':([134,],[136,]),}
 
 _lr_action = {}
 for _k, _v in _lr_action_items.items():
@@ -17,7 +17,7 @@ for _k, _v in _lr_action_items.items():
       _lr_action[_x][_k] = _y
 del _lr_action_items
 
-_lr_goto_items = {'programa':([0,],[1,]),'comando':([0,1,],[2,7,]),'tipo_calculo':([5,],[11,]),'tipo_grafico':([20,],[25,]),}
+_lr_goto_items = {'programa':([0,],[1,]),'comando':([0,1,],[2,9,]),'calculos':([5,],[14,]),'calculo':([5,28,],[15,38,]),'tipo_calculo':([5,28,],[16,16,]),'tipo_grafico':([30,],[40,]),'opcoes_carga':([36,65,],[46,93,]),'expressao':([43,53,54,74,75,76,77,78,79,80,81,82,83,84,85,122,],[51,86,87,101,102,103,104,105,106,107,108,109,110,111,113,127,]),'operador_filtro':([44,],[57,]),'opcao_carga':([46,93,],[66,66,]),'valor_filtro':([57,],[89,]),'colunas_grupo':([71,],[97,]),'argumentos':([85,],[112,]),'opcoes_plotar':([130,],[131,]),'opcao_plotar':([131,],[132,]),}
 
 _lr_goto = {}
 for _k, _v in _lr_goto_items.items():
@@ -27,17 +27,68 @@ for _k, _v in _lr_goto_items.items():
 del _lr_goto_items
 _lr_productions = [
   ("S' -> programa","S'",1,None,None,None),
-  ('programa -> comando','programa',1,'p_programa','graficalc_engine.py',63),
-  ('programa -> programa comando','programa',2,'p_programa','graficalc_engine.py',64),
-  ('comando -> MOSTRAR DADOS DE ID','comando',4,'p_comando_mostrar','graficalc_engine.py',69),
-  ('comando -> CARREGAR DADOS DE STRING COMO ID','comando',6,'p_comando_carregar','graficalc_engine.py',98),
-  ('comando -> CALCULAR tipo_calculo DA COLUNA STRING DE ID','comando',7,'p_comando_calcular','graficalc_engine.py',121),
-  ('tipo_calculo -> MEDIA','tipo_calculo',1,'p_tipo_calculo_media','graficalc_engine.py',157),
-  ('tipo_calculo -> MEDIANA','tipo_calculo',1,'p_tipo_calculo_mediana','graficalc_engine.py',161),
-  ('tipo_calculo -> MODA','tipo_calculo',1,'p_tipo_calculo_moda','graficalc_engine.py',165),
-  ('comando -> PLOTAR GRAFICO DE tipo_grafico COM EIXO_X STRING E EIXO_Y STRING DE ID SALVAR COMO STRING','comando',15,'p_comando_plotar','graficalc_engine.py',170),
-  ('comando -> PLOTAR GRAFICO DE tipo_grafico COM EIXO_X STRING E EIXO_Y STRING DE ID','comando',12,'p_comando_plotar','graficalc_engine.py',171),
-  ('comando -> CARREGAR ARQUIVO COMO ID','comando',4,'p_comando_carregar_arquivo','graficalc_engine.py',228),
-  ('tipo_grafico -> BARRAS','tipo_grafico',1,'p_tipo_grafico_barras','graficalc_engine.py',258),
-  ('tipo_grafico -> LINHAS','tipo_grafico',1,'p_tipo_grafico_linhas','graficalc_engine.py',262),
+  ('programa -> comando','programa',1,'p_programa','graficalc_engine.py',184),
+  ('programa -> programa comando','programa',2,'p_programa','graficalc_engine.py',185),
+  ('comando -> MOSTRAR DADOS DE ID','comando',4,'p_comando_mostrar','graficalc_engine.py',195),
+  ('comando -> MOSTRAR MEMORIA DE ID','comando',4,'p_comando_mostrar_memoria','graficalc_engine.py',199),
+  ('comando -> CARREGAR DADOS DE STRING COMO ID opcoes_carga','comando',7,'p_comando_carregar','graficalc_engine.py',203),
+  ('opcoes_carga -> <empty>','opcoes_carga',0,'p_opcoes_carga','graficalc_engine.py',208),
+  ('opcoes_carga -> opcoes_carga opcao_carga','opcoes_carga',2,'p_opcoes_carga','graficalc_engine.py',209),
+  ('opcao_carga -> EM BLOCOS','opcao_carga',2,'p_opcao_carga_blocos','graficalc_engine.py',217),
+  ('opcao_carga -> COMPACTO','opcao_carga',1,'p_opcao_carga_compacto','graficalc_engine.py',221),
+  ('opcao_carga -> PLANILHA STRING','opcao_carga',2,'p_opcao_carga_planilha','graficalc_engine.py',225),
+  ('opcao_carga -> CABECALHO NUMERO','opcao_carga',2,'p_opcao_carga_cabecalho','graficalc_engine.py',229),
+  ('comando -> CALCULAR calculos DE ID','comando',4,'p_comando_calcular','graficalc_engine.py',233),
+  ('comando -> CALCULAR calculos DE ID AGRUPAR POR colunas_grupo','comando',7,'p_comando_calcular_agrupado','graficalc_engine.py',239),
+  ('comando -> CALCULAR calculos DE ID AGRUPAR POR colunas_grupo COMO ID','comando',9,'p_comando_calcular_agrupado','graficalc_engine.py',240),
+  ('calculos -> calculo','calculos',1,'p_calculos','graficalc_engine.py',247),
+  ('calculos -> calculos E calculo','calculos',3,'p_calculos','graficalc_engine.py',248),
+  ('calculo -> tipo_calculo DA COLUNA STRING','calculo',4,'p_calculo','graficalc_engine.py',256),
+  ('colunas_grupo -> STRING','colunas_grupo',1,'p_colunas_grupo','graficalc_engine.py',261),
+  ('colunas_grupo -> colunas_grupo E STRING','colunas_grupo',3,'p_colunas_grupo','graficalc_engine.py',262),
+  ('tipo_calculo -> MEDIA','tipo_calculo',1,'p_tipo_calculo_media','graficalc_engine.py',271),
+  ('tipo_calculo -> MEDIANA','tipo_calculo',1,'p_tipo_calculo_mediana','graficalc_engine.py',275),
+  ('tipo_calculo -> MODA','tipo_calculo',1,'p_tipo_calculo_moda','graficalc_engine.py',279),
+  ('comando -> PLOTAR GRAFICO DE tipo_grafico COM EIXO_X STRING E EIXO_Y STRING DE ID opcoes_plotar','comando',13,'p_comando_plotar','graficalc_engine.py',283),
+  ('opcoes_plotar -> <empty>','opcoes_plotar',0,'p_opcoes_plotar','graficalc_engine.py',288),
+  ('opcoes_plotar -> opcoes_plotar opcao_plotar','opcoes_plotar',2,'p_opcoes_plotar','graficalc_engine.py',289),
+  ('opcao_plotar -> SALVAR COMO STRING','opcao_plotar',3,'p_opcao_plotar_salvar','graficalc_engine.py',297),
+  ('opcao_plotar -> SEM REDUCAO','opcao_plotar',2,'p_opcao_plotar_sem_reducao','graficalc_engine.py',301),
+  ('comando -> CARREGAR ARQUIVO COMO ID opcoes_carga','comando',5,'p_comando_carregar_arquivo','graficalc_engine.py',306),
+  ('comando -> CRIAR COLUNA STRING ATRIBUICAO expressao EM ID','comando',7,'p_comando_criar_coluna','graficalc_engine.py',311),
+  ('expressao -> expressao MAIS expressao','expressao',3,'p_expressao_binaria','graficalc_engine.py',316),
+  ('expressao -> expressao MENOS expressao','expressao',3,'p_expressao_binaria','graficalc_engine.py',317),
+  ('expressao -> expressao VEZES expressao','expressao',3,'p_expressao_binaria','graficalc_engine.py',318),
+  ('expressao -> expressao DIVIDIR expressao','expressao',3,'p_expressao_binaria','graficalc_engine.py',319),
+  ('expressao -> expressao POTENCIA expressao','expressao',3,'p_expressao_binaria','graficalc_engine.py',320),
+  ('expressao -> expressao MAIOR expressao','expressao',3,'p_expressao_binaria','graficalc_engine.py',321),
+  ('expressao -> expressao MENOR expressao','expressao',3,'p_expressao_binaria','graficalc_engine.py',322),
+  ('expressao -> expressao MAIOR_IGUAL expressao','expressao',3,'p_expressao_binaria','graficalc_engine.py',323),
+  ('expressao -> expressao MENOR_IGUAL expressao','expressao',3,'p_expressao_binaria','graficalc_engine.py',324),
+  ('expressao -> expressao IGUAL expressao','expressao',3,'p_expressao_binaria','graficalc_engine.py',325),
+  ('expressao -> expressao DIFERENTE expressao','expressao',3,'p_expressao_binaria','graficalc_engine.py',326),
+  ('expressao -> MENOS expressao','expressao',2,'p_expressao_negativa','graficalc_engine.py',331),
+  ('expressao -> ABRE_PARENTESES expressao FECHA_PARENTESES','expressao',3,'p_expressao_parenteses','graficalc_engine.py',335),
+  ('expressao -> STRING','expressao',1,'p_expressao_coluna','graficalc_engine.py',339),
+  ('expressao -> NUMERO','expressao',1,'p_expressao_numero','graficalc_engine.py',344),
+  ('expressao -> DECIMAL','expressao',1,'p_expressao_numero','graficalc_engine.py',345),
+  ('expressao -> ID ABRE_PARENTESES argumentos FECHA_PARENTESES','expressao',4,'p_expressao_funcao','graficalc_engine.py',350),
+  ('argumentos -> expressao','argumentos',1,'p_argumentos','graficalc_engine.py',360),
+  ('argumentos -> argumentos VIRGULA expressao','argumentos',3,'p_argumentos','graficalc_engine.py',361),
+  ('comando -> FILTRAR ID ONDE STRING operador_filtro valor_filtro','comando',6,'p_comando_filtrar','graficalc_engine.py',370),
+  ('comando -> FILTRAR ID ONDE STRING operador_filtro valor_filtro COMO ID','comando',8,'p_comando_filtrar','graficalc_engine.py',371),
+  ('operador_filtro -> IGUAL','operador_filtro',1,'p_operador_filtro','graficalc_engine.py',378),
+  ('operador_filtro -> ATRIBUICAO','operador_filtro',1,'p_operador_filtro','graficalc_engine.py',379),
+  ('operador_filtro -> DIFERENTE','operador_filtro',1,'p_operador_filtro','graficalc_engine.py',380),
+  ('operador_filtro -> MAIOR','operador_filtro',1,'p_operador_filtro','graficalc_engine.py',381),
+  ('operador_filtro -> MENOR','operador_filtro',1,'p_operador_filtro','graficalc_engine.py',382),
+  ('operador_filtro -> MAIOR_IGUAL','operador_filtro',1,'p_operador_filtro','graficalc_engine.py',383),
+  ('operador_filtro -> MENOR_IGUAL','operador_filtro',1,'p_operador_filtro','graficalc_engine.py',384),
+  ('valor_filtro -> STRING','valor_filtro',1,'p_valor_filtro','graficalc_engine.py',391),
+  ('valor_filtro -> NUMERO','valor_filtro',1,'p_valor_filtro','graficalc_engine.py',392),
+  ('valor_filtro -> DECIMAL','valor_filtro',1,'p_valor_filtro','graficalc_engine.py',393),
+  ('valor_filtro -> MENOS NUMERO','valor_filtro',2,'p_valor_filtro_negativo','graficalc_engine.py',399),
+  ('valor_filtro -> MENOS DECIMAL','valor_filtro',2,'p_valor_filtro_negativo','graficalc_engine.py',400),
+  ('tipo_grafico -> BARRAS','tipo_grafico',1,'p_tipo_grafico_barras','graficalc_engine.py',405),
+  ('tipo_grafico -> LINHAS','tipo_grafico',1,'p_tipo_grafico_linhas','graficalc_engine.py',409),
 ]
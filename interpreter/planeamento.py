@@ -0,0 +1,61 @@
+from .comandos import CarregarDados, CarregarArquivo
+
+
+# PROJEÇÃO DE COLUNAS
+# Percorre o plano inteiro e junta, para cada CARREGAR, as colunas que os
+# comandos seguintes usam da variável carregada (até ela voltar a ser
+# carregada). Se algum comando precisar de todas as colunas, ou se a variável
+# não for usada no script, a carga é completa. Comandos cuja saída mantém as
+# colunas da variável lida (CRIAR COLUNA, FILTRAR) mantêm a carga aberta para a
+# variável escrita; as colunas criadas não são pedidas ao ficheiro.
+# Com variaveis_guardadas, as variáveis que chegam ao fim do script vão para a
+# sessão e os pedidos seguintes podem usar outras colunas: as cargas de onde
+# elas vêm são completas.
+
+def planear_projecoes(plano, variaveis_guardadas=True):
+    projecoes = {}
+    # variável -> (carga de onde vêm as suas colunas, colunas criadas desde a carga)
+    cargas_abertas = {}
+
+    for comando in plano.comandos:
+        for variavel in comando.leituras():
+            carga, criadas = cargas_abertas.get(variavel, (None, None))
+            if carga is None or carga not in projecoes:
+                continue
+            colunas = comando.colunas(variavel)
+            if colunas is None:
+                # Basta um comando que precise de tudo para desistir da projeção
+                del projecoes[carga]
+            else:
+                projecoes[carga] = projecoes[carga] | (colunas - criadas)
+
+        for variavel in comando.escritas():
+            origem = comando.origem(variavel)
+            if origem in cargas_abertas:
+                carga, criadas = cargas_abertas[origem]
+                cargas_abertas[variavel] = (carga, criadas | comando.colunas_criadas(variavel))
+            else:
+                cargas_abertas.pop(variavel, None)
+        if isinstance(comando, (CarregarDados, CarregarArquivo)):
+            cargas_abertas[comando.variavel] = (comando, frozenset())
+            projecoes[comando] = frozenset()
+
+    if variaveis_guardadas:
+        for carga, _ in cargas_abertas.values():
+            projecoes.pop(carga, None)
+
+    return {comando: colunas for comando, colunas in projecoes.items() if colunas}
+
+
+# GRAFO DE DEPENDÊNCIAS
+# Para cada comando, o índice do comando que produziu cada variável que ele lê
+# (None quando a variável já vinha da sessão).
+
+def grafo_dependencias(plano):
+    grafo = []
+    ultimo_a_escrever = {}
+    for indice, comando in enumerate(plano.comandos):
+        grafo.append({variavel: ultimo_a_escrever.get(variavel) for variavel in comando.leituras()})
+        for variavel in comando.escritas():
+            ultimo_a_escrever[variavel] = indice
+    return grafo
@@ -0,0 +1,69 @@
+# REDUÇÃO DE PONTOS (PLOTAR)
+# Um gráfico com mais pontos do que píxeis só demora mais a desenhar. Antes de
+# ir para o renderizador, as séries grandes são reduzidas:
+#   LINHAS: as linhas são divididas em tantos grupos consecutivos quantos os
+#           píxeis da largura do gráfico e de cada grupo ficam o mínimo e o
+#           máximo, para que os picos continuem visíveis;
+#   BARRAS: só com mais valores distintos de x do que MAXIMO_CATEGORIAS: as
+#           barras com o mesmo valor de x são somadas e ficam as categorias de
+#           maior total e uma barra "Outros". Com menos categorias, as barras
+#           são desenhadas como estão, mesmo que a tabela tenha muitas linhas.
+
+MAXIMO_CATEGORIAS = 50
+NOME_OUTROS = 'Outros'
+
+
+def reduzir_linhas(x, y, pixeis):
+    # Devolve (x, y, metodo) ou None se a série já for pequena ou não for numérica
+    import numpy as np
+    quantidade = len(y)
+    if quantidade <= 2 * pixeis or not np.issubdtype(y.dtype, np.number):
+        return None
+
+    largura = -(-quantidade // pixeis)
+    grupos = -(-quantidade // largura)
+    valores = np.full(grupos * largura, np.nan)
+    valores[:quantidade] = y
+    valores = valores.reshape(grupos, largura)
+
+    # NaN nunca é escolhido como mínimo nem como máximo (exceto num grupo só de NaN)
+    minimos = np.argmin(np.where(np.isnan(valores), np.inf, valores), axis=1)
+    maximos = np.argmax(np.where(np.isnan(valores), -np.inf, valores), axis=1)
+    inicio = np.arange(grupos) * largura
+    indices = np.concatenate([inicio + minimos, inicio + maximos, [0, quantidade - 1]])
+    # Ordenar mantém cada par mínimo/máximo pela ordem em que aparece na série
+    indices = np.unique(indices[indices < quantidade])
+    return x[indices], y[indices], 'min_max'
+
+
+def reduzir_barras(x, y, maximo_categorias=MAXIMO_CATEGORIAS):
+    # Devolve (x, y, metodo) ou None se x tiver no máximo `maximo_categorias` valores distintos
+    import numpy as np
+    if len(x) <= maximo_categorias or not np.issubdtype(y.dtype, np.number):
+        return None
+
+    import pandas as pd
+    codigos, categorias = pd.factorize(x, sort=False)
+    if len(categorias) <= maximo_categorias:
+        return None
+    validos = codigos >= 0
+    totais = np.bincount(codigos[validos], weights=np.nan_to_num(y[validos].astype(np.float64)), minlength=len(categorias))
+
+    # Os maiores totais pela ordem em que as categorias aparecem; o resto fica em "Outros"
+    maiores = np.sort(np.argpartition(-totais, maximo_categorias - 1)[:maximo_categorias - 1])
+    restantes = np.ones(len(categorias), dtype=bool)
+    restantes[maiores] = False
+    nomes = np.append(np.asarray(categorias, dtype=object)[maiores].astype(str), NOME_OUTROS)
+    return nomes, np.append(totais[maiores], totais[restantes].sum()), 'top_n'
+
+
+def reduzir_pontos(tipo_grafico, x, y, pixeis):
+    # Devolve (x, y, relatório da redução ou None)
+    if tipo_grafico == 'LINHAS':
+        reduzido = reduzir_linhas(x, y, pixeis)
+    else:
+        reduzido = reduzir_barras(x, y)
+    if reduzido is None:
+        return x, y, None
+    novo_x, novo_y, metodo = reduzido
+    return novo_x, novo_y, {'metodo': metodo, 'pontos_originais': len(x), 'pontos_desenhados': len(novo_x)}
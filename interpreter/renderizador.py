@@ -0,0 +1,225 @@
+import base64
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from . import metricas
+from .armazenamento import chave_valida, gravar_atomicamente
+
+
+# RENDERIZAÇÃO DE GRÁFICOS
+# Cada gráfico é desenhado numa Figure própria com um FigureCanvasAgg, sem o
+# estado global do pyplot, por isso vários gráficos podem ser desenhados ao
+# mesmo tempo. Com `processos > 0` o desenho corre num conjunto limitado de
+# processos e os PLOTAR de um script são desenhados em paralelo; o
+# Interpretador recebe um Future por gráfico.
+
+TAMANHO_FIGURA = (12, 5)  # polegadas
+
+TIPOS_MIME = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'webp': 'image/webp',
+}
+
+segundos_renderizacao = metricas.registo.registar(metricas.Histograma(
+    'graficalc_renderizacao_segundos', "Tempo entre o pedido de um gráfico e a imagem pronta.",
+    metricas.LIMITES_SEGUNDOS))
+pedidos_cache_graficos = metricas.registo.registar(metricas.Contador(
+    'graficalc_cache_graficos_total', "Gráficos pedidos, por resultado na cache de gráficos (acerto/falha)."))
+
+
+# CACHE DE GRÁFICOS
+# Imagens já desenhadas, endereçadas por uma chave que resume os dados e as
+# opções do gráfico (`<sha256>.<formato>`). O mesmo gráfico pedido por outro
+# utilizador ou noutra submissão é servido do disco sem ser desenhado outra
+# vez. Ao lado de cada imagem fica um JSON com o relatório da redução de pontos.
+
+class CacheGraficos:
+
+    def __init__(self, raiz, url_base='/graficos/'):
+        self.raiz = str(raiz)
+        self.url_base = url_base
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def caminho(self, chave):
+        if not chave_valida(chave) or chave.rsplit('.', 1)[1] not in TIPOS_MIME:
+            raise ValueError(f"Chave de gráfico inválida: '{chave}'")
+        return os.path.join(self.raiz, chave[:2], chave)
+
+    def url(self, chave):
+        return f"{self.url_base}{chave}"
+
+    def resultado(self, chave, ficheiro_saida):
+        # Resultado de um gráfico já desenhado, ou None se ainda não estiver na cache
+        caminho = self.caminho(chave)
+        try:
+            with open(caminho + '.json', encoding='utf-8') as ficheiro:
+                meta = json.load(ficheiro)
+        except FileNotFoundError:
+            return None
+        if not os.path.exists(caminho):
+            return None
+        # A limpeza do disco (limpar_disco) apaga primeiro os gráficos usados há mais tempo
+        os.utime(caminho + '.json')
+        return self.montar_resultado(chave, ficheiro_saida, meta.get('reducao'))
+
+    def guardar(self, chave, imagem, reducao):
+        caminho = self.caminho(chave)
+        gravar_atomicamente(caminho, imagem)
+        # O JSON é gravado depois da imagem: se existir, a imagem também existe
+        gravar_atomicamente(caminho + '.json', json.dumps({'reducao': reducao}).encode('utf-8'))
+
+    def montar_resultado(self, chave, ficheiro_saida, reducao):
+        resultado = {
+            'type': 'image',
+            'url': self.url(chave),
+            'filename': ficheiro_saida,
+            'mime': TIPOS_MIME[chave.rsplit('.', 1)[1]],
+        }
+        if reducao:
+            resultado['reducao'] = reducao
+        return resultado
+
+
+def formato_do_ficheiro(nome_ficheiro):
+    # Extensões desconhecidas (ou nenhuma) continuam a gerar PNG, como antes
+    extensao = os.path.splitext(nome_ficheiro)[1].lower().lstrip('.')
+    return extensao if extensao in TIPOS_MIME else 'png'
+
+
+def desenhar(tipo_grafico, x, y, coluna_x, coluna_y, formato='png', dpi=100):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figura = Figure(figsize=TAMANHO_FIGURA)
+    FigureCanvasAgg(figura)
+    try:
+        eixos = figura.add_subplot()
+        if tipo_grafico == 'BARRAS':
+            eixos.bar(x, y)
+        elif tipo_grafico == 'LINHAS':
+            eixos.plot(x, y)
+
+        eixos.set_xlabel(coluna_x)
+        eixos.set_ylabel(coluna_y)
+        eixos.set_title(f'Gráfico de {tipo_grafico.capitalize()} de {coluna_y} por {coluna_x}')
+        eixos.grid(True)
+
+        buffer = io.BytesIO()
+        figura.savefig(buffer, format=formato, dpi=dpi, bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        figura.clear()
+
+
+def renderizar(pedido):
+    # Corre no processo de renderização: devolve sempre um resultado, nunca uma exceção
+    try:
+        imagem = desenhar(
+            pedido['tipo'], pedido['x'], pedido['y'], pedido['coluna_x'], pedido['coluna_y'],
+            pedido['formato'], pedido['dpi'],
+        )
+    except Exception as e:
+        return {'type': 'error', 'content': f"Ocorreu um erro ao gerar o gráfico: {e}"}
+
+    if pedido['cache'] is not None:
+        cache = pedido['cache']
+        cache.guardar(pedido['chave'], imagem, pedido['reducao'])
+        return cache.montar_resultado(pedido['chave'], pedido['ficheiro_saida'], pedido['reducao'])
+
+    resultado = {
+        'type': 'image',
+        'content': base64.b64encode(imagem).decode('ascii'),
+        'filename': pedido['ficheiro_saida'],
+        'mime': TIPOS_MIME[pedido['formato']],
+    }
+    if pedido['reducao']:
+        resultado['reducao'] = pedido['reducao']
+    return resultado
+
+
+def contexto_processos():
+    # Os pools são criados a meio de um pedido, num servidor com várias threads:
+    # um fork copiaria locks apanhados por outras threads a meio. O forkserver
+    # (ou o spawn, onde não existe) arranca cada processo a partir de um estado limpo.
+    metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(metodo)
+
+
+class RenderizadorGraficos:
+
+    def __init__(self, processos=0, dpi=100, formatos=tuple(TIPOS_MIME), cache=None):
+        self.processos = processos
+        self.dpi = dpi
+        self.formatos = tuple(formatos)
+        self.cache = cache
+        self._executor = None
+        self._lock = threading.Lock()
+        # Limita os gráficos à espera: quem pede mais fica bloqueado até haver lugar
+        self._vagas = threading.BoundedSemaphore(max(processos, 1) * 2)
+
+    @property
+    def largura_pixeis(self):
+        return int(TAMANHO_FIGURA[0] * self.dpi)
+
+    def chave_grafico(self, impressao_dados, ficheiro_saida, *opcoes):
+        # `opcoes`: tudo o que, além dos dados, muda a imagem (tipo, colunas, redução)
+        partes = (impressao_dados, self.dpi, formato_do_ficheiro(ficheiro_saida)) + opcoes
+        return f"{hashlib.sha256(repr(partes).encode('utf-8')).hexdigest()}.{formato_do_ficheiro(ficheiro_saida)}"
+
+    def erro_formato(self, ficheiro_saida):
+        formato = formato_do_ficheiro(ficheiro_saida)
+        if formato in self.formatos:
+            return None
+        suportados = ', '.join(f'.{nome}' for nome in self.formatos)
+        return {'type': 'error', 'content': f"Erro: Formato de imagem '.{formato}' não suportado. Use {suportados}."}
+
+    def em_cache(self, chave, ficheiro_saida):
+        if self.cache is None or self.erro_formato(ficheiro_saida):
+            return None
+        resultado = self.cache.resultado(chave, ficheiro_saida)
+        pedidos_cache_graficos.incrementar(resultado=('acerto' if resultado else 'falha'))
+        return resultado
+
+    def submeter(self, tipo_grafico, x, y, coluna_x, coluna_y, ficheiro_saida, reducao=None, chave=None):
+        formato = formato_do_ficheiro(ficheiro_saida)
+        erro = self.erro_formato(ficheiro_saida)
+        if erro:
+            futuro = Future()
+            futuro.set_result(erro)
+            return futuro
+
+        pedido = {
+            'tipo': tipo_grafico, 'x': x, 'y': y, 'coluna_x': coluna_x, 'coluna_y': coluna_y,
+            'formato': formato, 'dpi': self.dpi, 'ficheiro_saida': ficheiro_saida, 'reducao': reducao,
+            'cache': self.cache if chave else None, 'chave': chave,
+        }
+        inicio = time.perf_counter()
+        if not self.processos:
+            futuro = Future()
+            futuro.set_result(renderizar(pedido))
+            segundos_renderizacao.observar(time.perf_counter() - inicio, formato=formato)
+            return futuro
+
+        self._vagas.acquire()
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.processos, mp_context=contexto_processos())
+                futuro = self._executor.submit(renderizar, pedido)
+        except Exception:
+            self._vagas.release()
+            raise
+
+        def terminar(_):
+            self._vagas.release()
+            segundos_renderizacao.observar(time.perf_counter() - inicio, formato=formato)
+
+        futuro.add_done_callback(terminar)
+        return futuro
@@ -0,0 +1,14 @@
+from django.contrib.sessions.backends.db import SessionStore as SessionStoreBaseDados
+
+from .metricas import cronometrar, segundos_fase
+
+
+# SESSÕES
+# As sessões continuam na base de dados; cada gravação (uma escrita na tabela
+# django_session no fim do pedido) é medida como a fase 'gravar_sessao'.
+
+class SessionStore(SessionStoreBaseDados):
+
+    def save(self, must_create=False):
+        with cronometrar(segundos_fase, fase='gravar_sessao'):
+            super().save(must_create)
@@ -0,0 +1,208 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from .armazenamento import ArmazemDados, VariaveisSessao, ativar_copy_on_write
+from .cache_leitura import CacheLeitura
+from .incremental import CacheExecucao
+from .indices import CacheIndices
+from .graficalc_engine import Interpretador
+from .renderizador import CacheGraficos, RenderizadorGraficos, TIPOS_MIME, contexto_processos
+
+
+# TAREFAS ASSÍNCRONAS
+# Cada tarefa tem uma pasta própria com o estado (estado.json), os resultados
+# já produzidos (um JSON por linha em resultados.ndjson) e, se for pedido, um
+# ficheiro `cancelar`. O estado vive em disco para que qualquer processo do
+# servidor web possa responder sobre qualquer tarefa. As pastas das tarefas
+# terminadas há mais de `expirar_segundos` são apagadas a cada submissão.
+
+NA_FILA = 'na_fila'
+EM_EXECUCAO = 'em_execucao'
+CONCLUIDA = 'concluida'
+CANCELADA = 'cancelada'
+ERRO = 'erro'
+ESTADOS_FINAIS = (CONCLUIDA, CANCELADA, ERRO)
+
+
+class FilaCheia(Exception):
+    pass
+
+
+def gravar_estado(pasta, **estado):
+    temporario = os.path.join(pasta, 'estado.json.tmp')
+    with open(temporario, 'w', encoding='utf-8') as ficheiro:
+        json.dump(estado, ficheiro)
+    os.replace(temporario, os.path.join(pasta, 'estado.json'))
+
+
+def formatar_ndjson(resultado):
+    # Também usado pela execução em fluxo (views): os valores que o JSON não conhece vão como texto
+    return json.dumps(resultado, default=str) + '\n'
+
+
+def ler_estado(pasta):
+    with open(os.path.join(pasta, 'estado.json'), encoding='utf-8') as ficheiro:
+        return json.load(ficheiro)
+
+
+# Cada processo do pool abre o armazém e as caches uma única vez; os
+# gráficos são desenhados no próprio processo da tarefa
+recursos_processo = {}
+
+
+def obter_recursos(configuracao):
+    chave = json.dumps(configuracao, sort_keys=True)
+    if chave not in recursos_processo:
+        # Os processos do pool não passam pelo arranque do Django (InterpreterConfig.ready)
+        if configuracao.get('copy_on_write'):
+            ativar_copy_on_write()
+        recursos_processo[chave] = (
+            ArmazemDados(configuracao['dados_root'], configuracao['codec_dados'],
+                         configuracao.get('mapas_bytes', 1024 * 1024 * 1024)),
+            CacheLeitura(configuracao['cache_leitura_root'], configuracao['cache_leitura_bytes']),
+            CacheExecucao(configuracao.get('cache_execucao_entradas', 128),
+                          configuracao.get('cache_execucao_bytes', 512 * 1024 * 1024)),
+            CacheIndices(configuracao.get('indices_bytes', 256 * 1024 * 1024)),
+            RenderizadorGraficos(
+                0, configuracao.get('render_dpi', 100), configuracao.get('render_formatos', tuple(TIPOS_MIME)),
+                CacheGraficos(configuracao['graficos_root'], configuracao['graficos_url']) if 'graficos_root' in configuracao else None,
+            ),
+        )
+    return recursos_processo[chave]
+
+
+def executar_tarefa(pasta, codigo, chaves, caminho_arquivo, configuracao, opcoes):
+    try:
+        if os.path.exists(os.path.join(pasta, 'cancelar')):
+            gravar_estado(pasta, estado=CANCELADA, variaveis={})
+            return
+
+        gravar_estado(pasta, estado=EM_EXECUCAO)
+        armazem, cache_leitura, cache_execucao, cache_indices, renderizador = obter_recursos(configuracao)
+        variaveis = VariaveisSessao(armazem, chaves)
+        interpretador = Interpretador(
+            variaveis, caminho_arquivo, cache_leitura, cache_execucao=cache_execucao, renderizador=renderizador,
+            cache_indices=cache_indices, **opcoes,
+        )
+
+        estado = CONCLUIDA
+        with open(os.path.join(pasta, 'resultados.ndjson'), 'a', encoding='utf-8') as ficheiro:
+            for resultado in interpretador.executar_passos(codigo, guardar_resultados=False):
+                ficheiro.write(formatar_ndjson(resultado))
+                ficheiro.flush()
+                # O cancelamento é verificado entre comandos
+                if os.path.exists(os.path.join(pasta, 'cancelar')):
+                    estado = CANCELADA
+                    break
+
+        if estado == CANCELADA:
+            # Um programa interrompido não altera a sessão: as variáveis que já mudou são descartadas
+            gravar_estado(pasta, estado=estado, variaveis={})
+            return
+        alteradas = variaveis.alteradas()
+        novas_chaves = variaveis.persistir()
+        gravar_estado(pasta, estado=CONCLUIDA, variaveis={nome: novas_chaves[nome] for nome in alteradas})
+
+    except Exception as e:
+        gravar_estado(pasta, estado=ERRO, erro=str(e), variaveis={})
+    finally:
+        if caminho_arquivo and os.path.exists(caminho_arquivo):
+            os.remove(caminho_arquivo)
+
+
+class GestorTarefas:
+
+    def __init__(self, raiz, configuracao, opcoes=None, max_processos=2, max_fila=16, expirar_segundos=24 * 3600):
+        self.raiz = str(raiz)
+        self.configuracao = configuracao
+        self.opcoes = opcoes or {}
+        self.max_processos = max_processos
+        self.max_fila = max_fila
+        self.expirar_segundos = expirar_segundos
+        self._executor = None
+        self._futuros = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def _pasta(self, id_tarefa):
+        if not isinstance(id_tarefa, str) or len(id_tarefa) != 32 or not id_tarefa.isalnum():
+            raise KeyError(id_tarefa)
+        pasta = os.path.join(self.raiz, id_tarefa)
+        if not os.path.isdir(pasta):
+            raise KeyError(id_tarefa)
+        return pasta
+
+    def pendentes(self):
+        with self._lock:
+            self._futuros = {id_tarefa: futuro for id_tarefa, futuro in self._futuros.items() if not futuro.done()}
+            return len(self._futuros)
+
+    def submeter(self, codigo, chaves, caminho_arquivo=None):
+        self.expirar()
+        if self.pendentes() >= self.max_fila:
+            raise FilaCheia(f"Há {self.max_fila} tarefas por executar; tente novamente mais tarde.")
+
+        id_tarefa = uuid.uuid4().hex
+        pasta = os.path.join(self.raiz, id_tarefa)
+        os.makedirs(pasta)
+        gravar_estado(pasta, estado=NA_FILA)
+        if caminho_arquivo:
+            # O ficheiro enviado passa para a pasta da tarefa e é apagado com ela
+            destino = os.path.join(pasta, 'upload' + os.path.splitext(caminho_arquivo)[1])
+            shutil.move(caminho_arquivo, destino)
+            caminho_arquivo = destino
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_processos, mp_context=contexto_processos())
+            self._futuros[id_tarefa] = self._executor.submit(
+                executar_tarefa, pasta, codigo, chaves, caminho_arquivo, self.configuracao, self.opcoes,
+            )
+        return id_tarefa
+
+    def estado(self, id_tarefa):
+        return ler_estado(self._pasta(id_tarefa))
+
+    def resultados(self, id_tarefa, desde=0):
+        caminho = os.path.join(self._pasta(id_tarefa), 'resultados.ndjson')
+        if not os.path.exists(caminho):
+            return []
+        with open(caminho, encoding='utf-8') as ficheiro:
+            linhas = ficheiro.readlines()
+        # Uma linha sem '\n' ainda está a ser escrita
+        return [json.loads(linha) for linha in linhas[desde:] if linha.endswith('\n')]
+
+    def cancelar(self, id_tarefa):
+        pasta = self._pasta(id_tarefa)
+        open(os.path.join(pasta, 'cancelar'), 'w').close()
+        with self._lock:
+            futuro = self._futuros.get(id_tarefa)
+        if futuro is not None and futuro.cancel():
+            gravar_estado(pasta, estado=CANCELADA, variaveis={})
+            for nome in os.listdir(pasta):
+                if nome.startswith('upload'):
+                    os.remove(os.path.join(pasta, nome))
+
+    def remover(self, id_tarefa):
+        shutil.rmtree(self._pasta(id_tarefa), ignore_errors=True)
+
+    def expirar(self, agora=None):
+        # As tarefas por terminar nunca são apagadas; devolve quantas pastas foram removidas
+        agora = time.time() if agora is None else agora
+        removidas = 0
+        for id_tarefa in os.listdir(self.raiz):
+            try:
+                pasta = self._pasta(id_tarefa)
+                terminada = ler_estado(pasta)['estado'] in ESTADOS_FINAIS
+                idade = agora - os.path.getmtime(os.path.join(pasta, 'estado.json'))
+            except (KeyError, OSError, ValueError):
+                continue
+            if terminada and idade > self.expirar_segundos:
+                self.remover(id_tarefa)
+                removidas += 1
+        return removidas
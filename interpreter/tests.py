@@ -1,3 +1,1225 @@
-from django.test import TestCase
+import base64
+import gc
+import importlib.util
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.apps import apps
+from django.core.management import call_command
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from ply import yacc
+
+from .armazenamento import ArmazemDados, CodecMapa, VariaveisSessao
+from .blocos import DadosEmBlocos
+from .memoria import otimizar_tipos, relatorio_memoria
+from .cache_leitura import CacheLeitura
+from .comandos import CarregarArquivo, Calcular, CalcularAgrupado
+from .graficalc_engine import Interpretador, compilar, executar_comandos
+from .planeamento import planear_projecoes, grafo_dependencias
+from .incremental import CacheExecucao
+from .tarefas import GestorTarefas, FilaCheia, ESTADOS_FINAIS
+from . import tarefas
+from .benchmark import executar_benchmark, comparar, linhas_sem_referencia
+from .renderizador import CacheGraficos, RenderizadorGraficos
+from . import renderizador as modulo_renderizador
+from .reducao import reduzir_linhas, reduzir_barras
+from .janelas import CacheJanelas, janela, tamanho_dados
+from . import janelas
+from .agregacao import agregar
+from .indices import CacheIndices, COMPARACOES, filtrar_posicoes
+from .carga import diferenca_histograma, executar_teste_carga, interpretar_metricas, percentil
+from . import expressoes
+from .lote import executar_lote
+from . import metricas
+from . import graficalc_engine, parsetab
+from . import views
+
+
+CAMINHO_VENDAS = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'vendas_teste.csv')
+
+
+class ArmazemTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.armazem = ArmazemDados(self.pasta.name)
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+
+class VariaveisSessaoTests(ArmazemTestCase):
+
+    def test_guarda_apenas_chaves_e_preserva_tipos(self):
+        df = pd.DataFrame({'a': pd.Series([1, 2], dtype='int32'), 'b': pd.to_datetime(['2024-01-01', '2024-02-01'])})
+        variaveis = VariaveisSessao(self.armazem)
+        variaveis['v'] = df
+        chaves = variaveis.persistir()
+
+        recarregadas = VariaveisSessao(self.armazem, chaves)
+        self.assertTrue(self.armazem.existe(chaves['v']))
+        pd.testing.assert_frame_equal(recarregadas['v'], df)
+
+    def test_descodifica_so_quando_lida_e_regrava_so_as_alteradas(self):
+        variaveis = VariaveisSessao(self.armazem)
+        variaveis['a'] = pd.DataFrame({'x': [1]})
+        variaveis['b'] = pd.DataFrame({'x': [2]})
+        chaves = variaveis.persistir()
+
+        recarregadas = VariaveisSessao(self.armazem, chaves)
+        self.assertIn('a', recarregadas)
+        self.assertEqual(recarregadas._carregadas, {})
+        recarregadas['b'] = pd.DataFrame({'x': [3]})
+        self.assertEqual(recarregadas.alteradas(), {'b'})
+        novas = recarregadas.persistir()
+        self.assertEqual(novas['a'], chaves['a'])
+        self.assertNotEqual(novas['b'], chaves['b'])
+
+    def test_le_sessoes_antigas_em_json(self):
+        variaveis = VariaveisSessao(self.armazem, {'v': pd.DataFrame({'x': [1, 2]}).to_json()})
+        self.assertEqual(list(variaveis['v']['x']), [1, 2])
+        self.assertEqual(variaveis.alteradas(), {'v'})
+
+    def test_executar_comandos_com_cache_de_leitura(self):
+        cache = CacheLeitura(os.path.join(self.pasta.name, 'cache'))
+        codigo = f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO vendas'
+        executar_comandos(codigo, {}, cache_leitura=cache)
+        resultados, variaveis = executar_comandos(codigo, {}, cache_leitura=cache)
+        self.assertEqual(resultados[0]['type'], 'message')
+        self.assertEqual(len(variaveis['vendas']), 12)
+        self.assertEqual(cache.estatisticas()['acertos_memoria'], 1)
+
+    def test_executar_comandos_com_variaveis_da_sessao(self):
+        variaveis = VariaveisSessao(self.armazem)
+        resultados, variaveis = executar_comandos(f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO vendas', variaveis)
+        self.assertEqual(resultados[0]['type'], 'message')
+        chaves = variaveis.persistir()
+
+        resultados, _ = executar_comandos('CALCULAR MEDIA DA COLUNA "Despesas" DE vendas', VariaveisSessao(self.armazem, chaves))
+        self.assertEqual(resultados[0]['type'], 'message')
+
+
+class MapasPartilhadosTests(SimpleTestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.armazem = ArmazemDados(self.pasta.name, 'mapa', limite_mapas_bytes=0)
+        self.df = pd.DataFrame({
+            'valor': np.arange(6, dtype='float64'),
+            'quantidade': np.arange(6, dtype='int32'),
+            'produto': list('abcabc'),
+            'data': pd.date_range('2024-01-01', periods=6),
+        }, index=[5, 4, 3, 2, 1, 1])
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+    def test_codec_preserva_o_dataframe(self):
+        codec = CodecMapa()
+        for df in (self.df, self.df.iloc[:0], self.df.astype({'produto': 'category'})):
+            pd.testing.assert_frame_equal(codec.decodificar(codec.codificar(df)), df)
+
+    def test_dados_iguais_mapeados_uma_vez_e_copiados_so_ao_alterar(self):
+        chave = self.armazem.guardar(self.df)
+        self.assertEqual(self.armazem.guardar(self.df.copy()), chave)
+
+        primeira, segunda = self.armazem.carregar(chave), self.armazem.carregar(chave)
+        self.assertTrue(np.shares_memory(primeira['valor'].to_numpy(), segunda['valor'].to_numpy()))
+        self.assertFalse(primeira['valor'].to_numpy().flags.writeable)
+        self.assertEqual(self.armazem.mapas.estatisticas()['referencias'], 2)
+
+        primeira.iloc[0, 0] = 100.0
+        self.assertEqual(segunda.iloc[0, 0], 0.0)
+        self.assertEqual(self.armazem.carregar(chave).iloc[0, 0], 0.0)
+
+    def test_copy_on_write_ligado_no_arranque_em_pandas_2(self):
+        codec = CodecMapa()
+        dados = codec.codificar(self.df)
+        with mock.patch('importlib.metadata.version', return_value='2.2.3'), \
+                mock.patch.object(pd, 'set_option') as definir:
+            # Descodificar não altera as opções globais do pandas
+            codec.decodificar(dados)
+            definir.assert_not_called()
+            with override_settings(GRAFICALC_COPY_ON_WRITE=False):
+                apps.get_app_config('interpreter').ready()
+            definir.assert_not_called()
+            apps.get_app_config('interpreter').ready()
+        definir.assert_called_once_with('mode.copy_on_write', True)
+
+    def test_mapas_sem_referencias_sao_despejados(self):
+        chave = self.armazem.guardar(self.df)
+        dados = self.armazem.carregar(chave)
+        self.assertEqual(self.armazem.mapas.estatisticas()['mapas'], 1)
+        del dados
+        gc.collect()
+        estatisticas = self.armazem.mapas.estatisticas()
+        self.assertEqual((estatisticas['mapas'], estatisticas['referencias'], estatisticas['despejos']), (0, 0, 1))
+
+
+class CacheLeituraTests(SimpleTestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.leituras = 0
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+    def leitor(self, caminho, **opcoes):
+        self.leituras += 1
+        return pd.read_csv(caminho)
+
+    def test_releituras_do_mesmo_conteudo_nao_voltam_a_ler_o_ficheiro(self):
+        cache = CacheLeitura(self.pasta.name)
+        primeiro = cache.ler(CAMINHO_VENDAS, self.leitor, {})
+        segundo = cache.ler(CAMINHO_VENDAS, self.leitor, {})
+        pd.testing.assert_frame_equal(primeiro, segundo)
+        self.assertEqual(self.leituras, 1)
+
+        novo_processo = CacheLeitura(self.pasta.name)
+        novo_processo.ler(CAMINHO_VENDAS, self.leitor, {})
+        self.assertEqual(self.leituras, 1)
+        self.assertEqual(cache.estatisticas()['acertos_memoria'], 1)
+        self.assertEqual(novo_processo.estatisticas()['acertos_disco'], 1)
+
+    def test_opcoes_diferentes_geram_entradas_diferentes(self):
+        cache = CacheLeitura(self.pasta.name)
+        cache.ler(CAMINHO_VENDAS, self.leitor, {})
+        apenas_mes = cache.ler(CAMINHO_VENDAS, pd.read_csv, {'usecols': ['Mês']})
+        self.assertEqual(list(apenas_mes.columns), ['Mês'])
+        self.assertEqual(cache.estatisticas()['falhas'], 2)
+
+    def test_memoria_limitada_em_bytes(self):
+        cache = CacheLeitura(self.pasta.name, limite_bytes=1)
+        cache.ler(CAMINHO_VENDAS, self.leitor, {})
+        self.assertEqual(cache.estatisticas()['entradas_memoria'], 0)
+
+
+class InterpretadorConcorrenteTests(SimpleTestCase):
+
+    def executar_sessao(self, indice):
+        df = pd.DataFrame({'x': [str(i) for i in range(5)], 'valor': [float(indice)] * 5})
+        interpretador = Interpretador({f'dados_{indice}': df})
+        codigo = (
+            f'MOSTRAR DADOS DE dados_{indice}\n'
+            f'CALCULAR MEDIA DA COLUNA "valor" DE dados_{indice}\n'
+            f'PLOTAR GRAFICO DE BARRAS COM EIXO_X "x" E EIXO_Y "valor" DE dados_{indice}\n'
+            f'CALCULAR MEDIANA DA COLUNA "valor" DE dados_{indice}'
+        )
+        return indice, interpretador.executar(codigo), set(interpretador.variaveis)
+
+    def test_sessoes_concorrentes_nao_se_misturam(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            execucoes = list(executor.map(self.executar_sessao, range(32)))
+
+        for indice, resultados, nomes in execucoes:
+            self.assertEqual([r['type'] for r in resultados], ['table', 'message', 'image', 'message'])
+            self.assertEqual(resultados[0]['variable_name'], f'dados_{indice}')
+            self.assertIn(f'{indice:.2f}', resultados[1]['content'])
+            self.assertIn(f'{indice:.2f}', resultados[3]['content'])
+            self.assertEqual(nomes, {f'dados_{indice}'})
+
+    def test_erros_ficam_no_contexto_que_os_gerou(self):
+        com_erro = Interpretador()
+        sem_erro = Interpretador({'v': pd.DataFrame({'a': [1]})})
+        self.assertEqual(com_erro.executar('MOSTRAR DADOS DE $')[0]['type'], 'error')
+        self.assertEqual([r['type'] for r in sem_erro.executar('MOSTRAR DADOS DE v')], ['table'])
+
+
+class CompilacaoTests(SimpleTestCase):
+
+    def test_plano_imutavel_e_reutilizado(self):
+        codigo = 'CARREGAR ARQUIVO COMO v\nCALCULAR MODA DA COLUNA "a" DE v'
+        plano = compilar(codigo)
+        self.assertTrue(plano.valido)
+        self.assertEqual(plano.comandos, (CarregarArquivo(1, 'v'), Calcular(2, 'MODA', 'a', 'v')))
+        self.assertIs(compilar(codigo), plano)
+
+    def test_erro_de_sintaxe_impede_a_execucao_do_script_inteiro(self):
+        interpretador = Interpretador()
+        resultados = interpretador.executar(f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v\nCALCULAR MEDIA DE v')
+        self.assertEqual([r['type'] for r in resultados], ['error'])
+        self.assertIn('linha 2', resultados[0]['content'])
+        self.assertNotIn('v', interpretador.variaveis)
+
+
+class ProjecaoColunasTests(SimpleTestCase):
+
+    def test_planeamento_junta_as_colunas_de_cada_carga(self):
+        plano = compilar(
+            'CARREGAR ARQUIVO COMO v\n'
+            'CALCULAR MEDIA DA COLUNA "a" DE v\n'
+            'PLOTAR GRAFICO DE LINHAS COM EIXO_X "b" E EIXO_Y "a" DE v\n'
+            'CARREGAR ARQUIVO COMO w\n'
+            'MOSTRAR DADOS DE w'
+        )
+        projecoes = planear_projecoes(plano, variaveis_guardadas=False)
+        self.assertEqual(projecoes, {plano.comandos[0]: frozenset({'a', 'b'})})
+
+    def test_variaveis_guardadas_na_sessao_sao_carregadas_completas(self):
+        plano = compilar(
+            'CARREGAR ARQUIVO COMO v\n'
+            'CALCULAR MEDIA DA COLUNA "a" DE v\n'
+            'CARREGAR ARQUIVO COMO v\n'
+            'CALCULAR MEDIA DA COLUNA "b" DE v'
+        )
+        # Só a primeira carga de v desaparece antes do fim do script
+        self.assertEqual(planear_projecoes(plano), {plano.comandos[0]: frozenset({'a'})})
+
+    def test_carga_le_apenas_as_colunas_usadas(self):
+        interpretador = Interpretador(variaveis_guardadas=False)
+        resultados = interpretador.executar(
+            f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v\nCALCULAR MEDIA DA COLUNA "Despesas" DE v'
+        )
+        self.assertEqual(list(interpretador.variaveis['v'].columns), ['Despesas'])
+        self.assertEqual(resultados[0]['projecao']['colunas_ignoradas'], 2)
+        self.assertGreater(resultados[0]['projecao']['bytes_ignorados'], 0)
+
+    def test_coluna_desconhecida_faz_carga_completa(self):
+        interpretador = Interpretador()
+        resultados = interpretador.executar(
+            f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v\nCALCULAR MEDIA DA COLUNA "Lucro" DE v'
+        )
+        self.assertEqual(len(interpretador.variaveis['v'].columns), 3)
+        self.assertEqual([r['type'] for r in resultados], ['message', 'error'])
+
+
+class LeituraEmBlocosTests(SimpleTestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.caminho = os.path.join(self.pasta.name, 'grande.csv')
+        gerador = np.random.default_rng(42)
+        self.df = pd.DataFrame({
+            'valor': np.round(gerador.normal(100, 25, 5001), 2),
+            'categoria': gerador.integers(0, 7, 5001),
+        })
+        self.df.to_csv(self.caminho, index=False)
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+    def test_estatisticas_em_blocos_iguais_as_do_dataframe(self):
+        dados = DadosEmBlocos(self.caminho, tamanho_bloco=64)
+        self.assertAlmostEqual(dados.media('valor'), self.df['valor'].mean())
+        self.assertEqual(dados.mediana('valor'), self.df['valor'].median())
+        self.assertEqual(dados.mediana('categoria'), self.df['categoria'].median())
+        self.assertEqual(dados.moda('categoria'), self.df['categoria'].mode().min())
+
+    def test_comandos_sobre_variavel_em_blocos(self):
+        interpretador = Interpretador(tamanho_bloco=100)
+        resultados = interpretador.executar(
+            f'CARREGAR DADOS DE "{self.caminho}" COMO v EM BLOCOS\n'
+            'MOSTRAR DADOS DE v\n'
+            'CALCULAR MEDIANA DA COLUNA "valor" DE v\n'
+            'PLOTAR GRAFICO DE LINHAS COM EIXO_X "categoria" E EIXO_Y "valor" DE v'
+        )
+        self.assertIsInstance(interpretador.variaveis['v'], DadosEmBlocos)
+        self.assertEqual([r['type'] for r in resultados], ['message', 'table', 'message', 'error'])
+        self.assertIn(f"{self.df['valor'].median():.2f}", resultados[2]['content'])
+
+
+class OtimizacaoMemoriaTests(SimpleTestCase):
+
+    def test_reduz_tipos_sem_perder_valores(self):
+        df = pd.DataFrame({
+            'inteiro': np.arange(1000, dtype='int64'),
+            'decimal': np.linspace(0, 1, 1000),
+            'metade': np.arange(1000, dtype='float64') / 2,
+            'produto': ['A', 'B', 'C', 'D'] * 250,
+        })
+        otimizado = otimizar_tipos(df)
+        self.assertEqual(otimizado['inteiro'].dtype, np.uint16)
+        self.assertEqual(otimizado['decimal'].dtype, np.float64)
+        self.assertEqual(otimizado['metade'].dtype, np.float32)
+        self.assertEqual(otimizado['produto'].dtype, 'category')
+        self.assertTrue((otimizado['inteiro'] == df['inteiro']).all())
+
+        relatorio = relatorio_memoria(otimizado).set_index('Coluna')
+        self.assertEqual(relatorio.loc['inteiro', 'Bytes antes'], 8000)
+        self.assertEqual(relatorio.loc['inteiro', 'Bytes depois'], 2000)
+        self.assertLess(relatorio.loc['Total', 'Bytes depois'], relatorio.loc['Total', 'Bytes antes'])
+
+    def test_carregar_compacto_e_mostrar_memoria(self):
+        interpretador = Interpretador()
+        resultados = interpretador.executar(
+            f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v COMPACTO\nMOSTRAR MEMORIA DE v\nCALCULAR MEDIA DA COLUNA "Despesas" DE v'
+        )
+        self.assertEqual([r['type'] for r in resultados], ['message', 'table', 'message'])
+        self.assertIn('Bytes antes', resultados[1]['content'])
+        self.assertIn('11133.33', resultados[2]['content'])
+
+
+class TarefasTests(TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.configuracao = {
+            'dados_root': os.path.join(self.pasta.name, 'dados'),
+            'codec_dados': 'pickle',
+            'cache_leitura_root': os.path.join(self.pasta.name, 'cache'),
+            'cache_leitura_bytes': 1024 * 1024,
+        }
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+    def gestor(self, **opcoes):
+        return GestorTarefas(os.path.join(self.pasta.name, 'tarefas'), self.configuracao, **opcoes)
+
+    def esperar(self, gestor, id_tarefa):
+        for _ in range(300):
+            estado = gestor.estado(id_tarefa)
+            if estado['estado'] in ESTADOS_FINAIS:
+                return estado
+            time.sleep(0.05)
+        self.fail('A tarefa não terminou')
+
+    def test_tarefa_produz_resultados_e_variaveis(self):
+        gestor = self.gestor()
+        id_tarefa = gestor.submeter(f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v\nCALCULAR MEDIA DA COLUNA "Despesas" DE v', {})
+        estado = self.esperar(gestor, id_tarefa)
+        self.assertEqual(estado['estado'], 'concluida')
+        self.assertEqual(set(estado['variaveis']), {'v'})
+        resultados = gestor.resultados(id_tarefa)
+        self.assertEqual([r['type'] for r in resultados], ['message', 'message'])
+        self.assertEqual(gestor.resultados(id_tarefa, desde=1), resultados[1:])
+
+        # A pasta só é apagada depois de expirar
+        self.assertEqual(gestor.expirar(), 0)
+        self.assertEqual(gestor.expirar(agora=time.time() + gestor.expirar_segundos + 1), 1)
+        with self.assertRaises(KeyError):
+            gestor.estado(id_tarefa)
+
+    def test_fila_limitada_e_cancelamento(self):
+        gestor = self.gestor(max_processos=1, max_fila=2)
+        lenta = gestor.submeter('PLOTAR GRAFICO DE LINHAS COM EIXO_X "x" E EIXO_Y "y" DE v\n' * 5, {})
+        em_espera = gestor.submeter('MOSTRAR DADOS DE v', {})
+        with self.assertRaises(FilaCheia):
+            gestor.submeter('MOSTRAR DADOS DE v', {})
+        gestor.cancelar(em_espera)
+        self.assertEqual(self.esperar(gestor, em_espera)['estado'], 'cancelada')
+        self.assertEqual(gestor.resultados(em_espera), [])
+        self.esperar(gestor, lenta)
+
+    def test_tarefa_cancelada_a_meio_nao_altera_variaveis(self):
+        pasta = os.path.join(self.pasta.name, 'tarefa')
+        os.makedirs(pasta)
+        original = Interpretador.executar_passos
+
+        def executar_passos(interpretador, *args, **kwargs):
+            for resultado in original(interpretador, *args, **kwargs):
+                # Cancelada enquanto o primeiro comando corria
+                open(os.path.join(pasta, 'cancelar'), 'w').close()
+                # Um valor que o json não serializa sozinho
+                yield dict(resultado, total=np.int64(3))
+
+        codigo = f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v\nCARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO w'
+        with mock.patch.object(Interpretador, 'executar_passos', executar_passos):
+            tarefas.executar_tarefa(pasta, codigo, {}, None, self.configuracao, {})
+        self.assertEqual(tarefas.ler_estado(pasta), {'estado': 'cancelada', 'variaveis': {}})
+        with open(os.path.join(pasta, 'resultados.ndjson'), encoding='utf-8') as ficheiro:
+            self.assertEqual([json.loads(linha)['total'] for linha in ficheiro], ['3'])
+
+    def test_api_de_tarefas_atualiza_a_sessao(self):
+        with mock.patch.object(views, 'gestor_tarefas', self.gestor()):
+            resposta = self.client.post('/tarefas/', {'codigo': f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v'})
+            self.assertEqual(resposta.status_code, 202)
+            id_tarefa = resposta.json()['id']
+            for _ in range(300):
+                estado = self.client.get(f'/tarefas/{id_tarefa}/').json()
+                if estado['estado'] in ESTADOS_FINAIS:
+                    break
+                time.sleep(0.05)
+            self.assertEqual(estado['estado'], 'concluida')
+            self.assertIn('v', self.client.session['graficalc_variaveis'])
+
+            eventos = b''.join(self.client.get(f'/tarefas/{id_tarefa}/eventos/').streaming_content).decode()
+            self.assertIn('event: resultado', eventos)
+            self.assertIn('event: fim', eventos)
+            self.assertEqual(self.client.get(f'/tarefas/{"0" * 32}/').status_code, 404)
+
+
+class ReexecucaoIncrementalTests(ArmazemTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.caminho = os.path.join(self.pasta.name, 'vendas.csv')
+        pd.read_csv(CAMINHO_VENDAS).to_csv(self.caminho, index=False)
+        self.script = (
+            f'CARREGAR DADOS DE "{self.caminho}" COMO v\n'
+            'CALCULAR MEDIA DA COLUNA "Despesas" DE v\n'
+            'PLOTAR GRAFICO DE {} COM EIXO_X "Mês" E EIXO_Y "Despesas" DE v'
+        )
+
+    def executar(self, cache, codigo, chaves=None):
+        variaveis = VariaveisSessao(self.armazem, chaves or {})
+        resultados = Interpretador(variaveis, cache_execucao=cache).executar(codigo)
+        return [r.get('reutilizado', False) for r in resultados], variaveis.persistir()
+
+    def test_grafo_de_dependencias(self):
+        plano = compilar(self.script.format('BARRAS') + '\nMOSTRAR DADOS DE w')
+        self.assertEqual(grafo_dependencias(plano), [{}, {'v': 0}, {'v': 0}, {'w': None}])
+
+    def test_so_reexecuta_os_comandos_cujas_entradas_mudaram(self):
+        cache = CacheExecucao()
+        self.assertEqual(self.executar(cache, self.script.format('BARRAS'))[0], [False, False, False])
+        self.assertEqual(self.executar(cache, self.script.format('BARRAS'))[0], [True, True, True])
+        self.assertEqual(self.executar(cache, self.script.format('LINHAS'))[0], [True, True, False])
+
+        pd.read_csv(CAMINHO_VENDAS).assign(Despesas=1).to_csv(self.caminho, index=False)
+        self.assertEqual(self.executar(cache, self.script.format('LINHAS'))[0], [False, False, False])
+
+    def test_comando_reposto_nao_descodifica_a_sessao(self):
+        cache = CacheExecucao()
+        _, chaves = self.executar(cache, f'CARREGAR DADOS DE "{self.caminho}" COMO v')
+        calcular = 'CALCULAR MEDIA DA COLUNA "Despesas" DE v'
+        self.assertEqual(self.executar(cache, calcular, chaves)[0], [False])
+        with mock.patch.object(self.armazem, 'carregar') as carregar:
+            self.assertEqual(self.executar(cache, calcular, chaves)[0], [True])
+        carregar.assert_not_called()
+
+    def test_grafico_apagado_da_cache_de_graficos_volta_a_ser_desenhado(self):
+        cache = CacheExecucao()
+        graficos = CacheGraficos(os.path.join(self.pasta.name, 'graficos'))
+        renderizador = RenderizadorGraficos(cache=graficos)
+        codigo = self.script.format('BARRAS')
+
+        def executar():
+            variaveis = VariaveisSessao(self.armazem, {})
+            return Interpretador(variaveis, cache_execucao=cache, renderizador=renderizador).executar(codigo)
+
+        chave = executar()[2]['url'].rsplit('/', 1)[1]
+        self.assertTrue(executar()[2]['reutilizado'])
+        os.remove(graficos.caminho(chave))
+        resultado = executar()[2]
+        self.assertNotIn('reutilizado', resultado)
+        self.assertTrue(os.path.exists(graficos.caminho(chave)))
+
+    def test_cache_limitada_em_bytes(self):
+        df = pd.DataFrame({'a': np.arange(1000, dtype='int64')})
+        cache = CacheExecucao(limite_bytes=20_000)
+        cache.guardar('um', [{'type': 'message', 'content': 'x' * 100}], {'v': df})
+        cache.guardar('dois', [], {'w': df})
+        cache.guardar('tres', [], {'w': df})
+        self.assertIsNone(cache.obter('um'))
+        self.assertEqual(cache.estatisticas()['entradas'], 2)
+        self.assertEqual(cache.estatisticas()['bytes'], 2 * tamanho_dados(df))
+        # Uma entrada maior do que o limite não entra
+        cache.guardar('grande', [], {'w': pd.concat([df] * 3)})
+        self.assertIsNone(cache.obter('grande'))
+        self.assertIs(cache.obter('tres')[1]['w'], df)
+
+    def test_variaveis_da_sessao_entram_na_chave(self):
+        cache = CacheExecucao()
+        _, chaves = self.executar(cache, self.script.format('BARRAS'))
+        calcular = 'CALCULAR MEDIANA DA COLUNA "Despesas" DE v'
+        self.assertEqual(self.executar(cache, calcular, chaves)[0], [False])
+        self.assertEqual(self.executar(cache, calcular, chaves)[0], [True])
+        outras = {'v': self.armazem.guardar(pd.DataFrame({'Despesas': [1.0, 2.0]}))}
+        self.assertEqual(self.executar(cache, calcular, outras)[0], [False])
+
+
+class BenchmarkTests(SimpleTestCase):
+
+    def test_mede_as_etapas_e_deteta_regressoes(self):
+        etapas = ('parser', 'carregar', 'calcular_mediana', 'sessao_armazem')
+        resultado = executar_benchmark(linhas=[200], colunas=[4], formatos=['csv'], repeticoes=1, etapas=etapas)
+        self.assertEqual([m['etapa'] for m in resultado['medicoes']], list(etapas))
+
+        baseline = {'medicoes': [dict(m) for m in resultado['medicoes']]}
+        self.assertEqual(comparar(resultado, baseline, 20), [])
+        baseline['medicoes'][1]['segundos'] = resultado['medicoes'][1]['segundos'] / 2
+        regressoes = comparar(resultado, baseline, 20)
+        self.assertEqual([r['etapa'] for r in regressoes], ['carregar'])
+        self.assertEqual(regressoes[0]['variacao_percentual'], 100.0)
+
+        # O perfil e as dimensões ficam registados; linhas que a baseline não tem são assinaladas
+        self.assertEqual((resultado['meta']['linhas'], resultado['meta']['colunas']), ([200], [4]))
+        self.assertEqual(linhas_sem_referencia(resultado, baseline), [])
+        baseline['medicoes'] = [dict(m, linhas=100) for m in baseline['medicoes']]
+        self.assertEqual(linhas_sem_referencia(resultado, baseline), [200])
+
+
+class PerfilMetricasTests(TestCase):
+
+    def test_perfil_junta_numeros_a_cada_resultado(self):
+        codigo = f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v\nCALCULAR MEDIA DA COLUNA "Despesas" DE v'
+        resultados = Interpretador(perfil=True).executar(codigo)
+        self.assertEqual(len(resultados), 2)
+        for resultado in resultados:
+            self.assertEqual(set(resultado['perfil']), {'segundos', 'memoria_pico', 'linhas', 'bytes'})
+            self.assertGreater(resultado['perfil']['linhas'], 0)
+        self.assertNotIn('perfil', Interpretador().executar(codigo)[0])
+
+    def test_endpoint_exporta_histogramas(self):
+        def descodificacoes():
+            return metricas.segundos_fase._series.get((('fase', 'descodificar_sessao'),), ([0], 0))[0][-1]
+
+        with mock.patch.object(views, 'cache_execucao', CacheExecucao()):
+            self.client.post('/', {'codigo': f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v'})
+            antes = descodificacoes()
+            self.client.post('/', {'codigo': 'MOSTRAR DADOS DE v'})
+        # A descodificação é medida quando o comando lê a variável da sessão
+        self.assertEqual(descodificacoes(), antes + 1)
+        resposta = self.client.get('/metrics')
+        self.assertEqual(resposta.status_code, 200)
+        texto = resposta.content.decode('utf-8')
+        self.assertIn('# TYPE graficalc_comando_segundos histogram', texto)
+        self.assertIn('graficalc_comando_segundos_count{comando="CarregarDados"}', texto)
+        for fase in ('compilar', 'descodificar_sessao', 'executar', 'renderizar'):
+            self.assertIn(f'graficalc_fase_segundos_bucket{{fase="{fase}",le="+Inf"}}', texto)
+        self.assertIn('graficalc_cache_leitura{estatistica="falhas"}', texto)
+
+    def test_histograma_acumula_por_limite(self):
+        histograma = metricas.Histograma('teste_segundos', 'Teste.', (1, 2))
+        for valor in (0.5, 1.5, 3):
+            histograma.observar(valor, comando='X')
+        linhas = list(histograma.linhas())
+        self.assertEqual(linhas[:3], [
+            'teste_segundos_bucket{comando="X",le="1"} 1',
+            'teste_segundos_bucket{comando="X",le="2"} 2',
+            'teste_segundos_bucket{comando="X",le="+Inf"} 3',
+        ])
+        self.assertEqual(linhas[3:], ['teste_segundos_sum{comando="X"} 5.0', 'teste_segundos_count{comando="X"} 3'])
+
+
+class ArranqueTests(SimpleTestCase):
+
+    def test_tabelas_do_parser_estao_atualizadas(self):
+        # Se falhar: python manage.py gerar_tabelas_parser
+        gramatica = yacc.ParserReflect(vars(graficalc_engine))
+        gramatica.get_all()
+        self.assertEqual(parsetab._lr_signature, gramatica.signature())
+
+    def test_importar_o_motor_nao_carrega_bibliotecas_pesadas(self):
+        codigo = (
+            "import sys, interpreter.graficalc_engine\n"
+            "print(','.join(m for m in ('numpy', 'pandas', 'matplotlib', 'scipy') if m in sys.modules))"
+        )
+        raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        saida = subprocess.run([sys.executable, '-c', codigo], cwd=raiz, capture_output=True, text=True, check=True)
+        self.assertEqual(saida.stdout.strip(), '')
+
+
+class RenderizadorTests(SimpleTestCase):
+
+    def setUp(self):
+        self.variaveis = {'v': pd.DataFrame({'x': ['a', 'b', 'c'], 'y': [1.0, 3.0, 2.0]})}
+
+    def plotar(self, renderizador, *ficheiros):
+        codigo = '\n'.join(
+            f'PLOTAR GRAFICO DE LINHAS COM EIXO_X "x" E EIXO_Y "y" DE v SALVAR COMO "{ficheiro}"' for ficheiro in ficheiros
+        )
+        return Interpretador(dict(self.variaveis), renderizador=renderizador).executar(codigo)
+
+    def test_processos_desenham_os_graficos_pela_ordem_do_script(self):
+        renderizador = RenderizadorGraficos(processos=2, dpi=50)
+        resultados = self.plotar(renderizador, 'a.png', 'b.svg', 'c.webp')
+        self.assertEqual([r['type'] for r in resultados], ['image'] * 3)
+        self.assertEqual([r['mime'] for r in resultados], ['image/png', 'image/svg+xml', 'image/webp'])
+        self.assertEqual([r['filename'] for r in resultados], ['a.png', 'b.svg', 'c.webp'])
+        self.assertTrue(base64.b64decode(resultados[1]['content']).lstrip().startswith(b'<?xml'))
+        # Os processos não são criados com fork a partir do servidor
+        self.assertNotEqual(renderizador._executor._mp_context.get_start_method(), 'fork')
+
+    def test_formato_nao_permitido_devolve_erro(self):
+        resultados = self.plotar(RenderizadorGraficos(formatos=('png',)), 'grafico.svg', 'grafico.txt')
+        self.assertEqual(resultados[0]['type'], 'error')
+        self.assertIn("'.svg'", resultados[0]['content'])
+        self.assertEqual(resultados[1]['mime'], 'image/png')
+
+
+class ReducaoPontosTests(SimpleTestCase):
+
+    def test_linhas_mantem_minimos_e_maximos_pela_ordem(self):
+        y = np.sin(np.linspace(0, 20, 100_000))
+        y[12_345] = 5.0
+        x, reduzido, metodo = reduzir_linhas(np.arange(len(y)), y, 100)
+        self.assertEqual(metodo, 'min_max')
+        self.assertLessEqual(len(x), 202)
+        self.assertTrue((np.diff(x) > 0).all())
+        self.assertEqual(reduzido.max(), 5.0)
+        self.assertEqual(reduzido.min(), y.min())
+        self.assertEqual((x[0], x[-1]), (0, len(y) - 1))
+
+    def test_barras_agregam_e_mostram_as_maiores_categorias(self):
+        # Muitas linhas mas poucas categorias: as barras ficam como estão
+        x = np.array(['a', 'b', 'a', 'c'] * 20, dtype=object)
+        self.assertIsNone(reduzir_barras(x, np.ones(len(x))))
+
+        x = np.array([f'c{i}' for i in range(100)], dtype=object)
+        categorias, totais, metodo = reduzir_barras(x, np.arange(100.0), maximo_categorias=5)
+        self.assertEqual(metodo, 'top_n')
+        self.assertEqual(list(categorias), ['c96', 'c97', 'c98', 'c99', 'Outros'])
+        self.assertEqual(totais[-1], sum(range(96)))
+
+        x = np.array([f'c{i % 60}' for i in range(120)], dtype=object)
+        df = pd.DataFrame({'x': x, 'y': np.ones(120)})
+        resultado = Interpretador({'v': df}, renderizador=RenderizadorGraficos(dpi=10)).executar(
+            'PLOTAR GRAFICO DE BARRAS COM EIXO_X "x" E EIXO_Y "y" DE v')[0]
+        self.assertEqual(resultado['reducao'], {'metodo': 'top_n', 'pontos_originais': 120, 'pontos_desenhados': 50})
+
+    def test_sem_reducao_desenha_todas_as_linhas(self):
+        df = pd.DataFrame({'x': np.arange(5000), 'y': np.random.default_rng(0).random(5000)})
+        codigo = 'PLOTAR GRAFICO DE LINHAS COM EIXO_X "x" E EIXO_Y "y" DE v'
+        renderizador = RenderizadorGraficos(dpi=10)
+        reduzido = Interpretador({'v': df}, renderizador=renderizador).executar(codigo)[0]
+        self.assertEqual(reduzido['reducao']['pontos_originais'], 5000)
+        self.assertLessEqual(reduzido['reducao']['pontos_desenhados'], 2 * renderizador.largura_pixeis + 2)
+
+        completo = Interpretador({'v': df}, renderizador=renderizador).executar(
+            codigo + ' SEM REDUCAO SALVAR COMO "todas.svg"')[0]
+        self.assertNotIn('reducao', completo)
+        self.assertEqual(completo['filename'], 'todas.svg')
+
+
+class CacheGraficosTests(TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.renderizador = RenderizadorGraficos(dpi=30, cache=CacheGraficos(self.pasta.name))
+        self.codigo = 'PLOTAR GRAFICO DE BARRAS COM EIXO_X "x" E EIXO_Y "y" DE v SALVAR COMO "g.svg"'
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+    def plotar(self, df):
+        return Interpretador({'v': df}, renderizador=self.renderizador).executar(self.codigo)[0]
+
+    def test_grafico_igual_e_desenhado_uma_vez(self):
+        df = pd.DataFrame({'x': ['a', 'b'], 'y': [1, 2]})
+        with mock.patch.object(modulo_renderizador, 'desenhar', wraps=modulo_renderizador.desenhar) as desenhar:
+            primeiro = self.plotar(df)
+            segundo = self.plotar(df.copy())
+            outro = self.plotar(df.assign(y=[3, 4]))
+        self.assertEqual(desenhar.call_count, 2)
+        self.assertNotIn('content', primeiro)
+        self.assertEqual(primeiro, segundo)
+        self.assertNotEqual(primeiro['url'], outro['url'])
+        self.assertEqual(primeiro['mime'], 'image/svg+xml')
+
+    def test_view_serve_a_imagem_com_etag(self):
+        url = self.plotar(pd.DataFrame({'x': ['a'], 'y': [1]}))['url']
+        chave = url.rsplit('/', 1)[1]
+        self.assertEqual(url, reverse('grafico', args=[chave]))
+        with mock.patch.object(views, 'cache_graficos', self.renderizador.cache):
+            resposta = self.client.get(reverse('grafico', args=[chave]))
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual(resposta['Content-Type'], 'image/svg+xml')
+            self.assertEqual(resposta['ETag'], f'"{chave}"')
+            self.assertIn('immutable', resposta['Cache-Control'])
+            self.assertTrue(b''.join(resposta.streaming_content).lstrip().startswith(b'<?xml'))
+
+            repetido = self.client.get(reverse('grafico', args=[chave]), HTTP_IF_NONE_MATCH=f'"{chave}"')
+            self.assertEqual(repetido.status_code, 304)
+            self.assertEqual(self.client.get('/graficos/settings.py').status_code, 404)
+            self.assertEqual(self.client.get(reverse('grafico', args=['0' * 64 + '.png'])).status_code, 404)
+
+
+class JanelaTabelaTests(TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.armazem = ArmazemDados(self.pasta.name)
+        self.df = pd.DataFrame({'id': np.arange(1000), 'valor': np.arange(1000)[::-1] % 7, 'nome': ['x'] * 1000})
+        self.chave = self.armazem.guardar(self.df)
+        self.cache = CacheJanelas(self.armazem)
+        self.patches = [
+            mock.patch.object(views, 'armazem_dados', self.armazem),
+            mock.patch.object(views, 'cache_janelas', self.cache),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.pasta.cleanup()
+
+    def test_janela_de_linhas_e_colunas(self):
+        resultado = json.loads(janela(self.df, inicio=998, linhas=5, coluna_inicio=1, colunas=1))
+        self.assertEqual(resultado['total_linhas'], 1000)
+        self.assertEqual(resultado['colunas'], ['valor'])
+        self.assertEqual(resultado['linhas'], [[1], [0]])
+
+    def test_em_blocos_comeca_na_posicao_guardada(self):
+        caminho = os.path.join(self.pasta.name, 'grande.csv')
+        df = pd.DataFrame({'id': np.arange(50), 'texto': [f'linha "{i}"\nseguinte' if i % 3 else 'simples' for i in range(50)],
+                           'valor': np.arange(50) * 0.5})
+        df.to_csv(caminho, index=False)
+        dados = DadosEmBlocos(caminho, usecols=['valor', 'texto'])
+        with mock.patch.object(janelas, 'PASSO_POSICOES', 4), mock.patch.object(janelas, 'TAMANHO_LEITURA', 7):
+            posicoes = self.cache.posicoes(dados)
+            for inicio in (0, 3, 17, 46, 49, 60):
+                resultado = json.loads(janela(dados, inicio=inicio, linhas=5, posicoes=posicoes))
+                esperado = df[['texto', 'valor']].iloc[inicio:inicio + 5]
+                self.assertEqual(resultado['linhas'], esperado.values.tolist(), inicio)
+                if inicio == 3:
+                    # As primeiras janelas não percorrem o ficheiro
+                    self.assertEqual(posicoes._lidos, 0)
+                if inicio == 17:
+                    self.assertLess(posicoes._lidos, os.path.getsize(caminho) / 2)
+        self.assertIs(self.cache.posicoes(dados), posicoes)
+
+    def test_em_blocos_ignora_linhas_vazias_como_o_read_csv(self):
+        caminho = os.path.join(self.pasta.name, 'vazias.csv')
+        linhas = ['id,texto'] + [f'{i},"a\n\nb {i}"' for i in range(30)]
+        # Uma linha vazia, uma só com espaços e uma com \r\n a meio do ficheiro
+        linhas[5:5] = ['', '  \t ', '\r']
+        with open(caminho, 'w', newline='') as ficheiro:
+            ficheiro.write('\n'.join(linhas) + '\n\n')
+        df = pd.read_csv(caminho)
+        self.assertEqual(len(df), 30)
+        dados = DadosEmBlocos(caminho)
+        with mock.patch.object(janelas, 'PASSO_POSICOES', 4), mock.patch.object(janelas, 'TAMANHO_LEITURA', 5):
+            posicoes = self.cache.posicoes(dados)
+            for inicio in (0, 2, 5, 9, 26, 29, 32):
+                resultado = json.loads(janela(dados, inicio=inicio, linhas=4, posicoes=posicoes))
+                self.assertEqual(resultado['linhas'], df.iloc[inicio:inicio + 4].values.tolist(), inicio)
+
+    def test_endpoint_ordena_com_indice_em_cache(self):
+        url = reverse('janela', args=[self.chave])
+        resposta = self.client.get(url, {'inicio': 0, 'linhas': 3, 'ordenar': 'valor', 'decrescente': '1'})
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertEqual(dados['colunas'], ['id', 'valor', 'nome'])
+        self.assertEqual([linha[1] for linha in dados['linhas']], [6, 6, 6])
+        # Ordenação estável: empates ficam pela ordem original
+        self.assertEqual([linha[0] for linha in dados['linhas']], [6, 13, 20])
+
+        with mock.patch('interpreter.janelas.calcular_ordem') as calcular, \
+                mock.patch.object(self.armazem, 'carregar') as carregar:
+            self.client.get(url, {'inicio': 500, 'ordenar': 'valor', 'decrescente': '1'})
+        calcular.assert_not_called()
+        carregar.assert_not_called()
+
+        self.assertEqual(self.client.get(url, {'ordenar': 'outra'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('janela', args=['settings.py'])).status_code, 404)
+
+    def test_janela_mostra_os_dados_exibidos_e_nao_o_valor_final(self):
+        variaveis = VariaveisSessao(self.armazem, {'v': self.chave})
+        interpretador = Interpretador(variaveis)
+        self.assertEqual(interpretador.executar('MOSTRAR DADOS DE v')[0]['chave_dados'], self.chave)
+        # Uma variável alterada no mesmo pedido é guardada para a janela antes de a sessão ser gravada
+        variaveis['v'] = self.df.iloc[::-1]
+        chave = interpretador.executar('MOSTRAR DADOS DE v')[0]['chave_dados']
+        self.assertNotEqual(chave, self.chave)
+        variaveis['v'] = self.df.head(2)
+        variaveis.persistir()
+
+        resposta = self.client.get(reverse('janela', args=[chave]), {'inicio': 998})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['total_linhas'], 1000)
+        self.assertEqual(resposta.json()['linhas'][0][0], 1)
+
+        # Dados apagados do disco (ex.: limpar_disco): 404 e não um erro do servidor
+        os.remove(self.armazem._caminho(chave))
+        self.assertEqual(self.client.get(reverse('janela', args=[chave])).status_code, 404)
+        with mock.patch.object(self.armazem, 'existe', return_value=True):
+            self.assertEqual(self.client.get(reverse('janela', args=['1' * 64 + '.mapa'])).status_code, 404)
+
+
+class ExecucaoEmFluxoTests(TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.patches = [
+            mock.patch.object(views, 'armazem_dados', ArmazemDados(self.pasta.name)),
+            mock.patch.object(views, 'cache_execucao', CacheExecucao(16)),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.codigo = f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v\nCALCULAR MEDIA DA COLUNA "Despesas" DE v'
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.pasta.cleanup()
+
+    def test_ndjson_envia_um_resultado_por_linha_e_grava_a_sessao(self):
+        resposta = self.client.post(reverse('executar_fluxo') + '?formato=ndjson', {'codigo': self.codigo})
+        self.assertEqual(resposta['Content-Type'], 'application/x-ndjson')
+        linhas = [json.loads(linha) for linha in b''.join(resposta.streaming_content).decode().splitlines()]
+        self.assertEqual([linha['type'] for linha in linhas], ['message', 'message', 'fim'])
+        self.assertEqual(linhas[-1]['variaveis'], ['v'])
+
+        resposta = self.client.post(reverse('executar_fluxo'), {'codigo': 'MOSTRAR DADOS DE v'})
+        fragmentos = b''.join(resposta.streaming_content).decode().split(views.SEPARADOR_HTML)
+        self.assertEqual(len(fragmentos), 2)
+        self.assertIn('class="resultado table"', fragmentos[0])
+
+    def test_segundo_pedido_usa_outra_coluna_da_variavel_guardada(self):
+        # O primeiro pedido só usa Despesas, mas v fica na sessão com todas as colunas
+        list(self.client.post(reverse('executar_fluxo') + '?formato=ndjson', {'codigo': self.codigo}).streaming_content)
+        resposta = self.client.post(reverse('executar_fluxo') + '?formato=ndjson',
+                                    {'codigo': 'CALCULAR MEDIA DA COLUNA "Faturamento" DE v'})
+        linhas = [json.loads(linha) for linha in b''.join(resposta.streaming_content).decode().splitlines()]
+        self.assertEqual([linha['type'] for linha in linhas], ['message', 'fim'])
+        self.assertIn('Faturamento', linhas[0]['content'])
+
+    def test_resultados_saem_antes_do_fim_do_script(self):
+        resposta = self.client.post(reverse('executar_fluxo') + '?formato=ndjson', {'codigo': self.codigo})
+        fluxo = iter(resposta.streaming_content)
+        with mock.patch.object(Interpretador, 'comando_calcular') as calcular:
+            self.assertEqual(json.loads(next(fluxo))['type'], 'message')
+            calcular.assert_not_called()
+            list(fluxo)
+        calcular.assert_called_once()
+
+    def test_resultados_entregues_nao_ficam_no_interpretador(self):
+        interpretador = Interpretador()
+        resultados = list(interpretador.executar_passos(self.codigo, guardar_resultados=False))
+        self.assertEqual([resultado['type'] for resultado in resultados], ['message', 'message'])
+        self.assertEqual(interpretador.resultados, [None, None])
+
+    async def test_fluxo_em_asgi(self):
+        resposta = await AsyncClient().post(reverse('executar_fluxo') + '?formato=ndjson', {'codigo': self.codigo})
+        self.assertTrue(resposta.is_async)
+        linhas = [json.loads(bloco) async for bloco in resposta.streaming_content]
+        self.assertEqual(linhas[-1], {'type': 'fim', 'variaveis': ['v']})
+
+
+class LeituraExcelTests(SimpleTestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.caminho = os.path.join(self.pasta.name, 'livro.xlsx')
+        self.df = pd.DataFrame({
+            'Produto': ['a', 'b', None, 'd'],
+            'Quantidade': [1, 2, 3, 4],
+            'Total': [1.5, None, 3.5, 4.0],
+        })
+        with pd.ExcelWriter(self.caminho) as escritor:
+            pd.DataFrame({'x': [1]}).to_excel(escritor, sheet_name='Outra', index=False)
+            self.df.to_excel(escritor, sheet_name='Vendas', index=False, startrow=2)
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+    def test_planilha_e_cabecalho_iguais_ao_pandas(self):
+        plano = compilar(f'CARREGAR DADOS DE "{self.caminho}" COMO v PLANILHA "Vendas" CABECALHO 3')
+        self.assertEqual((plano.comandos[0].planilha, plano.comandos[0].cabecalho), ('Vendas', 3))
+
+        _, variaveis = executar_comandos(
+            f'CARREGAR DADOS DE "{self.caminho}" COMO v PLANILHA "Vendas" CABECALHO 3', {})
+        esperado = pd.read_excel(self.caminho, sheet_name='Vendas', header=2)
+        pd.testing.assert_frame_equal(variaveis['v'], esperado)
+
+    def test_folha_convertida_uma_vez(self):
+        cache = CacheLeitura(os.path.join(self.pasta.name, 'cache'))
+        codigo = (f'CARREGAR DADOS DE "{self.caminho}" COMO v PLANILHA "Vendas" CABECALHO 3\n'
+                  'CALCULAR MEDIA DA COLUNA "{}" DE v\n')
+        resultados, _ = executar_comandos(codigo.format('Total'), {}, cache_leitura=cache, variaveis_guardadas=False)
+        self.assertEqual(resultados[0]['projecao']['colunas_lidas'], 1)
+
+        cache._memoria.clear()
+        with mock.patch('openpyxl.load_workbook') as abrir:
+            resultados, _ = executar_comandos(codigo.format('Quantidade'), {}, cache_leitura=cache,
+                                              variaveis_guardadas=False)
+        abrir.assert_not_called()
+        self.assertEqual(resultados[1]['content'], "A MEDIA da coluna 'Quantidade' é: 2.50")
+        self.assertEqual(cache.estatisticas()['falhas'], 1)
+
+    def test_planilha_inexistente(self):
+        resultados, _ = executar_comandos(f'CARREGAR DADOS DE "{self.caminho}" COMO v PLANILHA "Nada"', {})
+        self.assertEqual(resultados[0]['type'], 'error')
+        self.assertIn("'Outra', 'Vendas'", resultados[0]['content'])
+
+
+class CalcularAgrupadoTests(SimpleTestCase):
+
+    def test_compila_varios_calculos_e_colunas(self):
+        plano = compilar(
+            'CALCULAR MEDIA DA COLUNA "Total" E MODA DA COLUNA "Qtd" DE v AGRUPAR POR "Loja" E "Produto" COMO r\n'
+            'CALCULAR MEDIA DA COLUNA "Total" E MEDIANA DA COLUNA "Total" DE v\n'
+        )
+        self.assertTrue(plano.valido)
+        self.assertEqual(plano.comandos[0], CalcularAgrupado(
+            1, (('MEDIA', 'Total'), ('MODA', 'Qtd')), 'v', ('Loja', 'Produto'), 'r'))
+        self.assertEqual([type(comando) for comando in plano.comandos[1:]], [Calcular, Calcular])
+
+    def test_agregacao_igual_a_calculo_por_grupo(self):
+        rng = np.random.default_rng(3)
+        df = pd.DataFrame({
+            'loja': rng.integers(0, 40, 5000),
+            'valor': rng.integers(0, 6, 5000).astype(float),
+        })
+        df.loc[::7, 'valor'] = np.nan
+        resultado = agregar(df, ('loja',), (('MEDIA', 'valor'), ('MEDIANA', 'valor'), ('MODA', 'valor')))
+        self.assertEqual(list(resultado.columns), ['loja', 'media_valor', 'mediana_valor', 'moda_valor'])
+        for linha in resultado.itertuples(index=False):
+            valores = df.loc[df['loja'] == linha.loja, 'valor'].dropna()
+            self.assertAlmostEqual(linha.media_valor, valores.mean())
+            self.assertEqual(linha.mediana_valor, valores.median())
+            self.assertEqual(linha.moda_valor, valores.value_counts().sort_index().idxmax())
+
+    def test_resultado_fica_numa_variavel(self):
+        resultados, variaveis = executar_comandos(
+            'CARREGAR DADOS DE "vendas_teste.csv" COMO v\n'
+            'CALCULAR MEDIA DA COLUNA "Despesas" DE v AGRUPAR POR "Mês"\n'
+            'PLOTAR GRAFICO DE BARRAS COM EIXO_X "Mês" E EIXO_Y "media_Despesas" DE v_agrupado\n', {})
+        self.assertEqual([resultado['type'] for resultado in resultados], ['message', 'message', 'image'])
+        self.assertEqual(list(variaveis['v_agrupado'].columns), ['Mês', 'media_Despesas'])
+
+
+class CriarColunaTests(SimpleTestCase):
+
+    def test_expressao_avaliada_por_blocos(self):
+        rng = np.random.default_rng(5)
+        colunas = {'a': rng.random(1000), 'b': rng.integers(1, 9, 1000)}
+        plano = compilar('CRIAR COLUNA "x" = -("a" - "b") * 2 / "b" + MAXIMO("a", 0.5) ^ 2 EM v')
+        with mock.patch.object(expressoes, 'TAMANHO_BLOCO', 64):
+            resultado = expressoes.avaliar(plano.comandos[0].expressao, colunas, 1000)
+        a, b = colunas['a'], colunas['b']
+        np.testing.assert_allclose(resultado, -(a - b) * 2 / b + np.fmax(a, 0.5) ** 2)
+        self.assertEqual(expressoes.avaliar(('binario', '+', ('numero', 1), ('numero', 2)), {}, 3).tolist(), [3, 3, 3])
+
+    def test_colunas_criadas_na_variavel(self):
+        resultados, variaveis = executar_comandos(
+            f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v\n'
+            'CRIAR COLUNA "Lucro" = "Faturamento" - "Despesas" EM v\n'
+            'CRIAR COLUNA "Positivo" = "Lucro" > 0 EM v\n'
+            'CALCULAR MEDIA DA COLUNA "Lucro" DE v\n', {}, variaveis_guardadas=False)
+        self.assertEqual([resultado['type'] for resultado in resultados], ['message'] * 4)
+        df = variaveis['v']
+        self.assertEqual(list(df['Lucro']), list(df['Faturamento'] - df['Despesas']))
+        self.assertEqual(df['Positivo'].dtype, bool)
+        # Só as colunas usadas na expressão são lidas do ficheiro
+        self.assertEqual(list(df.columns), ['Faturamento', 'Despesas', 'Lucro', 'Positivo'])
+
+    def test_colunas_compactas_nao_transbordam(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'pequenos.csv')
+            pd.DataFrame({'F': [100, 200], 'D': [150, 50]}).to_csv(caminho, index=False)
+            _, variaveis = executar_comandos(
+                f'CARREGAR DADOS DE "{caminho}" COMO v COMPACTO\n'
+                'CRIAR COLUNA "Diferenca" = "F" - "D" EM v\n'
+                'CRIAR COLUNA "Dobro" = "F" * 2 EM v\n'
+                'CRIAR COLUNA "Metade" = "D" / 2 EM v\n', {})
+        df = variaveis['v']
+        self.assertEqual(df['F'].dtype, np.uint8)
+        self.assertEqual(list(df['Diferenca']), [-50, 150])
+        self.assertEqual(list(df['Dobro']), [200, 400])
+        self.assertEqual(list(df['Metade']), [75.0, 25.0])
+        # A avaliação por blocos converte cada bloco da mesma forma
+        with mock.patch.object(expressoes, 'TAMANHO_BLOCO', 1):
+            valores = expressoes.avaliar(('binario', '-', ('coluna', 'D'), ('coluna', 'F')),
+                                         {'F': np.array([100, 200], dtype=np.uint8),
+                                          'D': np.array([150, 50], dtype=np.uint8)}, 2)
+        self.assertEqual(valores.tolist(), [50, -150])
+
+    def test_erros_de_expressao(self):
+        plano = compilar('CRIAR COLUNA "x" = RAIZ("a", 2) EM v\nCRIAR COLUNA "y" = FOO("a") EM v')
+        self.assertEqual(len(plano.erros), 2)
+        self.assertIn("'RAIZ' recebe 1", plano.erros[0])
+        resultados, _ = executar_comandos(
+            f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v\nCRIAR COLUNA "x" = "Mês" * 2 EM v', {})
+        self.assertEqual(resultados[1]['type'], 'error')
+        self.assertIn("não é numérica", resultados[1]['content'])
+
+
+class FiltrarTests(SimpleTestCase):
+
+    def test_indices_iguais_a_mascara_do_pandas(self):
+        rng = np.random.default_rng(9)
+        decimais = rng.integers(0, 20, 2000).astype(float)
+        decimais[::7] = np.nan
+        df = pd.DataFrame({
+            'inteiro': rng.integers(-5, 5, 2000),
+            'decimal': decimais,
+            'texto': rng.choice(['a', 'b', None], 2000),
+            'categoria': pd.Categorical(rng.choice(['x', 'y'], 2000)),
+            'data': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 30, 2000), 'D'),
+        })
+        casos = [(coluna, operador, valor) for operador in COMPARACOES
+                 for coluna, valor in (('inteiro', 0), ('inteiro', 2.5), ('decimal', 10), ('data', '2024-01-10'))]
+        casos += [(coluna, operador, valor) for operador in ('==', '!=')
+                  for coluna, valor in (('texto', 'a'), ('texto', 'z'), ('categoria', 'x'))]
+        cache = CacheIndices()
+        for _ in range(2):
+            for coluna, operador, valor in casos:
+                comparado = pd.Timestamp(valor) if coluna == 'data' else valor
+                esperado = np.flatnonzero(COMPARACOES[operador](df[coluna], comparado).fillna(operador == '!=').to_numpy(dtype=bool))
+                for indices in (None, cache):
+                    posicoes = filtrar_posicoes(df[coluna], coluna, operador, valor, indices, 'dados')
+                    np.testing.assert_array_equal(posicoes, esperado, err_msg=f"{coluna} {operador} {valor}")
+        # Um índice por coluna, construído uma vez e reutilizado
+        self.assertEqual(cache.estatisticas()['entradas'], 5)
+        self.assertEqual(cache.estatisticas()['falhas'], 5)
+
+    def test_variavel_filtrada_nos_comandos_seguintes(self):
+        codigo = (f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v\n'
+                  'FILTRAR v ONDE "Faturamento" >= 20000 COMO altos\n'
+                  'CALCULAR MEDIA DA COLUNA "Despesas" DE altos\n'
+                  'FILTRAR altos ONDE "Mês" = "Março"\n')
+        # As colunas usadas na variável filtrada também são pedidas ao ficheiro
+        projecoes = planear_projecoes(compilar(codigo), variaveis_guardadas=False)
+        self.assertEqual(set(projecoes.values()), {frozenset({'Faturamento', 'Despesas', 'Mês'})})
+
+        cache = CacheIndices()
+        resultados, variaveis = executar_comandos(codigo, {}, cache_indices=cache, variaveis_guardadas=False)
+        self.assertEqual([resultado['type'] for resultado in resultados], ['message'] * 4)
+        v = variaveis['v']
+        pd.testing.assert_frame_equal(variaveis['altos'], v[v['Faturamento'] >= 20000])
+        self.assertEqual(list(variaveis['altos_filtrado']['Mês']), ['Março'])
+        self.assertEqual(cache.estatisticas()['entradas'], 2)
+
+    def test_erros_de_filtro(self):
+        resultados, _ = executar_comandos(
+            f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v\n'
+            'FILTRAR v ONDE "Mês" > "Janeiro"\n'
+            'FILTRAR v ONDE "Faturamento" == "alto"\n'
+            'FILTRAR v ONDE "Lucro" > 0\n', {})
+        self.assertEqual([resultado['type'] for resultado in resultados], ['message', 'error', 'error', 'error'])
+        self.assertIn("só pode ser filtrada com == ou !=", resultados[1]['content'])
+        self.assertIn("é numérica", resultados[2]['content'])
+        self.assertIn("'Lucro' não existe", resultados[3]['content'])
+
+
+class ExecucaoLoteTests(SimpleTestCase):
+
+    def test_lote_isola_ficheiros_com_erro(self):
+        script = (
+            'CARREGAR ARQUIVO COMO v\n'
+            'CALCULAR MEDIA DA COLUNA "Despesas" DE v\n'
+            'PLOTAR GRAFICO DE LINHAS COM EIXO_X "Mês" E EIXO_Y "Despesas" DE v SALVAR COMO "despesas.png"\n'
+        )
+        with tempfile.TemporaryDirectory() as pasta:
+            bom = os.path.join(pasta, 'norte.csv')
+            mau = os.path.join(pasta, 'sul.csv')
+            pd.read_csv('vendas_teste.csv').to_csv(bom, index=False)
+            with open(mau, 'w') as ficheiro:
+                ficheiro.write('a,b\n1,2\n')
+
+            lote = executar_lote(script, [bom, mau, bom], os.path.join(pasta, 'saida'), processos=1, isolar=True)
+
+            norte, sul, repetido = lote['ficheiros']
+            # O mesmo ficheiro duas vezes: dois relatórios, cada um com a sua pasta
+            self.assertEqual(repetido['estado'], 'ok')
+            self.assertNotEqual(repetido['pasta'], norte['pasta'])
+            self.assertEqual(norte['estado'], 'ok')
+            self.assertEqual(sorted(os.listdir(norte['pasta'])), ['03_despesas.png', 'resultados.txt'])
+            self.assertEqual(sul['estado'], 'erro')
+            self.assertEqual(len(sul['erros']), 2)
+            self.assertGreater(lote['ficheiros_por_segundo'], 0)
+
+
+class TesteCargaTests(SimpleTestCase):
+
+    def test_percentis_e_fases(self):
+        self.assertEqual(percentil([4, 1, 3, 2, 5], 50), 3)
+        self.assertAlmostEqual(percentil([1, 2, 3, 4, 5], 95), 4.8)
+        antes = interpretar_metricas('graficalc_fase_segundos_sum{fase="executar"} 1.5\n'
+                                     'graficalc_fase_segundos_count{fase="executar"} 3\n')
+        depois = interpretar_metricas('# HELP graficalc_fase_segundos ...\n'
+                                      'graficalc_fase_segundos_sum{fase="executar"} 2.5\n'
+                                      'graficalc_fase_segundos_count{fase="executar"} 5\n')
+        self.assertEqual(diferenca_histograma(antes, depois, 'graficalc_fase_segundos', 'fase'),
+                         {'executar': {'contagem': 2, 'total_segundos': 1.0, 'media_segundos': 0.5}})
+
+    def test_carga_nos_servidores_wsgi_e_asgi(self):
+        # O ASGI corre no uvicorn, uma dependência opcional
+        interfaces = ('wsgi', 'asgi') if importlib.util.find_spec('uvicorn') else ('wsgi',)
+        resultado = executar_teste_carga(
+            interfaces, sessoes=(2,), pedidos=3, linhas=200, definicoes={'GRAFICALC_RENDER_PROCESSOS': 0},
+        )
+        self.assertEqual([execucao['interface'] for execucao in resultado['execucoes']], list(interfaces))
+        for execucao in resultado['execucoes']:
+            nivel = execucao['niveis'][0]
+            self.assertEqual((nivel['pedidos'], nivel['erros_http'], nivel['erros_script']), (6, 0, 0))
+            self.assertLessEqual(nivel['latencia']['p50'], nivel['latencia']['p99'])
+            self.assertEqual(set(nivel['por_cenario']), {'carregar', 'analisar', 'filtrar'})
+            self.assertEqual(nivel['fases']['executar']['contagem'], 6)
+            self.assertIn('gravar_sessao', nivel['fases'])
+            self.assertEqual(nivel['tabela_sessoes']['linhas_novas'], 2)
+
+    def test_asgi_sem_uvicorn_da_um_erro_claro(self):
+        with mock.patch('importlib.util.find_spec', return_value=None), \
+                self.assertRaisesRegex(RuntimeError, 'uvicorn'):
+            executar_teste_carga(('asgi',), sessoes=(1,), pedidos=1, linhas=10)
+
+
+class LimpezaDiscoTests(TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.armazem = ArmazemDados(os.path.join(self.pasta.name, 'dados'))
+        self.cache_leitura = CacheLeitura(os.path.join(self.pasta.name, 'cache'))
+        self.definicoes = override_settings(
+            GRAFICALC_DADOS_ROOT=self.armazem.raiz, GRAFICALC_TAREFAS_ROOT=os.path.join(self.pasta.name, 'tarefas'),
+            GRAFICALC_CACHE_LEITURA_ROOT=self.cache_leitura.raiz,
+            GRAFICALC_GRAFICOS_ROOT=os.path.join(self.pasta.name, 'graficos'),
+        )
+        self.definicoes.enable()
+
+    def tearDown(self):
+        self.definicoes.disable()
+        self.pasta.cleanup()
+
+    def limpar(self, **opcoes):
+        saida = io.StringIO()
+        call_command('limpar_disco', stdout=saida, **opcoes)
+        return saida.getvalue()
+
+    def test_dados_sem_sessao_sao_apagados_depois_da_margem(self):
+        with mock.patch.object(views, 'armazem_dados', self.armazem), \
+                mock.patch.object(views, 'cache_execucao', CacheExecucao()):
+            self.client.post('/', {'codigo': f'CARREGAR DADOS DE "{CAMINHO_VENDAS}" COMO v'})
+        usada = self.client.session['graficalc_variaveis']['v']
+        solta = self.armazem.guardar(pd.DataFrame({'a': [1, 2]}))
+
+        self.limpar()
+        self.assertTrue(self.armazem.existe(solta))
+        self.assertIn('1 ficheiro(s)', self.limpar(margem=-1))
+        self.assertTrue(self.armazem.existe(usada))
+        self.assertFalse(self.armazem.existe(solta))
+
+    def test_cache_de_leitura_apaga_as_entradas_usadas_ha_mais_tempo(self):
+        caminhos = []
+        for numero in range(3):
+            caminho = os.path.join(self.pasta.name, f'{numero}.csv')
+            pd.DataFrame({'a': np.arange(1000) + numero}).to_csv(caminho, index=False)
+            self.cache_leitura.ler(caminho, pd.read_csv, {})
+            caminhos.append(caminho)
+        ficheiros = sorted(glob.glob(os.path.join(self.cache_leitura.raiz, '*', '*')))
+        tamanhos = {ficheiro: os.path.getsize(ficheiro) for ficheiro in ficheiros}
+        # A entrada do primeiro ficheiro é a usada há mais tempo, exceto se for lida outra vez
+        for idade, caminho in zip((300, 200, 100), caminhos):
+            chave = self.cache_leitura.chave(caminho, pd.read_csv, {})
+            destino = self.cache_leitura._caminho_disco(chave)
+            os.utime(destino, (time.time() - idade, time.time() - idade))
+        self.cache_leitura._memoria.clear()
+        self.cache_leitura.ler(caminhos[0], pd.read_csv, {})
+
+        with override_settings(GRAFICALC_CACHE_LEITURA_DISCO_BYTES=sum(tamanhos.values()) - 1):
+            self.assertIn('Cache de leitura: 1 ficheiro(s)', self.limpar())
+        restantes = {self.cache_leitura.ler(caminho, pd.read_csv, {})['a'][0] for caminho in caminhos}
+        self.assertEqual(self.cache_leitura.estatisticas()['falhas'], 4)
+        self.assertEqual(restantes, {0, 1, 2})
+        self.assertIn('Cache de leitura: 3 ficheiro(s)', self.limpar(idade_maxima=-1))
+
+    def test_graficos_sem_uso_sao_apagados_com_o_relatorio(self):
+        cache = CacheGraficos(os.path.join(self.pasta.name, 'graficos'))
+        usado, esquecido = 'a' * 64 + '.png', 'b' * 64 + '.svg'
+        for chave in (usado, esquecido):
+            cache.guardar(chave, b'imagem', None)
+            for caminho in (cache.caminho(chave), cache.caminho(chave) + '.json'):
+                os.utime(caminho, (time.time() - 100, time.time() - 100))
+        self.assertIsNotNone(cache.resultado(usado, 'grafico.png'))
+
+        self.assertIn('Cache de gráficos: 2 ficheiro(s)', self.limpar(idade_maxima=50))
+        self.assertIsNotNone(cache.resultado(usado, 'grafico.png'))
+        self.assertIsNone(cache.resultado(esquecido, 'grafico.svg'))
+        self.assertFalse(os.path.exists(cache.caminho(esquecido)))
@@ -3,4 +3,12 @@ from . import views
 
 urlpatterns = [
     path('', views.interpreter_view, name='interpreter'),
+    path('executar/fluxo/', views.executar_fluxo_view, name='executar_fluxo'),
+    path('cache/leitura/', views.estatisticas_cache_view, name='estatisticas_cache'),
+    path('graficos/<str:chave>', views.grafico_view, name='grafico'),
+    path('janelas/<str:chave>/', views.janela_view, name='janela'),
+    path('tarefas/', views.submeter_tarefa_view, name='submeter_tarefa'),
+    path('tarefas/<str:id_tarefa>/', views.estado_tarefa_view, name='estado_tarefa'),
+    path('tarefas/<str:id_tarefa>/eventos/', views.eventos_tarefa_view, name='eventos_tarefa'),
+    path('tarefas/<str:id_tarefa>/cancelar/', views.cancelar_tarefa_view, name='cancelar_tarefa'),
 ]
\ No newline at end of file
@@ -1,53 +1,98 @@
 from django.shortcuts import render
-from .graficalc_engine import executar_comandos
-import pandas as pd
+from django.template.loader import render_to_string
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse, Http404, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
+from django.core.handlers.asgi import ASGIRequest
+from .graficalc_engine import Interpretador, executar_comandos
+from asgiref.sync import sync_to_async
 from django.core.files.storage import FileSystemStorage
+import asyncio
+import json
 import os
+import time
 from django.conf import settings
-from .graficalc_engine import safe_read_json
+from .armazenamento import ArmazemDados, VariaveisSessao, chave_valida
+from .cache_leitura import CacheLeitura
+from .incremental import CacheExecucao
+from .tarefas import GestorTarefas, FilaCheia, ESTADOS_FINAIS, formatar_ndjson
+from .metricas import Medidor, cronometrar, registo, segundos_fase
+from .renderizador import CacheGraficos, RenderizadorGraficos, TIPOS_MIME
+from .janelas import CacheJanelas, janela
+from .indices import CacheIndices
+from .blocos import DadosEmBlocos
 
 
-def interpreter_view(request):
-    
-    context = {
-        'codigo_submetido': '',
-        'resultados': []
+armazem_dados = ArmazemDados(settings.GRAFICALC_DADOS_ROOT, settings.GRAFICALC_CODEC_DADOS, settings.GRAFICALC_MAPAS_BYTES)
+cache_leitura = CacheLeitura(settings.GRAFICALC_CACHE_LEITURA_ROOT, settings.GRAFICALC_CACHE_LEITURA_BYTES)
+cache_execucao = CacheExecucao(settings.GRAFICALC_CACHE_EXECUCAO_ENTRADAS, settings.GRAFICALC_CACHE_EXECUCAO_BYTES)
+cache_janelas = CacheJanelas(armazem_dados, settings.GRAFICALC_JANELAS_CACHE_BYTES)
+cache_indices = CacheIndices(settings.GRAFICALC_INDICES_CACHE_BYTES)
+cache_graficos = CacheGraficos(settings.GRAFICALC_GRAFICOS_ROOT, settings.GRAFICALC_GRAFICOS_URL)
+renderizador = RenderizadorGraficos(
+    settings.GRAFICALC_RENDER_PROCESSOS, settings.GRAFICALC_RENDER_DPI, settings.GRAFICALC_RENDER_FORMATOS,
+    cache_graficos,
+)
+
+
+def opcoes_interpretador():
+    return {
+        'tamanho_bloco': settings.GRAFICALC_TAMANHO_BLOCO,
+        'strings_arrow': settings.GRAFICALC_STRINGS_ARROW,
+        'perfil': settings.GRAFICALC_PERFIL,
     }
 
-    
-    variaveis_sessao = request.session.get('graficalc_variaveis', {})
 
-    
-    for key, value in variaveis_sessao.items():
-        variaveis_sessao[key] = safe_read_json(value)
+gestor_tarefas = GestorTarefas(
+    settings.GRAFICALC_TAREFAS_ROOT,
+    {
+        'dados_root': str(settings.GRAFICALC_DADOS_ROOT),
+        'codec_dados': settings.GRAFICALC_CODEC_DADOS,
+        'mapas_bytes': settings.GRAFICALC_MAPAS_BYTES,
+        'copy_on_write': settings.GRAFICALC_COPY_ON_WRITE,
+        'cache_leitura_root': str(settings.GRAFICALC_CACHE_LEITURA_ROOT),
+        'cache_leitura_bytes': settings.GRAFICALC_CACHE_LEITURA_BYTES,
+        'cache_execucao_entradas': settings.GRAFICALC_CACHE_EXECUCAO_ENTRADAS,
+        'cache_execucao_bytes': settings.GRAFICALC_CACHE_EXECUCAO_BYTES,
+        'indices_bytes': settings.GRAFICALC_INDICES_CACHE_BYTES,
+        'render_dpi': settings.GRAFICALC_RENDER_DPI,
+        'render_formatos': list(settings.GRAFICALC_RENDER_FORMATOS),
+        'graficos_root': str(settings.GRAFICALC_GRAFICOS_ROOT),
+        'graficos_url': settings.GRAFICALC_GRAFICOS_URL,
+    },
+    opcoes_interpretador(),
+    max_processos=settings.GRAFICALC_TAREFAS_PROCESSOS,
+    max_fila=settings.GRAFICALC_TAREFAS_FILA_MAXIMA,
+    expirar_segundos=settings.GRAFICALC_TAREFAS_EXPIRAR_SEGUNDOS,
+)
 
-    if request.method == 'POST':
-        
-        codigo = request.POST.get('codigo', '')
-        context['codigo_submetido'] = codigo
 
-        
-        resultados, variaveis_atualizadas = executar_comandos(codigo, variaveis_sessao)
-        
-        context['resultados'] = resultados
-        
-        
-        variaveis_para_json = {}
-        for key, df in variaveis_atualizadas.items():
-            variaveis_para_json[key] = df.to_json()
+def guardar_upload(request):
+    if 'arquivo_dados' not in request.FILES:
+        return None
+    arquivo_enviado = request.FILES['arquivo_dados']
+    fs = FileSystemStorage()
+
+    nome_arquivo = fs.save(arquivo_enviado.name, arquivo_enviado)
+
+    return os.path.join(settings.MEDIA_ROOT, nome_arquivo)
 
-        request.session['graficalc_variaveis'] = variaveis_para_json
 
-    
-    return render(request, 'interpreter/interface.html', context)
+def remover_upload(caminho):
+    if caminho and os.path.exists(caminho):
+        os.remove(caminho)
+
+
+def guardar_variaveis(request, variaveis):
+    # Só as variáveis alteradas são codificadas; a sessão guarda apenas as chaves
+    if variaveis.alteradas():
+        with cronometrar(segundos_fase, fase='codificar_sessao'):
+            request.session['graficalc_variaveis'] = variaveis.persistir()
 
 
 def interpreter_view(request):
     context = {'codigo_submetido': '', 'resultados': []}
-    variaveis_sessao = request.session.get('graficalc_variaveis', {})
-
-    for key, value in variaveis_sessao.items():
-        variaveis_sessao[key] = safe_read_json(value)
+    # As variáveis são descodificadas do armazém só quando um comando as usa
+    variaveis_sessao = VariaveisSessao(armazem_dados, request.session.get('graficalc_variaveis', {}))
 
     caminho_arquivo_temporario = None
 
@@ -55,27 +100,305 @@ def interpreter_view(request):
         codigo = request.POST.get('codigo', '')
         context['codigo_submetido'] = codigo
 
-        
-        if 'arquivo_dados' in request.FILES:
-            arquivo_enviado = request.FILES['arquivo_dados']
-            fs = FileSystemStorage()
-            
-            nome_arquivo = fs.save(arquivo_enviado.name, arquivo_enviado)
-            
-            caminho_arquivo_temporario = os.path.join(settings.MEDIA_ROOT, nome_arquivo)
-
-        
-        resultados, variaveis_atualizadas = executar_comandos(codigo, variaveis_sessao, caminho_arquivo_temporario)
-        
-        
-        if caminho_arquivo_temporario and os.path.exists(caminho_arquivo_temporario):
-            os.remove(caminho_arquivo_temporario)
+        caminho_arquivo_temporario = guardar_upload(request)
 
+        with cronometrar(segundos_fase, fase='executar'):
+            resultados, variaveis_atualizadas = executar_comandos(
+                codigo, variaveis_sessao, caminho_arquivo_temporario, cache_leitura,
+                cache_execucao=cache_execucao, renderizador=renderizador, cache_indices=cache_indices,
+                **opcoes_interpretador()
+            )
+
+        remover_upload(caminho_arquivo_temporario)
         context['resultados'] = resultados
-        
-        variaveis_para_json = {}
-        for key, df in variaveis_atualizadas.items():
-            variaveis_para_json[key] = df.to_json()
-        request.session['graficalc_variaveis'] = variaveis_para_json
+        guardar_variaveis(request, variaveis_atualizadas)
+
+    with cronometrar(segundos_fase, fase='renderizar'):
+        return render(request, 'interpreter/interface.html', context)
+
+
+# EXECUÇÃO EM FLUXO
+# A resposta é enviada à medida que cada comando termina: em NDJSON (um
+# resultado JSON por linha e uma linha final {"type": "fim"}) ou em fragmentos
+# HTML, separados por SEPARADOR_HTML, para a página juntar aos resultados. O
+# middleware de sessões corre antes de o corpo ser gerado, por isso as
+# variáveis são gravadas na sessão pelo próprio gerador, no fim.
+
+SEPARADOR_HTML = '<!-- graficalc:resultado -->\n'
+
+
+def formatar_html(resultado):
+    return render_to_string('interpreter/resultado.html', {'res': resultado}) + SEPARADOR_HTML
+
+
+def fluxo_resultados(request, codigo, caminho_arquivo, formatar):
+    variaveis = VariaveisSessao(armazem_dados, request.session.get('graficalc_variaveis', {}))
+    interpretador = Interpretador(
+        variaveis, caminho_arquivo, cache_leitura, cache_execucao=cache_execucao, renderizador=renderizador,
+        cache_indices=cache_indices, **opcoes_interpretador(),
+    )
+    try:
+        with cronometrar(segundos_fase, fase='executar'):
+            for resultado in interpretador.executar_passos(codigo, guardar_resultados=False):
+                yield formatar(resultado)
+    except Exception as e:
+        yield formatar({'type': 'error', 'content': f"Ocorreu um erro inesperado: {e}"})
+    finally:
+        remover_upload(caminho_arquivo)
+
+    guardar_variaveis(request, variaveis)
+    request.session.save()
+    if formatar is formatar_ndjson:
+        yield formatar({'type': 'fim', 'variaveis': sorted(variaveis)})
+
+
+FIM_FLUXO = object()
+
+
+async def fluxo_assincrono(gerador):
+    # O interpretador é síncrono: cada passo corre numa thread, fora do event loop
+    passo = sync_to_async(next)
+    while True:
+        bloco = await passo(gerador, FIM_FLUXO)
+        if bloco is FIM_FLUXO:
+            return
+        yield bloco
+
+
+@require_POST
+def executar_fluxo_view(request):
+    formato = request.GET.get('formato') or request.POST.get('formato')
+    if formato is None:
+        formato = 'ndjson' if 'application/x-ndjson' in request.headers.get('Accept', '') else 'html'
+    if formato not in ('ndjson', 'html'):
+        return JsonResponse({'erro': "Formato desconhecido. Use 'ndjson' ou 'html'."}, status=400)
+
+    caminho_arquivo = guardar_upload(request)
+    formatar = formatar_ndjson if formato == 'ndjson' else formatar_html
+    fluxo = fluxo_resultados(request, request.POST.get('codigo', ''), caminho_arquivo, formatar)
+    if isinstance(request, ASGIRequest):
+        fluxo = fluxo_assincrono(fluxo)
+
+    tipo = 'application/x-ndjson' if formato == 'ndjson' else 'text/html; charset=utf-8'
+    resposta = StreamingHttpResponse(fluxo, content_type=tipo)
+    resposta['Cache-Control'] = 'no-cache'
+    resposta['X-Accel-Buffering'] = 'no'
+    # Uma sessão vazia não é gravada pelo middleware: assim o cookie de sessão
+    # segue nos cabeçalhos, antes de o corpo ser gerado
+    request.session['graficalc_variaveis'] = request.session.get('graficalc_variaveis', {})
+    return resposta
+
+
+def estatisticas_cache_view(request):
+    return JsonResponse(cache_leitura.estatisticas())
+
+
+@require_GET
+def grafico_view(request, chave):
+    # A chave resume o conteúdo: a imagem de uma chave nunca muda
+    try:
+        caminho = cache_graficos.caminho(chave)
+    except ValueError:
+        raise Http404("Gráfico não encontrado.")
+    etag = f'"{chave}"'
+    cabecalhos = {'ETag': etag, 'Cache-Control': 'public, max-age=31536000, immutable'}
+    if etag in request.headers.get('If-None-Match', ''):
+        resposta = HttpResponseNotModified()
+    else:
+        try:
+            resposta = FileResponse(open(caminho, 'rb'), content_type=TIPOS_MIME[chave.rsplit('.', 1)[1]])
+        except FileNotFoundError:
+            raise Http404("Gráfico não encontrado.")
+    for nome, valor in cabecalhos.items():
+        resposta[nome] = valor
+    return resposta
+
+
+# MÉTRICAS
+
+registo.registar(Medidor(
+    'graficalc_cache_leitura', "Estatísticas da cache de leitura de ficheiros.",
+    lambda: [({'estatistica': nome}, valor) for nome, valor in cache_leitura.estatisticas().items()],
+))
+registo.registar(Medidor(
+    'graficalc_mapas_dados', "Conjuntos de dados mapeados em memória neste processo.",
+    lambda: [({'estatistica': nome}, valor) for nome, valor in armazem_dados.mapas.estatisticas().items()],
+))
+registo.registar(Medidor(
+    'graficalc_cache_execucao', "Estatísticas da cache de reexecução incremental.",
+    lambda: [({'estatistica': nome}, valor) for nome, valor in cache_execucao.estatisticas().items()],
+))
+registo.registar(Medidor(
+    'graficalc_cache_indices', "Estatísticas da cache de índices de coluna (FILTRAR).",
+    lambda: [({'estatistica': nome}, valor) for nome, valor in cache_indices.estatisticas().items()],
+))
+registo.registar(Medidor(
+    'graficalc_tarefas_pendentes', "Tarefas assíncronas na fila ou em execução neste processo.",
+    lambda: [({}, gestor_tarefas.pendentes())],
+))
+
+
+@require_GET
+def metricas_view(request):
+    return HttpResponse(registo.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# JANELAS DE TABELA
+
+def inteiro_do_pedido(request, nome, padrao):
+    try:
+        return int(request.GET.get(nome, padrao))
+    except ValueError:
+        return padrao
+
+
+@require_GET
+def janela_view(request, chave):
+    # A chave é a dos dados que o MOSTRAR DADOS exibiu (resultado['chave_dados']),
+    # não a do valor atual da variável: a janela percorre a tabela que foi mostrada
+    if not chave_valida(chave) or not armazem_dados.existe(chave):
+        raise Http404("Dados não encontrados.")
+    try:
+        dados = cache_janelas.dados(chave)
+
+        ordem = None
+        ordenar = request.GET.get('ordenar')
+        if ordenar:
+            colunas = {str(coluna): coluna for coluna in dados.columns}
+            if ordenar not in colunas:
+                return JsonResponse({'erro': f"A coluna '{ordenar}' não existe nesta tabela."}, status=400)
+            if isinstance(dados, DadosEmBlocos):
+                return JsonResponse({'erro': "Variáveis lidas EM BLOCOS não podem ser ordenadas."}, status=400)
+            decrescente = request.GET.get('decrescente') in ('1', 'true')
+            ordem = cache_janelas.ordem(chave, dados, colunas[ordenar], decrescente)
+
+        return HttpResponse(janela(
+            dados,
+            inicio=inteiro_do_pedido(request, 'inicio', 0),
+            linhas=inteiro_do_pedido(request, 'linhas', 100),
+            coluna_inicio=inteiro_do_pedido(request, 'coluna_inicio', 0),
+            colunas=inteiro_do_pedido(request, 'colunas', 100),
+            ordem=ordem,
+            posicoes=cache_janelas.posicoes(dados) if isinstance(dados, DadosEmBlocos) else None,
+        ), content_type='application/json')
+    except FileNotFoundError:
+        # Apagados entretanto (limpar_disco), ou o ficheiro de uma variável EM BLOCOS já não existe
+        raise Http404("Dados não encontrados.")
+
+
+# TAREFAS ASSÍNCRONAS
+
+def tarefa_da_sessao(request, id_tarefa):
+    if id_tarefa not in request.session.get('graficalc_tarefas', []):
+        raise Http404("Tarefa não encontrada.")
+    try:
+        return gestor_tarefas.estado(id_tarefa)
+    except KeyError:
+        raise Http404("Tarefa não encontrada.")
+
+
+def aplicar_variaveis_da_tarefa(request, id_tarefa, estado):
+    # As variáveis alteradas pela tarefa só entram na sessão uma vez
+    aplicadas = request.session.get('graficalc_tarefas_aplicadas', [])
+    if estado['estado'] not in ESTADOS_FINAIS or id_tarefa in aplicadas:
+        return
+    if estado.get('variaveis'):
+        request.session['graficalc_variaveis'] = {
+            **request.session.get('graficalc_variaveis', {}), **estado['variaveis'],
+        }
+    request.session['graficalc_tarefas_aplicadas'] = aplicadas + [id_tarefa]
+
+
+@require_POST
+def submeter_tarefa_view(request):
+    codigo = request.POST.get('codigo', '')
+    caminho_arquivo_temporario = guardar_upload(request)
+    try:
+        id_tarefa = gestor_tarefas.submeter(
+            codigo, request.session.get('graficalc_variaveis', {}), caminho_arquivo_temporario,
+        )
+    except FilaCheia as e:
+        remover_upload(caminho_arquivo_temporario)
+        return JsonResponse({'erro': str(e)}, status=429)
+
+    request.session['graficalc_tarefas'] = request.session.get('graficalc_tarefas', []) + [id_tarefa]
+    return JsonResponse({'id': id_tarefa, 'estado': 'na_fila'}, status=202)
+
+
+@require_GET
+def estado_tarefa_view(request, id_tarefa):
+    estado = tarefa_da_sessao(request, id_tarefa)
+    try:
+        desde = max(int(request.GET.get('desde', 0)), 0)
+    except ValueError:
+        desde = 0
+    resultados = gestor_tarefas.resultados(id_tarefa, desde)
+    aplicar_variaveis_da_tarefa(request, id_tarefa, estado)
+    return JsonResponse({
+        'id': id_tarefa,
+        'estado': estado['estado'],
+        'erro': estado.get('erro'),
+        'resultados': resultados,
+        'proximo': desde + len(resultados),
+    })
+
+
+@require_POST
+def cancelar_tarefa_view(request, id_tarefa):
+    tarefa_da_sessao(request, id_tarefa)
+    gestor_tarefas.cancelar(id_tarefa)
+    return JsonResponse({'id': id_tarefa, 'estado': gestor_tarefas.estado(id_tarefa)['estado']})
+
+
+INTERVALO_EVENTOS = 0.2
+
+
+def evento(nome, dados):
+    return f"event: {nome}\ndata: {json.dumps(dados)}\n\n"
+
+
+def novos_eventos(id_tarefa, desde):
+    # Lê o estado antes dos resultados para não perder os últimos ao terminar
+    estado = gestor_tarefas.estado(id_tarefa)
+    resultados = gestor_tarefas.resultados(id_tarefa, desde)
+    eventos = [evento('resultado', resultado) for resultado in resultados]
+    final = estado['estado'] in ESTADOS_FINAIS
+    if final:
+        eventos.append(evento('fim', {'estado': estado['estado'], 'erro': estado.get('erro')}))
+    return eventos, desde + len(resultados), final
+
+
+def eventos_sincronos(id_tarefa):
+    desde = 0
+    while True:
+        eventos, desde, final = novos_eventos(id_tarefa, desde)
+        yield from eventos
+        if final:
+            return
+        time.sleep(INTERVALO_EVENTOS)
+
+
+async def eventos_assincronos(id_tarefa):
+    desde = 0
+    while True:
+        eventos, desde, final = novos_eventos(id_tarefa, desde)
+        for texto in eventos:
+            yield texto
+        if final:
+            return
+        await asyncio.sleep(INTERVALO_EVENTOS)
+
 
-    return render(request, 'interpreter/interface.html', context)
\ No newline at end of file
+@require_GET
+def eventos_tarefa_view(request, id_tarefa):
+    # Server-Sent Events: um evento `resultado` por comando terminado e um
+    # evento `fim`; as variáveis entram na sessão no pedido de estado seguinte
+    tarefa_da_sessao(request, id_tarefa)
+    if isinstance(request, ASGIRequest):
+        eventos = eventos_assincronos(id_tarefa)
+    else:
+        eventos = eventos_sincronos(id_tarefa)
+    resposta = StreamingHttpResponse(eventos, content_type='text/event-stream')
+    resposta['Cache-Control'] = 'no-cache'
+    resposta['X-Accel-Buffering'] = 'no'
+    return resposta